@@ -0,0 +1,61 @@
+# app/async_crud.py
+# Асинхронные версии читающих функций crud для async-обработчиков.
+# Построение запросов (фильтры, keyset) общее с crud; запись остается синхронной.
+from datetime import date
+from typing import Optional, Sequence, Tuple
+
+from sqlalchemy import select
+
+from . import crud, models
+
+
+async def get_user_by_username(db, username: str):
+    return await db.scalar(select(models.User).where(models.User.username == username))
+
+
+async def get_page(db, model, limit: int = 100, cursor: Optional[str] = None,
+                   sort: Optional[str] = None, criteria: Sequence = ()) -> Tuple[list, Optional[str]]:
+    segments, column = crud.keyset_select(model, limit, cursor, sort, criteria)
+    rows = []
+    for stmt in segments:
+        rows += (await db.scalars(stmt.limit(limit + 1 - len(rows)))).all()
+        if len(rows) > limit:
+            break
+    return rows[:limit], crud.next_cursor(rows, limit, sort, column)
+
+
+async def get_offset_page(db, model, skip: int = 0, limit: int = 100):
+    return (await db.scalars(select(model).offset(skip).limit(limit))).all()
+
+
+async def get_patient(db, patient_id: int):
+    return await db.get(models.Patient, patient_id)
+
+
+async def get_patient_timeline(db, patient_id: int, date_from: Optional[date] = None,
+                               date_to: Optional[date] = None, cursor: Optional[str] = None):
+    return await db.scalar(crud.timeline_select(patient_id, date_from, date_to, cursor))
+
+
+async def get_doctor(db, doctor_id: int):
+    return await db.get(models.Doctor, doctor_id)
+
+
+async def get_diagnosis(db, diagnosis_id: int):
+    return await db.get(models.Diagnosis, diagnosis_id)
+
+
+async def get_diagnosis_by_icd(db, icd_code: str):
+    return await db.scalar(select(models.Diagnosis).where(models.Diagnosis.icd_code == icd_code))
+
+
+async def get_symptom(db, symptom_id: int):
+    return await db.get(models.Symptom, symptom_id)
+
+
+async def get_patient_complaint(db, complaint_id: int):
+    return await db.get(models.PatientComplaint, complaint_id)
+
+
+async def get_prescription(db, prescription_id: int):
+    return await db.get(models.Prescription, prescription_id)
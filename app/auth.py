@@ -1,5 +1,11 @@
 # app/auth.py
+#
+#   python -m app.auth --block USER | --unblock USER | --revoke USER   блокировка и отзыв токенов
+import argparse
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
+from threading import Lock
 from typing import Optional
 import jwt  # Изменено с jose на jwt
 from passlib.context import CryptContext
@@ -9,8 +15,9 @@ from sqlalchemy.orm import Session
 import os
 from dotenv import load_dotenv
 
-from . import crud, schemas
-from .database import get_db
+from . import async_crud, crud, schemas, versions
+from .cache import make_user_cache
+from .database import IS_SQLITE, get_async_db
 
 load_dotenv()
 
@@ -18,16 +25,70 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# при изменении BCRYPT_ROUNDS старые хеши пересчитываются при следующем входе пользователя
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", 32))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
 
+user_cache = make_user_cache()
+
+
+async def users_version(db) -> Optional[int]:
+    """Версия таблицы users из table_versions (одно чтение по первичному ключу); без триггеров - None."""
+    if not IS_SQLITE:
+        return None
+    return await db.scalar(versions.version_select("users"))
+
+
+class PasswordHasherBusy(Exception):
+    """Очередь задач bcrypt заполнена; запрос нужно повторить позже (HTTP 503)."""
+
+
+# bcrypt отпускает GIL, поэтому хватает отдельного пула потоков; он не делит потоки
+# с пулом FastAPI и не может занять больше PASSWORD_WORKERS ядер
+_password_pool = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
+_password_pending = 0
+_password_lock = Lock()
+
+
+def _release_password_slot(future: Future):
+    global _password_pending
+    with _password_lock:
+        _password_pending -= 1
+
+
+def submit_password_job(fn, *args) -> Future:
+    global _password_pending
+    with _password_lock:
+        if _password_pending >= PASSWORD_QUEUE_LIMIT:
+            raise PasswordHasherBusy()
+        _password_pending += 1
+    try:
+        future = _password_pool.submit(fn, *args)
+    except Exception:
+        with _password_lock:
+            _password_pending -= 1
+        raise
+    future.add_done_callback(_release_password_slot)
+    return future
+
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return submit_password_job(pwd_context.verify, plain_password, hashed_password).result()
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return submit_password_job(pwd_context.hash, password).result()
+
+
+async def verify_and_update_password(plain_password, hashed_password):
+    """(пароль верен, новый хеш или None, если пересчитывать не нужно)."""
+    return await asyncio.wrap_future(
+        submit_password_job(pwd_context.verify_and_update, plain_password, hashed_password)
+    )
 
 
 def authenticate_user(db: Session, username: str, password: str):
@@ -39,6 +100,22 @@ def authenticate_user(db: Session, username: str, password: str):
     return user
 
 
+async def authenticate_user_async(db, username: str, password: str):
+    user = await async_crud.get_user_by_username(db, username)
+    if not user:
+        return False
+    # отдаем соединение в пул до bcrypt: иначе шторм логинов выбирает весь пул и блокирует остальные запросы
+    await db.commit()
+    valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not valid:
+        return False
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+        print(f"[AUTH] Rehashed password for {user.username} with {BCRYPT_ROUNDS} bcrypt rounds")
+    return user
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -52,7 +129,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -64,6 +141,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
+        token_version = payload.get("ver", 0)
         token_data = schemas.TokenData(username=username)
     except jwt.ExpiredSignatureError:
         raise HTTPException(
@@ -74,13 +152,48 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except jwt.InvalidTokenError:
         raise credentials_exception
 
-    user = crud.get_user_by_username(db, username=token_data.username)
-    if user is None:
+    # запись в users из любого процесса меняет версию, и кэш сразу промахивается; без версии кэш не используется
+    version = await users_version(db)
+    cached = user_cache.get(token_data.username, token_version, version) if version is not None else None
+    if cached is not None:
+        return schemas.User(**cached)
+
+    user = await async_crud.get_user_by_username(db, username=token_data.username)
+    if user is None or user.token_version != token_version:
         raise credentials_exception
-    return user
+    current_user = schemas.User.model_validate(user)
+    if current_user.is_active and version is not None:
+        user_cache.put(current_user.username, current_user.model_dump(mode="json"), user.token_version, version)
+    return current_user
 
 
 async def get_current_active_user(current_user: schemas.User = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
-    return current_user
\ No newline at end of file
+    return current_user
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.auth", description="Блокировка пользователей и отзыв токенов")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--block", metavar="USER", help="заблокировать пользователя и отозвать его токены")
+    action.add_argument("--unblock", metavar="USER", help="снять блокировку")
+    action.add_argument("--revoke", metavar="USER", help="отозвать все выданные токены")
+    args = parser.parse_args(argv)
+
+    from .database import SessionLocal
+
+    username = args.block or args.unblock or args.revoke
+    with SessionLocal() as db:
+        user = crud.get_user_by_username(db, username)
+        if user is None:
+            parser.exit(1, f"[AUTH] User {username} not found\n")
+        if args.revoke:
+            user = crud.revoke_user_tokens(db, user.id)
+        else:
+            user = crud.set_user_active(db, user.id, is_active=bool(args.unblock))
+    # триггер меняет версию users в table_versions: кэш всех воркеров промахнется на следующем запросе
+    print(f"[AUTH] {user.username}: active={user.is_active}, token_version={user.token_version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# app/cache.py
+import json
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Hashable, Optional, Tuple
+
+
+NAME_CACHE_SIZE = int(os.getenv("NAME_CACHE_SIZE", 10000))
+
+
+class NameResolver:
+    """Ограниченный LRU-кэш ФИО -> id, который можно сбрасывать и по ключу, и по id."""
+
+    def __init__(self, maxsize: int = NAME_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._ids: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._keys = {}
+        self._lock = Lock()
+
+    def get(self, key: Hashable) -> Optional[int]:
+        with self._lock:
+            value = self._ids.get(key)
+            if value is not None:
+                self._ids.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: int):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            old = self._ids.pop(key, None)
+            if old is not None:
+                self._keys.pop(old, None)
+            self._ids[key] = value
+            self._keys[value] = key
+            while len(self._ids) > self.maxsize:
+                _, evicted = self._ids.popitem(last=False)
+                self._keys.pop(evicted, None)
+
+    def invalidate(self, key: Optional[Hashable] = None, value: Optional[int] = None):
+        with self._lock:
+            if key is not None:
+                old = self._ids.pop(key, None)
+                if old is not None:
+                    self._keys.pop(old, None)
+            if value is not None:
+                old_key = self._keys.pop(value, None)
+                if old_key is not None:
+                    self._ids.pop(old_key, None)
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+            self._keys.clear()
+
+    def __len__(self):
+        return len(self._ids)
+
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 1024))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 60))
+# redis://host:6379/0 - общий кэш для нескольких воркеров uvicorn
+USER_CACHE_URL = os.getenv("USER_CACHE_URL", "")
+
+
+class MemoryBackend:
+    """LRU-словарь в памяти процесса с TTL на каждую запись."""
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class RedisBackend:
+    """Общий для всех воркеров кэш; истечение записей делает сам Redis."""
+
+    def __init__(self, url: str, ttl: float = USER_CACHE_TTL, prefix: str = "hospital:user:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[dict]:
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw else None
+
+    def set(self, key: str, value: dict):
+        if self.ttl > 0:
+            self.client.set(self.prefix + key, json.dumps(value), px=int(self.ttl * 1000))
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+
+class UserCache:
+    """Кэш аутентифицированных пользователей: username -> данные пользователя и версии.
+
+    Запись считается попаданием только при совпадении версии из токена и версии таблицы users
+    (versions.VERSIONED_TABLES): любая запись в users, в том числе блокировка из CLI или
+    в другом воркере, сразу делает все записи кэша промахами.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = Lock()
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, username: str, token_version: int, users_version: int) -> Optional[dict]:
+        try:
+            entry = self.backend.get(username)
+        except Exception as e:
+            # недоступный общий кэш не должен ломать аутентификацию - просто идем в базу
+            print(f"[CACHE] User cache backend error: {e}")
+            self._count("errors")
+            entry = None
+        if entry is None or (entry.get("token_version"), entry.get("users_version")) != (token_version, users_version):
+            self._count("misses")
+            return None
+        self._count("hits")
+        return entry["user"]
+
+    def put(self, username: str, user: dict, token_version: int, users_version: int):
+        try:
+            self.backend.set(username, {"user": user, "token_version": token_version,
+                                        "users_version": users_version})
+        except Exception as e:
+            print(f"[CACHE] User cache backend error: {e}")
+            self._count("errors")
+
+    def invalidate(self, username: str):
+        try:
+            self.backend.delete(username)
+        except Exception as e:
+            print(f"[CACHE] User cache backend error: {e}")
+            self._count("errors")
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__,
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+def make_user_cache() -> UserCache:
+    if USER_CACHE_URL:
+        try:
+            return UserCache(RedisBackend(USER_CACHE_URL))
+        except ImportError:
+            print("[CACHE] redis package is not installed, falling back to the in-process user cache")
+    return UserCache(MemoryBackend())
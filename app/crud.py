@@ -1,7 +1,309 @@
-from sqlalchemy.orm import Session
+import base64
+import binascii
+import hashlib
+import json
+import os
+from datetime import date, datetime
+from sqlalchemy import delete, func, insert, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
 from . import models, schemas
 from .auth import get_password_hash
-from typing import List, Optional
+from .cache import NameResolver
+from .icd_index import icd_index
+from .importer import resolve_names
+from .interactions import InteractionConflict, check_rows, describe
+from .lifecycle import with_end_date
+from .matching import patient_match_key
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+patient_names = NameResolver()
+doctor_names = NameResolver()
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 5000))
+
+# поля, по которым разрешена keyset-сортировка (все проиндексированы); id всегда добавляется вторым ключом
+SORT_FIELDS = {
+    models.Patient: ("id", "last_name"),
+    models.Doctor: ("id", "last_name", "specialty"),
+    models.Diagnosis: ("id", "icd_code", "category"),
+    models.Symptom: ("id", "name", "category_name"),
+    models.PatientComplaint: ("id", "complaint_date"),
+    models.Prescription: ("id", "start_date", "end_date"),
+}
+
+
+class CursorError(ValueError):
+    pass
+
+
+class PreconditionFailed(Exception):
+    """If-Match не совпал с текущей версией записи."""
+
+
+def encode_cursor(sort: str, value, last_id: int) -> str:
+    if isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, last_id], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, column):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, last_id = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        raise CursorError("Invalid cursor")
+    if cursor_sort != sort:
+        raise CursorError("Cursor was issued for a different sort order")
+    if value is not None:
+        python_type = column.type.python_type
+        if python_type is datetime:
+            value = datetime.fromisoformat(value)
+        elif python_type is date:
+            value = date.fromisoformat(value)
+    return value, int(last_id)
+
+
+def keyset_select(model, limit: int, cursor: Optional[str] = None, sort: Optional[str] = None,
+                  criteria: Sequence = ()):
+    """Строит SELECT'ы страницы по (поле сортировки, id); стоимость не зависит от номера страницы.
+
+    Строки с NULL в поле сортировки - отдельный сегмент (при ASC первый, при DESC последний), поэтому
+    каждый SELECT - один диапазон индекса: сравнение строк (поле, id) > (?, ?) или поле IS NULL AND id > ?.
+    Возвращает SELECT'ы оставшихся сегментов по порядку (каждый с limit + 1, чтобы понять,
+    есть ли следующая страница) и колонку сортировки, по которой потом строится next_cursor.
+    """
+    sort = sort or "id"
+    descending = sort.startswith("-")
+    field = sort.lstrip("-")
+    if field not in SORT_FIELDS.get(model, ("id",)):
+        raise CursorError(f"Sorting by '{field}' is not supported")
+
+    column = getattr(model, field)
+    stmt = select(model).where(*criteria)
+    position = decode_cursor(cursor, sort, column) if cursor else None
+    if field == "id":
+        if position is not None:
+            stmt = stmt.where(model.id < position[1] if descending else model.id > position[1])
+        return [stmt.order_by(model.id.desc() if descending else model.id.asc()).limit(limit + 1)], column
+
+    order = (column.desc(), model.id.desc()) if descending else (column.asc(), model.id.asc())
+    # в сегменте NULL поле постоянно, но ORDER BY (поле, id) позволяет взять тот же индекс, что и для значений
+    nulls = stmt.where(column.is_(None)).order_by(*order)
+    if position is None:
+        values = stmt.where(column.is_not(None)).order_by(*order)
+        segments = [values, nulls] if descending else [nulls, values]
+    elif position[0] is None:
+        last_id = position[1]
+        nulls = nulls.where(model.id < last_id if descending else model.id > last_id)
+        values = stmt.where(column.is_not(None)).order_by(*order)
+        segments = [nulls] if descending else [nulls, values]
+    else:
+        # сравнение строк отбрасывает NULL в поле сортировки: сегмент NULL идет отдельным запросом
+        key = tuple_(column, model.id)
+        values = stmt.where(key < position if descending else key > position).order_by(*order)
+        segments = [values, nulls] if descending else [values]
+    return [segment.limit(limit + 1) for segment in segments], column
+
+
+def next_cursor(rows: list, limit: int, sort: Optional[str], column) -> Optional[str]:
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor(sort or "id", getattr(last, column.key), last.id)
+
+
+TIMELINE_SORT = "timeline"
+# дата события ленты пациента для каждого вида записей
+TIMELINE_DATES = {
+    "complaint": models.PatientComplaint.complaint_date,
+    "prescription": models.Prescription.start_date,
+}
+
+
+def timeline_key(event: dict) -> tuple:
+    # новые события первыми; записи без даты - в конце ленты
+    return event["event_date"] or date.min, event["type"], event["id"]
+
+
+def encode_timeline_cursor(event: dict) -> str:
+    value = event["event_date"].isoformat() if event["event_date"] else None
+    return encode_cursor(TIMELINE_SORT, [value, event["type"]], event["id"])
+
+
+def decode_timeline_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, (value, kind), last_id = json.loads(raw)
+        event_date = date.fromisoformat(value) if value is not None else None
+    except (binascii.Error, ValueError, TypeError):
+        raise CursorError("Invalid cursor")
+    if cursor_sort != TIMELINE_SORT or kind not in TIMELINE_DATES:
+        raise CursorError("Cursor was issued for a different sort order")
+    return event_date, kind, int(last_id)
+
+
+def timeline_select(patient_id: int, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                    cursor: Optional[str] = None):
+    """Пациент с жалобами и назначениями (с врачами) за период: три SELECT на всю ленту.
+
+    Период и позиция курсора фильтруются в SQL (индексы (patient_id, дата)),
+    точное отсечение по курсору и сортировка - в timeline_page.
+    """
+    position = decode_timeline_cursor(cursor) if cursor else None
+
+    def criteria(column):
+        result = []
+        if date_from is not None:
+            result.append(column >= date_from)
+        if date_to is not None:
+            result.append(column <= date_to)
+        if position is not None:
+            result.append(column.is_(None) if position[0] is None else or_(column <= position[0], column.is_(None)))
+        return result
+
+    complaints = models.Patient.complaints
+    prescriptions = models.Patient.prescriptions
+    if criteria(TIMELINE_DATES["complaint"]):
+        complaints = complaints.and_(*criteria(TIMELINE_DATES["complaint"]))
+    if criteria(TIMELINE_DATES["prescription"]):
+        prescriptions = prescriptions.and_(*criteria(TIMELINE_DATES["prescription"]))
+    return select(models.Patient).where(models.Patient.id == patient_id).options(
+        selectinload(complaints),
+        selectinload(prescriptions).joinedload(models.Prescription.doctor),
+    )
+
+
+def timeline_page(patient, limit: int, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """Сливает загруженные жалобы и назначения в одну ленту и отдает страницу после курсора."""
+    events = [{"type": "complaint", "id": c.id, "event_date": c.complaint_date, "complaint": c}
+              for c in patient.complaints]
+    events += [{"type": "prescription", "id": p.id, "event_date": p.start_date, "prescription": p}
+               for p in patient.prescriptions]
+    events.sort(key=timeline_key, reverse=True)
+    if cursor:
+        event_date, kind, last_id = decode_timeline_cursor(cursor)
+        position = (event_date or date.min, kind, last_id)
+        events = [event for event in events if timeline_key(event) < position]
+    next_page = encode_timeline_cursor(events[limit - 1]) if len(events) > limit else None
+    return events[:limit], next_page
+
+
+def iter_rows(db: Session, model, criteria: Sequence = (), batch_size: int = 500):
+    """Потоковое чтение: ORM-объекты подгружаются пачками через yield_per."""
+    stmt = select(model).where(*criteria).order_by(model.id).execution_options(yield_per=batch_size)
+    return db.scalars(stmt)
+
+
+def get_page(db: Session, model, limit: int = 100, cursor: Optional[str] = None,
+             sort: Optional[str] = None, criteria: Sequence = ()) -> Tuple[list, Optional[str]]:
+    segments, column = keyset_select(model, limit, cursor, sort, criteria)
+    rows = []
+    for stmt in segments:
+        rows += db.scalars(stmt.limit(limit + 1 - len(rows))).all()
+        if len(rows) > limit:
+            break
+    return rows[:limit], next_cursor(rows, limit, sort, column)
+
+
+def name_key(last_name: str, first_name: str, middle_name: Optional[str]):
+    return last_name, first_name, middle_name or ""
+
+
+def name_filter(model, last_name: str, first_name: str, middle_name: Optional[str]):
+    """Сравнение ФИО, в котором отсутствующее отчество (NULL или '') совпадает само с собой."""
+    return (
+        model.last_name == last_name,
+        model.first_name == first_name,
+        func.coalesce(model.middle_name, "") == (middle_name or ""),
+    )
+
+
+def _resolve_id(db: Session, model, resolver: NameResolver, last_name, first_name, middle_name):
+    key = name_key(last_name, first_name, middle_name)
+    cached = resolver.get(key)
+    if cached is not None:
+        return cached
+    row = (
+        db.query(model.id)
+        .filter(*name_filter(model, last_name, first_name, middle_name))
+        .order_by(model.id)
+        .first()
+    )
+    if row is None:
+        return None
+    resolver.put(key, row.id)
+    return row.id
+
+
+def resolve_patient_id(db: Session, last_name: str, first_name: str, middle_name: Optional[str] = None):
+    return _resolve_id(db, models.Patient, patient_names, last_name, first_name, middle_name)
+
+
+def resolve_doctor_id(db: Session, last_name: str, first_name: str, middle_name: Optional[str] = None):
+    return _resolve_id(db, models.Doctor, doctor_names, last_name, first_name, middle_name)
+
+
+def resolve_ids(db: Session, model, resolver: NameResolver, names: Iterable[tuple]) -> Dict[tuple, int]:
+    """Пакетный _resolve_id: сначала кэш, затем один запрос на все промахи (ключи - name_key)."""
+    found = {}
+    missing = []
+    for key in {name_key(*name) for name in names}:
+        cached = resolver.get(key)
+        if cached is not None:
+            found[key] = cached
+        else:
+            missing.append(key)
+    if missing:
+        for key, value in resolve_names(db.connection(), model, missing).items():
+            resolver.put(key, value)
+            found[key] = value
+    return found
+
+
+def insert_returning(db: Session, model, values: dict):
+    """INSERT ... RETURNING: серверные значения по умолчанию приходят сразу, без refresh после commit."""
+    return db.scalar(insert(model).values(**values).returning(model))
+
+
+def update_returning(db: Session, model, object_id: int, values: dict):
+    """UPDATE ... WHERE id = ? RETURNING: None, если записи нет; без предварительного SELECT."""
+    return db.scalar(update(model).where(model.id == object_id).values(**values).returning(model))
+
+
+def insert_rows(db: Session, model, rows: List[dict]) -> Tuple[List[Optional[int]], Dict[int, str]]:
+    """Вставляет пачку одним INSERT ... RETURNING id в порядке входных строк.
+
+    Если пачка нарушает уникальный ключ, она повторяется построчно в savepoint'ах,
+    чтобы вставить все остальные строки и вернуть ошибку только для конфликтующих.
+    """
+    if not rows:
+        return [], {}
+    if db.get_bind().dialect.name == "sqlite":
+        # на SQLite sort_by_parameter_order вырождается в INSERT на каждую строку; rowid же выдаются
+        # по возрастанию в порядке VALUES (писатель один), так что порядок восстанавливает сортировка
+        stmt = insert(model).returning(model.id)
+        ordered = sorted
+    else:
+        stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+        ordered = list
+    try:
+        with db.begin_nested():
+            return ordered(db.scalars(stmt, rows)), {}
+    except IntegrityError:
+        pass
+
+    ids, errors = [], {}
+    for index, row in enumerate(rows):
+        try:
+            with db.begin_nested():
+                ids.append(db.scalar(insert(model).returning(model.id), row))
+        except IntegrityError:
+            ids.append(None)
+            errors[index] = "Record already exists"
+    return ids, errors
 
 
 
@@ -23,15 +325,39 @@ def get_users(db: Session, skip: int = 0, limit: int = 100):
 
 def create_user(db: Session, user: schemas.UserCreate):
     hashed_password = get_password_hash(user.password)
-    db_user = models.User(
-        username=user.username,
-        email=user.email,
-        full_name=user.full_name,
-        hashed_password=hashed_password
-    )
-    db.add(db_user)
+    db_user = insert_returning(db, models.User, {
+        "username": user.username,
+        "email": user.email,
+        "full_name": user.full_name,
+        "hashed_password": hashed_password,
+    })
+    db.commit()
+    return db_user
+
+
+def set_user_active(db: Session, user_id: int, is_active: bool):
+    # UPDATE ... RETURNING не вызывает after_update ORM: кэш пользователей сбрасывает вызывающий код
+    values = {"is_active": is_active}
+    if not is_active:
+        values["token_version"] = models.User.token_version + 1
+    db_user = update_returning(db, models.User, user_id, values)
+    db.commit()
+    return db_user
+
+
+def revoke_user_tokens(db: Session, user_id: int):
+    db_user = update_returning(db, models.User, user_id, {"token_version": models.User.token_version + 1})
+    db.commit()
+    return db_user
+
+
+def change_user_password(db: Session, user_id: int, new_password: str):
+    # смена пароля отзывает все выданные токены пользователя
+    db_user = update_returning(db, models.User, user_id, {
+        "hashed_password": get_password_hash(new_password),
+        "token_version": models.User.token_version + 1,
+    })
     db.commit()
-    db.refresh(db_user)
     return db_user
 
 
@@ -44,30 +370,97 @@ def get_patients(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Patient).offset(skip).limit(limit).all()
 
 
+def with_match_key(values: dict) -> dict:
+    return {**values, "match_key": patient_match_key(values["last_name"], values["first_name"])}
+
+
 def create_patient(db: Session, patient: schemas.PatientCreate):
-    db_patient = models.Patient(**patient.model_dump())
-    db.add(db_patient)
+    db_patient = insert_returning(db, models.Patient, with_match_key(patient.model_dump()))
     db.commit()
-    db.refresh(db_patient)
+    patient_names.invalidate(name_key(db_patient.last_name, db_patient.first_name, db_patient.middle_name))
     return db_patient
 
 
+def create_patients(db: Session, patients: List[schemas.PatientCreate]):
+    rows = [with_match_key(patient.model_dump()) for patient in patients]
+    ids, errors = insert_rows(db, models.Patient, rows)
+    db.commit()
+    for row in rows:
+        patient_names.invalidate(name_key(row["last_name"], row["first_name"], row["middle_name"]))
+    return ids, errors
+
+
 def update_patient(db: Session, patient_id: int, patient_update: schemas.PatientCreate):
-    db_patient = get_patient(db, patient_id)
+    db_patient = update_returning(db, models.Patient, patient_id, with_match_key(patient_update.model_dump()))
+    db.commit()
     if db_patient:
-        for key, value in patient_update.model_dump().items():
-            setattr(db_patient, key, value)
-        db.commit()
-        db.refresh(db_patient)
+        patient_names.invalidate(name_key(db_patient.last_name, db_patient.first_name, db_patient.middle_name),
+                                 patient_id)
     return db_patient
 
 
-def delete_patient(db: Session, patient_id: int):
-    db_patient = get_patient(db, patient_id)
-    if db_patient:
-        db.delete(db_patient)
-        db.commit()
-    return db_patient
+def row_etag(obj) -> str:
+    """Сильный ETag по значениям всех колонок записи."""
+    values = [getattr(obj, column.key) for column in obj.__table__.columns]
+    digest = hashlib.sha256(json.dumps(values, ensure_ascii=False, default=str).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_match: str, etag: str) -> bool:
+    candidates = [tag.strip() for tag in if_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def patch_patient(db: Session, patient_id: int, changes: dict, if_match: Optional[str] = None):
+    """Обновляет только отличающиеся колонки; возвращает (пациент или None, были ли изменения).
+
+    При If-Match UPDATE дополнительно сверяет все колонки с прочитанными значениями,
+    так что параллельное изменение между SELECT и UPDATE тоже дает PreconditionFailed.
+    """
+    current = get_patient(db, patient_id)
+    if current is None:
+        return None, False
+    if if_match is not None and not etag_matches(if_match, row_etag(current)):
+        raise PreconditionFailed()
+
+    changed = {key: value for key, value in changes.items() if getattr(current, key) != value}
+    if not changed:
+        return current, False
+
+    criteria = [models.Patient.id == patient_id]
+    if if_match is not None:
+        criteria += [
+            column.is_not_distinct_from(getattr(current, column.key))
+            for column in models.Patient.__table__.columns if column.key != "id"
+        ]
+    values = changed
+    if {"last_name", "first_name"} & changed.keys():
+        values = with_match_key({"last_name": current.last_name, "first_name": current.first_name, **changed})
+    old_key = name_key(current.last_name, current.first_name, current.middle_name)
+    updated = db.scalar(
+        update(models.Patient).where(*criteria).values(**values).returning(models.Patient),
+        execution_options={"synchronize_session": "fetch"},
+    )
+    if updated is None:
+        db.rollback()
+        raise PreconditionFailed()
+    db.commit()
+    if {"last_name", "first_name", "middle_name"} & changed.keys():
+        patient_names.invalidate(old_key, patient_id)
+        patient_names.invalidate(name_key(updated.last_name, updated.first_name, updated.middle_name))
+    return updated, True
+
+
+def delete_patient(db: Session, patient_id: int) -> bool:
+    # DELETE без загрузки объекта; ссылки из жалоб и назначений обнуляются, как это раньше делал ORM
+    # при db.delete (каскадного удаления у связей нет), и до DELETE - иначе его отвергнет SQLITE_FOREIGN_KEYS=1
+    for model in (models.PatientComplaint, models.Prescription):
+        db.execute(update(model).where(model.patient_id == patient_id).values(patient_id=None))
+    deleted = db.execute(delete(models.Patient).where(models.Patient.id == patient_id)).rowcount > 0
+    if deleted:
+        patient_names.invalidate(value=patient_id)
+    db.commit()
+    return deleted
 
 
 
@@ -79,15 +472,18 @@ def get_doctors(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Doctor).offset(skip).limit(limit).all()
 
 
+def doctors_by_specialty(specialty: str):
+    return (models.Doctor.specialty == specialty,)
+
+
 def get_doctors_by_specialty(db: Session, specialty: str):
-    return db.query(models.Doctor).filter(models.Doctor.specialty == specialty).all()
+    return db.query(models.Doctor).filter(*doctors_by_specialty(specialty)).all()
 
 
 def create_doctor(db: Session, doctor: schemas.DoctorCreate):
-    db_doctor = models.Doctor(**doctor.model_dump())
-    db.add(db_doctor)
+    db_doctor = insert_returning(db, models.Doctor, doctor.model_dump())
     db.commit()
-    db.refresh(db_doctor)
+    doctor_names.invalidate(name_key(db_doctor.last_name, db_doctor.first_name, db_doctor.middle_name))
     return db_doctor
 
 
@@ -104,15 +500,18 @@ def get_diagnoses(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Diagnosis).offset(skip).limit(limit).all()
 
 
+def diagnoses_by_category(category: str):
+    return (models.Diagnosis.category == category,)
+
+
 def get_diagnoses_by_category(db: Session, category: str):
-    return db.query(models.Diagnosis).filter(models.Diagnosis.category == category).all()
+    return db.query(models.Diagnosis).filter(*diagnoses_by_category(category)).all()
 
 
 def create_diagnosis(db: Session, diagnosis: schemas.DiagnosisCreate):
-    db_diagnosis = models.Diagnosis(**diagnosis.model_dump())
-    db.add(db_diagnosis)
+    db_diagnosis = insert_returning(db, models.Diagnosis, diagnosis.model_dump())
     db.commit()
-    db.refresh(db_diagnosis)
+    icd_index.add(db_diagnosis)
     return db_diagnosis
 
 
@@ -125,15 +524,17 @@ def get_symptoms(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Symptom).offset(skip).limit(limit).all()
 
 
+def symptoms_by_category(category: str):
+    return (models.Symptom.category_name == category,)
+
+
 def get_symptoms_by_category(db: Session, category: str):
-    return db.query(models.Symptom).filter(models.Symptom.category_name == category).all()
+    return db.query(models.Symptom).filter(*symptoms_by_category(category)).all()
 
 
 def create_symptom(db: Session, symptom: schemas.SymptomCreate):
-    db_symptom = models.Symptom(**symptom.model_dump())
-    db.add(db_symptom)
+    db_symptom = insert_returning(db, models.Symptom, symptom.model_dump())
     db.commit()
-    db.refresh(db_symptom)
     return db_symptom
 
 
@@ -146,29 +547,40 @@ def get_patient_complaints(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.PatientComplaint).offset(skip).limit(limit).all()
 
 
+def complaints_by_patient(patient_id: int):
+    return (models.PatientComplaint.patient_id == patient_id,)
+
+
 def get_complaints_by_patient(db: Session, patient_id: int):
-    return db.query(models.PatientComplaint).filter(models.PatientComplaint.patient_id == patient_id).all()
+    return db.query(models.PatientComplaint).filter(*complaints_by_patient(patient_id)).all()
 
 
 def create_patient_complaint(db: Session, complaint: schemas.PatientComplaintCreate):
 
-    patient = db.query(models.Patient).filter(
-        models.Patient.last_name == complaint.patient_last_name,
-        models.Patient.first_name == complaint.patient_first_name,
-        models.Patient.middle_name == complaint.patient_middle_name
-    ).first()
-
-    db_complaint = models.PatientComplaint(
-        **complaint.model_dump(),
-        patient_id=patient.id if patient else None
+    patient_id = resolve_patient_id(
+        db, complaint.patient_last_name, complaint.patient_first_name, complaint.patient_middle_name
     )
-    db.add(db_complaint)
+
+    db_complaint = insert_returning(db, models.PatientComplaint, {**complaint.model_dump(), "patient_id": patient_id})
     db.commit()
-    db.refresh(db_complaint)
     return db_complaint
 
 
 
+def create_patient_complaints(db: Session, complaints: List[schemas.PatientComplaintCreate]):
+    rows = [complaint.model_dump() for complaint in complaints]
+    patients = resolve_ids(db, models.Patient, patient_names, (
+        (row["patient_last_name"], row["patient_first_name"], row["patient_middle_name"]) for row in rows
+    ))
+    for row in rows:
+        row["patient_id"] = patients.get(
+            name_key(row["patient_last_name"], row["patient_first_name"], row["patient_middle_name"]))
+    ids, errors = insert_rows(db, models.PatientComplaint, rows)
+    db.commit()
+    return ids, errors
+
+
+
 def get_prescription(db: Session, prescription_id: int):
     return db.query(models.Prescription).filter(models.Prescription.id == prescription_id).first()
 
@@ -177,47 +589,95 @@ def get_prescriptions(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Prescription).offset(skip).limit(limit).all()
 
 
+def prescriptions_by_patient(patient_id: int):
+    return (models.Prescription.patient_id == patient_id,)
+
+
+def prescriptions_by_doctor(doctor_id: int):
+    return (models.Prescription.doctor_id == doctor_id,)
+
+
+def prescriptions_by_status(status: str):
+    return (models.Prescription.status == status,)
+
+
+def prescriptions_active_on(day: date, status: str = models.PRESCRIPTION_ACTIVE):
+    # курс покрывает дату; равенство по status и диапазон по end_date идут по ix_prescriptions_status_end
+    return (
+        models.Prescription.status == status,
+        models.Prescription.end_date >= day,
+        models.Prescription.start_date <= day,
+    )
+
+
 def get_prescriptions_by_patient(db: Session, patient_id: int):
-    return db.query(models.Prescription).filter(models.Prescription.patient_id == patient_id).all()
+    return db.query(models.Prescription).filter(*prescriptions_by_patient(patient_id)).all()
 
 
 def get_prescriptions_by_doctor(db: Session, doctor_id: int):
-    return db.query(models.Prescription).filter(models.Prescription.doctor_id == doctor_id).all()
+    return db.query(models.Prescription).filter(*prescriptions_by_doctor(doctor_id)).all()
 
 
 def get_prescriptions_by_status(db: Session, status: str):
-    return db.query(models.Prescription).filter(models.Prescription.status == status).all()
+    return db.query(models.Prescription).filter(*prescriptions_by_status(status)).all()
 
 
-def create_prescription(db: Session, prescription: schemas.PrescriptionCreate):
+def create_prescription(db: Session, prescription: schemas.PrescriptionCreate, check_interactions: bool = True):
 
-    patient = db.query(models.Patient).filter(
-        models.Patient.last_name == prescription.patient_last_name,
-        models.Patient.first_name == prescription.patient_first_name,
-        models.Patient.middle_name == prescription.patient_middle_name
-    ).first()
-
-    doctor = db.query(models.Doctor).filter(
-        models.Doctor.last_name == prescription.doctor_last_name,
-        models.Doctor.first_name == prescription.doctor_first_name,
-        models.Doctor.middle_name == prescription.doctor_middle_name
-    ).first()
+    patient_id = resolve_patient_id(
+        db, prescription.patient_last_name, prescription.patient_first_name, prescription.patient_middle_name
+    )
+    doctor_id = resolve_doctor_id(
+        db, prescription.doctor_last_name, prescription.doctor_first_name, prescription.doctor_middle_name
+    )
 
-    db_prescription = models.Prescription(
+    values = with_end_date({
         **prescription.model_dump(),
-        patient_id=patient.id if patient else None,
-        doctor_id=doctor.id if doctor else None
-    )
-    db.add(db_prescription)
+        "patient_id": patient_id,
+        "doctor_id": doctor_id,
+    })
+    if check_interactions:
+        blocking = [f for f in check_rows(db, [values]).get(0, []) if f.blocking]
+        if blocking:
+            raise InteractionConflict(blocking)
+    db_prescription = insert_returning(db, models.Prescription, values)
     db.commit()
-    db.refresh(db_prescription)
     return db_prescription
 
 
+def create_prescriptions(db: Session, prescriptions: List[schemas.PrescriptionCreate], check_interactions: bool = True):
+    rows = [with_end_date(prescription.model_dump()) for prescription in prescriptions]
+    patients = resolve_ids(db, models.Patient, patient_names, (
+        (row["patient_last_name"], row["patient_first_name"], row["patient_middle_name"]) for row in rows
+    ))
+    doctors = resolve_ids(db, models.Doctor, doctor_names, (
+        (row["doctor_last_name"], row["doctor_first_name"], row["doctor_middle_name"]) for row in rows
+    ))
+    for row in rows:
+        row["patient_id"] = patients.get(
+            name_key(row["patient_last_name"], row["patient_first_name"], row["patient_middle_name"]))
+        row["doctor_id"] = doctors.get(
+            name_key(row["doctor_last_name"], row["doctor_first_name"], row["doctor_middle_name"]))
+
+    # строки с противопоказанными сочетаниями не вставляются и возвращаются как ошибки пачки
+    blocked = {}
+    if check_interactions:
+        for index, findings in check_rows(db, rows).items():
+            blocking = [f for f in findings if f.blocking]
+            if blocking:
+                blocked[index] = describe(blocking)
+    keep = [index for index in range(len(rows)) if index not in blocked]
+    inserted, insert_errors = insert_rows(db, models.Prescription, [rows[index] for index in keep])
+    db.commit()
+
+    ids: List[Optional[int]] = [None] * len(rows)
+    for index, created_id in zip(keep, inserted):
+        ids[index] = created_id
+    errors = {**blocked, **{keep[position]: detail for position, detail in insert_errors.items()}}
+    return ids, errors
+
+
 def update_prescription_status(db: Session, prescription_id: int, status: str):
-    db_prescription = get_prescription(db, prescription_id)
-    if db_prescription:
-        db_prescription.status = status
-        db.commit()
-        db.refresh(db_prescription)
-    return db_prescription
\ No newline at end of file
+    db_prescription = update_returning(db, models.Prescription, prescription_id, {"status": status})
+    db.commit()
+    return db_prescription
@@ -1,5 +1,7 @@
 # app/database.py
-from sqlalchemy import create_engine
+import asyncio
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -10,20 +12,132 @@ load_dotenv()
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-DB_PATH = BASE_DIR / "hospital.db"
 
 
-DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+def is_memory_sqlite(url) -> bool:
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
 
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
 
-print(f"[DATABASE] Database path: {DB_PATH}")
-print(f"[DATABASE] Database URL: {SQLALCHEMY_DATABASE_URL}")
+def resolve_sqlite_url(url: str) -> str:
+    """Относительный путь SQLite считается от корня проекта, а не от текущего каталога:
+    sqlite:///./hospital.db из .env - один и тот же файл и для uvicorn, и для python -m app.importer."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or is_memory_sqlite(parsed) or parsed.database.startswith("file:"):
+        return url
+    if Path(parsed.database).is_absolute():
+        return url
+    return parsed.set(database=str((BASE_DIR / parsed.database).resolve())).render_as_string(hide_password=False)
+
+
+# один адрес базы для синхронного и асинхронного движков
+SQLALCHEMY_DATABASE_URL = resolve_sqlite_url(os.getenv("DATABASE_URL") or f"sqlite:///{BASE_DIR / 'hospital.db'}")
+database_url = make_url(SQLALCHEMY_DATABASE_URL)
+IS_SQLITE = database_url.get_backend_name() == "sqlite"
+
+if IS_SQLITE and not is_memory_sqlite(database_url):
+    DB_PATH = Path(database_url.database).resolve()
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    print(f"[DATABASE] Database path: {DB_PATH}")
+print(f"[DATABASE] Database URL: {database_url.render_as_string(hide_password=True)}")
+
+# профиль соединения SQLite; пустое значение переменной отключает соответствующую PRAGMA
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"),
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-65536"),  # отрицательное значение - в КиБ (64 МиБ)
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+    "foreign_keys": os.getenv("SQLITE_FOREIGN_KEYS", ""),
+}
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+DB_MAINTENANCE_INTERVAL = float(os.getenv("DB_MAINTENANCE_INTERVAL", "3600"))
+
+
+def pool_options(url) -> dict:
+    # база SQLite в памяти живет в одном соединении (SingletonThreadPool/StaticPool): размеров пула у нее нет
+    if is_memory_sqlite(url):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": int(SQLITE_PRAGMAS["busy_timeout"] or 5000) / 1000}
+    if IS_SQLITE else {},
+    **pool_options(SQLALCHEMY_DATABASE_URL),
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            if value:
+                cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+if IS_SQLITE:
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+
+
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def database_identity(url) -> tuple:
+    url = make_url(resolve_sqlite_url(url))
+    return url.get_backend_name(), url.host, url.port, url.database
+
+
+def async_database_url(url: str, override: str = None) -> str:
+    """Адрес для async-движка: DATABASE_URL с асинхронным драйвером.
+
+    ASYNC_DATABASE_URL может выбрать другой драйвер, но не другую базу: иначе чтения и запись
+    расходятся по двум базам, поэтому приложение не стартует.
+    """
+    if override:
+        if database_identity(override) != database_identity(url):
+            raise RuntimeError("ASYNC_DATABASE_URL must point at the same database as DATABASE_URL")
+        return resolve_sqlite_url(override)
+    url = make_url(url)
+    backend = url.get_backend_name()
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS.get(backend, url.get_driver_name())}").render_as_string(
+        hide_password=False)
+
+
+# асинхронный движок для async-обработчиков: aiosqlite для SQLite, asyncpg для PostgreSQL
+ASYNC_DATABASE_URL = async_database_url(SQLALCHEMY_DATABASE_URL, os.getenv("ASYNC_DATABASE_URL"))
+
+try:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL))
+    if async_engine.dialect.name == "sqlite":
+        event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    print(f"[DATABASE] Async driver: {async_engine.dialect.driver}")
+except ImportError as e:
+    async_engine = None
+    AsyncSessionLocal = None
+    print(f"[DATABASE] Async driver is not available ({e}); async handlers run the sync engine in a thread pool")
+
+if IS_SQLITE:
+    print(f"[DATABASE] SQLite profile: {', '.join(f'{k}={v}' for k, v in SQLITE_PRAGMAS.items() if v)}")
+# объекты остаются загруженными после commit: запись отдает данные из RETURNING без повторного SELECT
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 Base = declarative_base()
 
@@ -32,4 +146,109 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+class ThreadedSession:
+    """Замена AsyncSession поверх обычной Session, если async-драйвер не установлен.
+
+    Каждый запрос выполняется в пуле потоков, результаты буферизуются целиком, как у AsyncSession.
+    """
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    async def execute(self, statement, params=None, **kwargs):
+        frozen = await asyncio.to_thread(lambda: self.sync_session.execute(statement, params, **kwargs).freeze())
+        return frozen()
+
+    async def scalars(self, statement, params=None, **kwargs):
+        return (await self.execute(statement, params, **kwargs)).scalars()
+
+    async def scalar(self, statement, params=None, **kwargs):
+        return await asyncio.to_thread(self.sync_session.scalar, statement, params, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return await asyncio.to_thread(self.sync_session.get, entity, ident, **kwargs)
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    async def delete(self, instance):
+        await asyncio.to_thread(self.sync_session.delete, instance)
+
+    async def flush(self):
+        await asyncio.to_thread(self.sync_session.flush)
+
+    async def commit(self):
+        await asyncio.to_thread(self.sync_session.commit)
+
+    async def rollback(self):
+        await asyncio.to_thread(self.sync_session.rollback)
+
+    async def refresh(self, instance):
+        await asyncio.to_thread(self.sync_session.refresh, instance)
+
+    async def close(self):
+        await asyncio.to_thread(self.sync_session.close)
+
+
+async def get_async_db():
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+    db = ThreadedSession(SessionLocal())
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+class QueryCounter:
+    """Считает SQL-запросы движка внутри блока with: with QueryCounter() as counter: ...; counter.count.
+
+    Без аргументов слушает оба движка: async-обработчики с aiosqlite идут мимо синхронного engine.
+    """
+
+    def __init__(self, *binds):
+        self.binds = binds or tuple(b for b in (engine, async_engine and async_engine.sync_engine) if b is not None)
+        self.count = 0
+        self.statements = []
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append(statement)
+
+    def __enter__(self):
+        for bind in self.binds:
+            event.listen(bind, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        for bind in self.binds:
+            event.remove(bind, "before_cursor_execute", self._on_execute)
+
+
+def index_names(conn, table_name: str) -> set:
+    # инспектор SQLAlchemy пропускает индексы по выражениям (coalesce), поэтому для SQLite читаем PRAGMA
+    if conn.dialect.name == "sqlite":
+        return {row[1] for row in conn.exec_driver_sql(f"PRAGMA index_list('{table_name}')")}
+    return {ix["name"] for ix in inspect(conn).get_indexes(table_name)}
+
+
+def run_maintenance(bind=engine):
+    """PRAGMA optimize и пассивный checkpoint WAL, чтобы файл журнала не рос бесконечно."""
+    with bind.connect() as conn:
+        conn.exec_driver_sql("PRAGMA optimize")
+        busy, wal_pages, checkpointed = conn.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)").one()
+    print(f"[DATABASE] Maintenance: optimize done, WAL checkpoint {checkpointed}/{wal_pages} pages")
+
+
+async def maintenance_loop(interval: float = DB_MAINTENANCE_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(run_maintenance)
+        except Exception as e:
+            print(f"[DATABASE] Maintenance failed: {e}")
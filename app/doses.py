@@ -0,0 +1,489 @@
+# app/doses.py
+# Аналитика доз: quantity, dose_unit, frequency и duration_in_days всех назначений загружаются
+# Core-запросом в массивы NumPy. Строки единиц и частоты кодируются словарем, каждая уникальная
+# строка разбирается один раз, а суточная доза и экспозиция считаются векторно для всех строк.
+# Снимок массивов живет в памяти процесса и перечитывается целиком, когда меняется таблица.
+#
+#   python -m app.doses --bench [--rows 1000000] [--baseline-rows 1000000]   сравнение с чистым Python
+import argparse
+import os
+import random
+import re
+import statistics
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from operator import itemgetter
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import Engine
+
+from . import models, versions
+from .database import engine
+from .interactions import normalize_drug
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+DOSE_CACHE_TTL = float(os.getenv("DOSE_CACHE_TTL", "300"))
+DOSE_LOAD_BATCH = int(os.getenv("DOSE_LOAD_BATCH", 50000))
+OUTLIER_THRESHOLD = float(os.getenv("DOSE_OUTLIER_THRESHOLD", "3.5"))
+OUTLIER_MIN_GROUP = int(os.getenv("DOSE_OUTLIER_MIN_GROUP", 5))
+
+# единица -> (базовая единица, множитель); неизвестная единица остается своей базовой
+UNITS = {
+    "мг": ("мг", 1.0), "г": ("мг", 1000.0), "мкг": ("мг", 0.001),
+    "мл": ("мл", 1.0), "л": ("мл", 1000.0),
+    "ед": ("ЕД", 1.0), "ме": ("ЕД", 1.0),
+}
+COUNTED_UNITS = ("табл", "таб", "капс", "драже", "пакет", "саше", "шт")
+# частоты без числа: приемов в день; "по требованию" и подобные не дают суточной дозы
+FIXED_FREQUENCIES = {
+    "ежедневно": 1.0, "каждый день": 1.0, "раз в день": 1.0, "раз в сутки": 1.0,
+    "утром": 1.0, "вечером": 1.0, "утром натощак": 1.0, "натощак": 1.0, "перед сном": 1.0,
+    "после еды": 3.0, "перед едой": 3.0, "во время еды": 3.0,
+    "каждый час": 24.0, "раз в неделю": 1 / 7, "через день": 0.5,
+}
+NUMBER = r"(\d+(?:[.,]\d+)?)"
+FREQUENCY_PATTERNS = (
+    (re.compile(rf"^{NUMBER}\s*раз\w*\s+в\s+(?:день|сутки)"), lambda n: n),
+    (re.compile(rf"^{NUMBER}\s*раз\w*\s+в\s+неделю"), lambda n: n / 7),
+    (re.compile(rf"^кажды[ейх]\s+{NUMBER}\s*час"), lambda n: 24 / n),
+    (re.compile(rf"^кажды[ейх]\s+{NUMBER}\s*(?:дн|дня|сут)"), lambda n: 1 / n),
+    (re.compile(rf"^{NUMBER}$"), lambda n: n),
+)
+
+
+class DosesUnavailable(RuntimeError):
+    """Аналитика доз требует NumPy."""
+
+
+@lru_cache(maxsize=4096)
+def doses_per_day(frequency: Optional[str]) -> Optional[float]:
+    text = " ".join((frequency or "").casefold().replace("ё", "е").split())
+    if text in FIXED_FREQUENCIES:
+        return FIXED_FREQUENCIES[text]
+    for pattern, per_day in FREQUENCY_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            number = float(match.group(1).replace(",", "."))
+            return per_day(number) if number > 0 else None
+    return None
+
+
+@lru_cache(maxsize=1024)
+def base_unit(unit: Optional[str]) -> Tuple[str, float]:
+    text = (unit or "").casefold().replace("ё", "е").strip().rstrip(".")
+    if text in UNITS:
+        return UNITS[text]
+    if text.startswith(COUNTED_UNITS):
+        return "шт", 1.0
+    return text or "?", 1.0
+
+
+def grouped_order(groups, values):
+    """Порядок строк по (группа, значение)."""
+    order = np.argsort(values)
+    if groups.max(initial=0) < 1 << 16:
+        # stable-сортировка 16-битных ключей в NumPy поразрядная: в разы быстрее lexsort
+        return order[np.argsort(groups[order].astype(np.uint16), kind="stable")]
+    return np.lexsort((values, groups))
+
+
+class Codes(dict):
+    """Словарное кодирование: значение -> номер в порядке первого появления."""
+
+    def __missing__(self, key):
+        code = self[key] = len(self)
+        return code
+
+
+@dataclass
+class DoseFrame:
+    """Колонки назначений; group = medication * len(units) + unit - ключ агрегатов и выбросов."""
+    ids: "np.ndarray"
+    patients: "np.ndarray"
+    medications: "np.ndarray"
+    units: "np.ndarray"
+    daily: "np.ndarray"
+    duration: "np.ndarray"
+    medication_names: List[str]
+    unit_names: List[str]
+    groups: "np.ndarray" = field(default=None, repr=False)
+    _group_stats: Optional[tuple] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        if self.groups is None:
+            self.groups = self.medications.astype(np.int64) * len(self.unit_names) + self.units
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def exposure(self):
+        return self.daily * self.duration
+
+    def group_key(self, group: int) -> Tuple[str, str]:
+        medication, unit = divmod(int(group), len(self.unit_names))
+        return self.medication_names[medication], self.unit_names[unit]
+
+    def group_stats(self):
+        """Медиана и робастный масштаб суточной дозы по группам (модифицированный z-score)."""
+        if self._group_stats is not None:
+            return self._group_stats
+        size = len(self.medication_names) * len(self.unit_names)
+        groups = self.groups
+        valid = np.isfinite(self.daily) & (self.daily > 0)
+        g, x = groups[valid], self.daily[valid]
+        order = grouped_order(g, x)
+        g, x = g[order], x[order]
+        median = np.full(size, np.nan)
+        scale = np.zeros(size)
+        counts = np.bincount(g, minlength=size)
+        if len(g):
+            starts = np.flatnonzero(np.r_[True, g[1:] != g[:-1]])
+            lengths = np.diff(np.r_[starts, len(g)])
+            keys = g[starts]
+            median[keys] = (x[starts + (lengths - 1) // 2] + x[starts + lengths // 2]) / 2
+            deviation = np.abs(x - np.repeat(median[keys], lengths))
+            # группы уже отсортированы, поэтому сортировка отклонений сохраняет их границы
+            deviation_sorted = deviation[grouped_order(g, deviation)]
+            mad = (deviation_sorted[starts + (lengths - 1) // 2] + deviation_sorted[starts + lengths // 2]) / 2
+            mean_deviation = np.bincount(g, weights=deviation, minlength=size)[keys] / lengths
+            # Iglewicz-Hoaglin: при MAD = 0 масштаб берется из среднего абсолютного отклонения
+            scale[keys] = np.where(mad > 0, mad / 0.6745, mean_deviation * 1.253314)
+        self._group_stats = (median, scale, counts)
+        return self._group_stats
+
+
+def frame_from_batches(batches: Iterable[Sequence[tuple]]) -> DoseFrame:
+    """Строит DoseFrame из пачек (id, patient_id, medication_name, quantity, dose_unit, frequency, duration)."""
+    if np is None:
+        raise DosesUnavailable("Dose analytics requires the numpy package")
+    medications, units, frequencies = Codes(), Codes(), Codes()
+    chunks = defaultdict(list)
+    for rows in batches:
+        count = len(rows)
+        # колонка за колонкой через itemgetter: zip(*rows) по пачке в разы медленнее
+        ids, patients, names, quantities, unit_values, frequency_values, durations = (
+            map(itemgetter(position), rows) for position in range(7))
+        chunks["ids"].append(np.fromiter(ids, np.int64, count))
+        # None -> nan через float, затем -1 для назначений без пациента
+        chunks["patients"].append(np.nan_to_num(np.array(list(patients), dtype=np.float64), nan=-1).astype(np.int32))
+        chunks["medications"].append(np.fromiter(map(medications.__getitem__, names), np.int32, count))
+        chunks["quantity"].append(np.array(list(quantities), dtype=np.float64))
+        chunks["units"].append(np.fromiter(map(units.__getitem__, unit_values), np.int32, count))
+        chunks["frequencies"].append(np.fromiter(map(frequencies.__getitem__, frequency_values), np.int32, count))
+        chunks["duration"].append(np.array(list(durations), dtype=np.float32))
+    columns = {name: np.concatenate(parts) for name, parts in chunks.items()}
+    if not columns:
+        empty_int = np.zeros(0, dtype=np.int32)
+        columns = {"ids": np.zeros(0, dtype=np.int64), "patients": empty_int, "medications": empty_int,
+                   "quantity": np.zeros(0), "units": empty_int, "frequencies": empty_int,
+                   "duration": np.zeros(0, dtype=np.float32)}
+
+    # разбор строк - по одному разу на уникальное значение, дальше только индексация массивов
+    canonical = Codes()
+    medication_names = []
+    medication_map = np.zeros(max(len(medications), 1), dtype=np.int32)
+    for name, code in medications.items():
+        key = normalize_drug(name)
+        if key not in canonical:
+            medication_names.append((name or "").strip())
+        medication_map[code] = canonical[key]
+    unit_codes = Codes()
+    unit_map = np.zeros(max(len(units), 1), dtype=np.int16)
+    factors = np.ones(max(len(units), 1))
+    for unit, code in units.items():
+        base, factors[code] = base_unit(unit)
+        unit_map[code] = unit_codes[base]
+    per_day = np.full(max(len(frequencies), 1), np.nan)
+    for frequency, code in frequencies.items():
+        value = doses_per_day(frequency)
+        if value is not None:
+            per_day[code] = value
+
+    return DoseFrame(
+        ids=columns["ids"],
+        patients=columns["patients"],
+        medications=medication_map[columns["medications"]],
+        units=unit_map[columns["units"]],
+        daily=columns["quantity"] * factors[columns["units"]] * per_day[columns["frequencies"]],
+        duration=columns["duration"],
+        medication_names=medication_names,
+        unit_names=list(unit_codes),
+    )
+
+
+def dose_select():
+    prescriptions = models.Prescription.__table__
+    return (
+        select(prescriptions.c.id, prescriptions.c.patient_id, prescriptions.c.medication_name,
+               prescriptions.c.quantity, prescriptions.c.dose_unit, prescriptions.c.frequency,
+               prescriptions.c.duration_in_days)
+        .order_by(prescriptions.c.id)
+    )
+
+
+def load_batches(bind: Engine, batch_size: int = DOSE_LOAD_BATCH) -> Iterator[List[tuple]]:
+    # кортежи прямо из DB-API курсора: Row SQLAlchemy на 10M строк стоит дороже самого разбора
+    with bind.connect() as conn:
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(str(dose_select().compile(dialect=conn.dialect)))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+
+def dose_signature(conn) -> Optional[tuple]:
+    """Версия prescriptions из table_versions (ее меняют триггеры на любую правку колонок снимка);
+    на других базах - count(*) и max(id), которые видят только вставки и удаления."""
+    if conn.dialect.name == "sqlite":
+        row = conn.execute(versions.version_select("prescriptions")).first()
+        return tuple(row) if row is not None else None
+    prescriptions = models.Prescription.__table__
+    return tuple(conn.execute(select(func.count(), func.max(prescriptions.c.id)).select_from(prescriptions)).one())
+
+
+class DoseCache:
+    """Снимок DoseFrame; перечитывается, когда меняется dose_signature.
+
+    На SQLite версия читается по первичному ключу при каждом обращении; count(*) на других базах -
+    не чаще раза в DOSE_CACHE_TTL.
+    """
+
+    def __init__(self, ttl: float = DOSE_CACHE_TTL):
+        self.ttl = ttl
+        self._frame: Optional[DoseFrame] = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = Lock()
+
+    def get(self, bind: Engine = engine) -> DoseFrame:
+        if np is None:
+            raise DosesUnavailable("Dose analytics requires the numpy package")
+        ttl = 0.0 if bind.dialect.name == "sqlite" else self.ttl
+        if self._frame is not None and time.monotonic() - self._checked_at < ttl:
+            return self._frame
+        with self._lock:
+            if self._frame is not None and time.monotonic() - self._checked_at < ttl:
+                return self._frame
+            with bind.connect() as conn:
+                signature = dose_signature(conn)
+            if signature != self._signature or self._frame is None:
+                started = time.perf_counter()
+                self._frame = frame_from_batches(load_batches(bind))
+                self._signature = signature
+                print(f"[DOSES] Loaded {len(self._frame)} prescriptions in {time.perf_counter() - started:.3f}s")
+            self._checked_at = time.monotonic()
+            return self._frame
+
+    def invalidate(self):
+        self._checked_at = 0.0
+
+
+dose_cache = DoseCache()
+
+
+def exposure_totals(frame: DoseFrame, mask=None, limit: Optional[int] = None) -> List[dict]:
+    """Сумма экспозиции (суточная доза * дни) и средняя суточная доза по препарату и единице."""
+    groups, daily, exposure = frame.groups, frame.daily, frame.exposure
+    if mask is not None:
+        groups, daily, exposure = groups[mask], daily[mask], exposure[mask]
+    size = len(frame.medication_names) * len(frame.unit_names)
+    known = np.isfinite(exposure)
+    counts = np.bincount(groups, minlength=size)
+    known_counts = np.bincount(groups[known], minlength=size)
+    totals = np.bincount(groups[known], weights=exposure[known], minlength=size)
+    daily_known = np.isfinite(daily)
+    daily_counts = np.bincount(groups[daily_known], minlength=size)
+    daily_sums = np.bincount(groups[daily_known], weights=daily[daily_known], minlength=size)
+
+    present = np.flatnonzero(counts)
+    present = present[np.argsort(-totals[present], kind="stable")]
+    if limit is not None:
+        present = present[:limit]
+    items = []
+    for group in present:
+        medication_name, unit = frame.group_key(group)
+        items.append({
+            "medication_name": medication_name,
+            "unit": unit,
+            "prescriptions": int(counts[group]),
+            "total_exposure": float(totals[group]),
+            "mean_daily_dose": float(daily_sums[group] / daily_counts[group]) if daily_counts[group] else None,
+            "unknown_frequency": int(counts[group] - known_counts[group]),
+        })
+    return items
+
+
+def patient_exposure(frame: DoseFrame, patient_id: int) -> List[dict]:
+    return exposure_totals(frame, frame.patients == patient_id)
+
+
+def medication_exposure(frame: DoseFrame, limit: int = 100) -> List[dict]:
+    return exposure_totals(frame, limit=limit)
+
+
+def outlier_scores(frame: DoseFrame, medication_name: Optional[str] = None,
+                   threshold: float = OUTLIER_THRESHOLD):
+    """Номера строк и модифицированный z-score назначений, чья суточная доза отклоняется от медианы группы."""
+    median, scale, counts = frame.group_stats()
+    groups = frame.groups
+    group_scale = scale[groups]
+    eligible = (counts[groups] >= OUTLIER_MIN_GROUP) & (group_scale > 0) & (frame.daily > 0)
+    if medication_name is not None:
+        wanted = [code for code, name in enumerate(frame.medication_names)
+                  if normalize_drug(name) == normalize_drug(medication_name)]
+        eligible &= np.isin(frame.medications, wanted)
+    rows = np.flatnonzero(eligible)
+    scores = (frame.daily[rows] - median[groups[rows]]) / group_scale[rows]
+    hits = np.abs(scores) > threshold
+    return rows[hits], scores[hits]
+
+
+def outliers(frame: DoseFrame, medication_name: Optional[str] = None, threshold: float = OUTLIER_THRESHOLD,
+             limit: int = 100) -> List[dict]:
+    rows, scores = outlier_scores(frame, medication_name, threshold)
+    median, _, _ = frame.group_stats()
+    magnitude = np.abs(scores)
+    top = np.argpartition(-magnitude, limit)[:limit] if len(scores) > limit else np.arange(len(scores))
+    top = top[np.argsort(-magnitude[top], kind="stable")]
+    items = []
+    for row, score in zip(rows[top], scores[top]):
+        group = frame.groups[row]
+        medication, unit = frame.group_key(group)
+        items.append({
+            "prescription_id": int(frame.ids[row]),
+            "patient_id": int(frame.patients[row]) if frame.patients[row] >= 0 else None,
+            "medication_name": medication,
+            "unit": unit,
+            "daily_dose": float(frame.daily[row]),
+            "median_daily_dose": float(median[group]),
+            "score": round(float(score), 3),
+        })
+    return items
+
+
+def python_baseline(rows: Iterable[tuple]) -> Tuple[Dict[tuple, float], List[tuple]]:
+    """Тот же расчет построчно на dict и statistics: экспозиция по препаратам и выбросы."""
+    totals = defaultdict(float)
+    doses = defaultdict(list)
+    for prescription_id, patient_id, name, quantity, unit, frequency, duration in rows:
+        base, factor = base_unit(unit)
+        per_day = doses_per_day(frequency)
+        if quantity is None or per_day is None:
+            continue
+        key = (normalize_drug(name), base)
+        daily = quantity * factor * per_day
+        if duration is not None:
+            totals[key] += daily * duration
+        if daily > 0:
+            doses[key].append((daily, prescription_id))
+    found = []
+    for key, values in doses.items():
+        if len(values) < OUTLIER_MIN_GROUP:
+            continue
+        median = statistics.median(v for v, _ in values)
+        deviations = [abs(v - median) for v, _ in values]
+        mad = statistics.median(deviations)
+        scale = mad / 0.6745 if mad > 0 else statistics.fmean(deviations) * 1.253314
+        if scale > 0:
+            found += [(i, (v - median) / scale) for v, i in values if abs(v - median) / scale > OUTLIER_THRESHOLD]
+    return totals, found
+
+
+def synthetic_batches(rows: int, batch_size: int = DOSE_LOAD_BATCH, seed: int = 1) -> Iterator[List[tuple]]:
+    generator = random.Random(seed)
+    names = [f"Препарат {i}" for i in range(300)]
+    units = ["мг", "мг", "мг", "г", "мкг", "мл", "таблетка", "капсула"]
+    frequencies = ["1 раз в день", "2 раза в день", "3 раза в день", "Каждые 6 часов", "Каждые 8 часов",
+                   "Перед сном", "Утром натощак", "После еды", "По требованию"]
+    quantities = [0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 25.0, 50.0, 100.0, 250.0, 500.0, 5000.0]
+    patients = range(1, 200000)
+    durations = (7, 14, 30, 60, 90, 180)
+    for start in range(0, rows, batch_size):
+        count = min(batch_size, rows - start)
+        yield list(zip(
+            range(start + 1, start + count + 1), generator.choices(patients, k=count),
+            generator.choices(names, k=count), generator.choices(quantities, k=count),
+            generator.choices(units, k=count), generator.choices(frequencies, k=count),
+            generator.choices(durations, k=count),
+        ))
+
+
+def vector_queries(frame: DoseFrame):
+    medication_exposure(frame, limit=None)
+    patient_exposure(frame, 1)
+    return outlier_scores(frame)
+
+
+def bench(rows: int, baseline_rows: int):
+    """Построчный расчет повторяется на каждый запрос; NumPy строит снимок один раз и считает по нему."""
+    if np is None:
+        raise DosesUnavailable("Dose analytics requires the numpy package")
+    batches = list(synthetic_batches(baseline_rows))
+    started = time.perf_counter()
+    _, python_outliers = python_baseline(row for batch in batches for row in batch)
+    python_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    frame = frame_from_batches(batches)
+    build_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    found, _ = vector_queries(frame)
+    cold_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    vector_queries(frame)
+    warm_seconds = time.perf_counter() - started
+    assert len(found) == len(python_outliers), (len(found), len(python_outliers))
+    print(f"[DOSES] {baseline_rows} rows: pure Python {python_seconds:.3f}s per pass; NumPy build "
+          f"{build_seconds:.3f}s once, first query {cold_seconds:.3f}s, then {warm_seconds:.3f}s "
+          f"(x{python_seconds / warm_seconds:.0f}); {len(found)} outliers in both")
+    del batches, frame
+
+    if rows > baseline_rows:
+        started = time.perf_counter()
+        for _ in synthetic_batches(rows):
+            pass
+        generation_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        frame = frame_from_batches(synthetic_batches(rows))
+        build_seconds = time.perf_counter() - started - generation_seconds
+        started = time.perf_counter()
+        vector_queries(frame)
+        cold_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        vector_queries(frame)
+        print(f"[DOSES] {rows} rows: build {build_seconds:.3f}s (without generating rows), "
+              f"first query {cold_seconds:.3f}s, then {time.perf_counter() - started:.3f}s")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.doses", description="Аналитика доз назначений")
+    parser.add_argument("--bench", action="store_true", help="сравнить NumPy с построчным расчетом")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--baseline-rows", type=int, default=1000000)
+    args = parser.parse_args(argv)
+    if args.bench:
+        bench(args.rows, min(args.baseline_rows, args.rows))
+        return
+    frame = dose_cache.get()
+    for item in medication_exposure(frame, limit=20):
+        print(f"[DOSES] {item['medication_name']}: {item['total_exposure']:.1f} {item['unit']} "
+              f"in {item['prescriptions']} prescriptions")
+
+
+if __name__ == "__main__":
+    main()
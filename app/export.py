@@ -0,0 +1,286 @@
+# app/export.py
+# Выгрузка таблиц целиком: DB-API курсор читается пачками (fetchmany) и каждая пачка сразу
+# пишется в CSV с раскладкой колонок импорта (importer.TABLE_SPECS) или в Parquet / Arrow,
+# со сжатием на лету. Память не зависит от размера таблицы.
+#
+#   python -m app.export prescriptions -o prescriptions.csv.gz [--since-id N] [--since 2024-01-01]
+import argparse
+import csv
+import io
+import os
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional
+
+from sqlalchemy import Date, DateTime, Float, Integer, func, select
+from sqlalchemy.engine import Connection
+
+from .database import engine
+from .importer import SPECS_BY_NAME, TableSpec
+
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 10000))
+GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", 6))
+ZSTD_LEVEL = int(os.getenv("EXPORT_ZSTD_LEVEL", 3))
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+COMPRESSIONS = ("none", "gzip", "zstd")
+COMPRESSION_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+
+class ExportError(ValueError):
+    """Неверные параметры выгрузки."""
+
+
+class ExportUnavailable(RuntimeError):
+    """Формат или сжатие требуют пакета, который не установлен (pyarrow, zstandard)."""
+
+
+class Passthrough:
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def flush(self) -> bytes:
+        return b""
+
+
+def stream_compressor(compression: str):
+    """Потоковый компрессор с интерфейсом zlib: compress(chunk) и flush() в конце."""
+    if compression == "gzip":
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ExportUnavailable("zstd compression requires the zstandard package")
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    return Passthrough()
+
+
+class ChunkSink:
+    """Файлоподобный приемник для pyarrow: записанное забирается drain() после каждой пачки."""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+# created_at лежит текстом в разных видах: '... HH:MM:SS' от CURRENT_TIMESTAMP, '... HH:MM:SS.ffffff'
+# от SQLAlchemy и импорта; strftime приводит обе стороны к одному виду с миллисекундами
+CREATED_AT_FORMAT = "%Y-%m-%d %H:%M:%f"
+
+
+def created_since(column, since: datetime):
+    # значения без зоны хранятся в UTC (CURRENT_TIMESTAMP), поэтому границу с зоной переводим в UTC
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    if engine.dialect.name != "sqlite":
+        return column >= since
+    return func.strftime(CREATED_AT_FORMAT, column) >= func.strftime(CREATED_AT_FORMAT, since.isoformat(sep=" "))
+
+
+@dataclass
+class Export:
+    spec: TableSpec
+    format: str
+    compression: str
+    since_id: Optional[int] = None
+    since: Optional[datetime] = None
+    batch_size: int = EXPORT_BATCH_SIZE
+    rows: int = 0
+
+    @property
+    def media_type(self) -> str:
+        return FORMATS[self.format][0]
+
+    @property
+    def file_name(self) -> str:
+        # у Parquet и Arrow сжатие внутри файла, суффикс .gz/.zst только у CSV
+        suffix = COMPRESSION_SUFFIXES[self.compression] if self.format == "csv" else ""
+        return f"{self.spec.name}.{FORMATS[self.format][1]}{suffix}"
+
+    def select(self):
+        table = self.spec.table
+        stmt = select(*(table.c[column] for column in self.spec.columns))
+        if self.since_id is not None:
+            stmt = stmt.where(table.c.id > self.since_id)
+        if self.since is not None:
+            stmt = stmt.where(created_since(table.c.created_at, self.since))
+        return stmt.order_by(table.c.id)
+
+    def batches(self, conn: Connection) -> Iterator[List[tuple]]:
+        """Сырые кортежи из DB-API курсора: без Row и конвертации типов SQLAlchemy."""
+        compiled = self.select().compile(dialect=conn.dialect)
+        params = compiled.construct_params()
+        for name, value in params.items():
+            processor = compiled.binds[name].type.bind_processor(conn.dialect)
+            if processor is not None:
+                params[name] = processor(value)
+        if compiled.positiontup is not None:
+            params = tuple(params[name] for name in compiled.positiontup)
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(str(compiled), params)
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                self.rows += len(rows)
+                yield rows
+        finally:
+            cursor.close()
+
+    def chunks(self, conn: Connection) -> Iterator[bytes]:
+        if self.format == "csv":
+            return self.csv_chunks(conn)
+        return self.arrow_chunks(conn)
+
+    def csv_chunks(self, conn: Connection) -> Iterator[bytes]:
+        compressor = stream_compressor(self.compression)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(self.spec.columns)
+        for rows in self.batches(conn):
+            writer.writerows(rows)
+            data = compressor.compress(buffer.getvalue().encode("utf-8"))
+            buffer.seek(0)
+            buffer.truncate()
+            if data:
+                yield data
+        yield compressor.compress(buffer.getvalue().encode("utf-8")) + compressor.flush()
+
+    def arrow_chunks(self, conn: Connection) -> Iterator[bytes]:
+        import pyarrow as pa
+
+        schema = arrow_schema(self.spec)
+        sink = ChunkSink()
+        codec = None if self.compression == "none" else self.compression
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+
+            writer = pq.ParquetWriter(sink, schema, compression=codec or "none")
+            write = writer.write_table
+        else:
+            writer = pa.ipc.new_stream(sink, schema, options=pa.ipc.IpcWriteOptions(compression=codec))
+            write = writer.write_batch
+        try:
+            for rows in self.batches(conn):
+                # каждая пачка - отдельная группа строк Parquet / сообщение Arrow
+                columns = [arrow_column(pa, values, field.type) for values, field in zip(zip(*rows), schema)]
+                write(pa.Table.from_arrays(columns, schema=schema) if self.format == "parquet"
+                      else pa.RecordBatch.from_arrays(columns, schema=schema))
+                data = sink.drain()
+                if data:
+                    yield data
+        finally:
+            writer.close()
+        yield sink.drain()
+
+
+def arrow_schema(spec: TableSpec):
+    import pyarrow as pa
+
+    types = {Integer: pa.int64(), Float: pa.float64(), Date: pa.date32(), DateTime: pa.timestamp("us")}
+    fields = []
+    for column in spec.columns:
+        column_type = spec.table.c[column].type
+        fields.append(pa.field(column, next(
+            (arrow_type for sa_type, arrow_type in types.items() if isinstance(column_type, sa_type)), pa.string()
+        )))
+    return pa.schema(fields)
+
+
+def arrow_column(pa, values, arrow_type):
+    # SQLite отдает даты строками ISO - их переводит cast Arrow, а не Python построчно
+    if pa.types.is_temporal(arrow_type) and any(isinstance(value, str) for value in values):
+        return pa.array(values, type=pa.string()).cast(arrow_type)
+    return pa.array(values, type=arrow_type)
+
+
+def prepare_export(table: str, format: str = "csv", compression: str = "none", since_id: Optional[int] = None,
+                   since: Optional[datetime] = None, batch_size: int = EXPORT_BATCH_SIZE) -> Export:
+    """Проверяет параметры и зависимости до начала потока, чтобы ошибка пришла статусом, а не обрывом."""
+    spec = SPECS_BY_NAME.get(table)
+    if spec is None:
+        raise ExportError(f"Unknown table '{table}', expected one of: {', '.join(SPECS_BY_NAME)}")
+    if format not in FORMATS:
+        raise ExportError(f"Unknown format '{format}', expected one of: {', '.join(FORMATS)}")
+    if compression not in COMPRESSIONS:
+        raise ExportError(f"Unknown compression '{compression}', expected one of: {', '.join(COMPRESSIONS)}")
+    if since is not None and "created_at" not in spec.table.c:
+        raise ExportError(f"'{table}' has no created_at column, use since_id")
+    if format == "arrow" and compression == "gzip":
+        raise ExportError("Arrow IPC streams support only zstd compression")
+    if format == "csv":
+        stream_compressor(compression)
+    else:
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ExportUnavailable(f"{format} export requires the pyarrow package")
+    return Export(spec, format, compression, since_id, since, batch_size)
+
+
+def stream_export(export: Export) -> Iterator[bytes]:
+    """Генератор для StreamingResponse: собственное соединение на все время выгрузки."""
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        yield from export.chunks(conn)
+    print(f"[EXPORT] {export.file_name}: {export.rows} rows in {time.perf_counter() - started:.3f}s")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.export", description="Выгрузка таблицы в CSV/Parquet/Arrow")
+    parser.add_argument("table", choices=list(SPECS_BY_NAME))
+    parser.add_argument("-o", "--output", help="файл результата (по умолчанию <table>.<формат>[.gz|.zst])")
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default="none")
+    parser.add_argument("--since-id", type=int, help="только строки с id больше заданного")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="только строки с created_at не раньше")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    try:
+        export = prepare_export(args.table, args.format, args.compression, args.since_id, args.since, args.batch_size)
+    except (ExportError, ExportUnavailable) as e:
+        parser.error(str(e))
+    output = args.output or export.file_name
+    started = time.perf_counter()
+    size = 0
+    with open(output, "wb") as f, engine.connect() as conn:
+        for chunk in export.chunks(conn):
+            f.write(chunk)
+            size += len(chunk)
+    seconds = time.perf_counter() - started
+    print(f"[EXPORT] {output}: {export.rows} rows, {size / 1024 / 1024:.1f} MB in {seconds:.3f}s "
+          f"({export.rows / max(seconds, 1e-9):,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
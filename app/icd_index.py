@@ -0,0 +1,166 @@
+# app/icd_index.py
+# Индекс диагнозов МКБ-10 в памяти: отсортированный массив кодов + bisect.
+# Поиск по префиксу, диапазону и классу МКБ - O(log n + k) без обращения к базе.
+# Перед ответом индекс сверяет сигнатуру диагнозов (версию из table_versions, на других базах -
+# count/max(id)) и перестраивается, если диагнозы изменил другой процесс: импорт или воркер.
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from . import models, schemas, versions
+from .database import IS_SQLITE, SessionLocal
+
+
+# классы МКБ-10: номер -> (римская цифра, первый код, последний код)
+CHAPTERS: Dict[int, Tuple[str, str, str]] = {
+    1: ("I", "A00", "B99"),
+    2: ("II", "C00", "D48"),
+    3: ("III", "D50", "D89"),
+    4: ("IV", "E00", "E90"),
+    5: ("V", "F00", "F99"),
+    6: ("VI", "G00", "G99"),
+    7: ("VII", "H00", "H59"),
+    8: ("VIII", "H60", "H95"),
+    9: ("IX", "I00", "I99"),
+    10: ("X", "J00", "J99"),
+    11: ("XI", "K00", "K93"),
+    12: ("XII", "L00", "L99"),
+    13: ("XIII", "M00", "M99"),
+    14: ("XIV", "N00", "N99"),
+    15: ("XV", "O00", "O99"),
+    16: ("XVI", "P00", "P96"),
+    17: ("XVII", "Q00", "Q99"),
+    18: ("XVIII", "R00", "R99"),
+    19: ("XIX", "S00", "T98"),
+    20: ("XX", "V01", "Y98"),
+    21: ("XXI", "Z00", "Z99"),
+    22: ("XXII", "U00", "U85"),
+}
+ROMAN_CHAPTERS = {roman: number for number, (roman, _, _) in CHAPTERS.items()}
+
+# больше любого символа кода: prefix + END ограничивает все коды, начинающиеся с prefix
+END = "\uffff"
+
+
+def normalize_code(code: str) -> str:
+    return code.strip().upper().replace(" ", "").replace(",", ".")
+
+
+def chapter_number(chapter: str) -> Optional[int]:
+    chapter = chapter.strip().upper()
+    if chapter.isdigit():
+        number = int(chapter)
+        return number if number in CHAPTERS else None
+    return ROMAN_CHAPTERS.get(chapter)
+
+
+def signature_select():
+    if IS_SQLITE:
+        return versions.version_select("diagnoses")
+    return select(func.count(), func.max(models.Diagnosis.id))
+
+
+def row_signature(row) -> Optional[tuple]:
+    return tuple(row) if row is not None else None
+
+
+class IcdIndex:
+    """Отсортированные коды и параллельный список диагнозов.
+
+    Запись идет copy-on-write: читатели берут снимок (codes, items) одной ссылкой
+    и не видят массив в середине вставки.
+    """
+
+    def __init__(self):
+        self._snapshot: Tuple[List[str], List[schemas.Diagnosis]] = ([], [])
+        self._write_lock = Lock()
+        self._rebuild_lock = Lock()
+        self.signature = None
+        self.loaded = False
+
+    def rebuild(self, db: Session, signature=None) -> int:
+        # сигнатура читается до диагнозов: при параллельной записи индекс окажется новее ее, а не старее
+        if signature is None:
+            signature = row_signature(db.execute(signature_select()).first())
+        rows = db.scalars(select(models.Diagnosis).where(models.Diagnosis.icd_code.is_not(None))).all()
+        pairs = sorted(
+            ((normalize_code(row.icd_code), schemas.Diagnosis.model_validate(row))
+             for row in rows if row.icd_code and row.icd_code.strip()),
+            key=itemgetter(0),
+        )
+        with self._write_lock:
+            self._snapshot = ([code for code, _ in pairs], [item for _, item in pairs])
+            self.signature = signature
+            self.loaded = True
+        return len(pairs)
+
+    def is_current(self, signature) -> bool:
+        return self.loaded and signature == self.signature
+
+    def ensure_current(self, signature):
+        with self._rebuild_lock:
+            if self.is_current(signature):
+                return
+            db = SessionLocal()
+            try:
+                codes = self.rebuild(db, signature)
+            finally:
+                db.close()
+            print(f"[ICD] Index rebuilt: {codes} codes")
+
+    def add(self, diagnosis):
+        code = normalize_code(diagnosis.icd_code or "")
+        if not code:
+            return
+        item = schemas.Diagnosis.model_validate(diagnosis)
+        with self._write_lock:
+            codes, items = self._snapshot
+            position = bisect_left(codes, code)
+            codes, items = list(codes), list(items)
+            if position < len(codes) and codes[position] == code:
+                items[position] = item
+            else:
+                codes.insert(position, code)
+                items.insert(position, item)
+            self._snapshot = (codes, items)
+
+    def _slice(self, low: str, high: str, limit: int) -> List[schemas.Diagnosis]:
+        codes, items = self._snapshot
+        start = bisect_left(codes, low)
+        stop = bisect_right(codes, high, lo=start)
+        return items[start:min(stop, start + limit)]
+
+    def get(self, code: str) -> Optional[schemas.Diagnosis]:
+        code = normalize_code(code)
+        codes, items = self._snapshot
+        position = bisect_left(codes, code)
+        if position < len(codes) and codes[position] == code:
+            return items[position]
+        return None
+
+    def prefix(self, prefix: str, limit: int = 100) -> List[schemas.Diagnosis]:
+        """J45 -> J45, J45.0, J45.1, ...; J -> весь класс J."""
+        prefix = normalize_code(prefix)
+        return self._slice(prefix, prefix + END, limit)
+
+    def range(self, start: str, end: str, limit: int = 100) -> List[schemas.Diagnosis]:
+        """Диапазон рубрик включительно: A00-B99 включает и все подрубрики B99.x."""
+        return self._slice(normalize_code(start), normalize_code(end) + END, limit)
+
+    def chapter(self, number: int, limit: int = 100) -> List[schemas.Diagnosis]:
+        _, start, end = CHAPTERS[number]
+        return self.range(start, end, limit)
+
+    def count(self, start: str, end: str) -> int:
+        codes, _ = self._snapshot
+        return bisect_right(codes, normalize_code(end) + END) - bisect_left(codes, normalize_code(start))
+
+    def __len__(self):
+        return len(self._snapshot[0])
+
+
+icd_index = IcdIndex()
@@ -0,0 +1,791 @@
+# app/importer.py
+import argparse
+import codecs
+import csv
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from itertools import islice
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import create_engine, delete, or_, select, update, bindparam, func, tuple_
+from sqlalchemy.engine import Connection
+
+from . import models
+from .database import Base, index_names
+from .lifecycle import fill_end_dates
+from .matching import refresh_match_keys
+
+
+CSV_DIR = os.path.join(os.path.dirname(__file__), "data")
+ENCODINGS = ("utf-8-sig", "cp1251", "latin-1")
+DELIMITERS = ",;\t"
+SAMPLE_SIZE = 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+DEFAULT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 5000))
+DEFAULT_WORKERS = int(os.getenv("IMPORT_WORKERS", 0))
+RANGE_SIZE = int(os.getenv("IMPORT_RANGE_BYTES", 4 * 1024 * 1024))
+LOOKUP_CHUNK = 300
+DATETIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S", "%d.%m.%Y %H:%M:%S", "%d.%m.%Y %H:%M")
+
+
+def to_date(value: str) -> Optional[str]:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(value, "%d.%m.%Y").date().isoformat()
+    except ValueError:
+        raise ValueError(f"invalid date {value!r}")
+
+
+def to_datetime(value: str) -> Optional[str]:
+    if not value:
+        return None
+    for fmt in DATETIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d %H:%M:%S.%f")
+        except ValueError:
+            continue
+    return to_date(value) + " 00:00:00.000000"
+
+
+def to_float(value: str) -> Optional[float]:
+    return float(value.replace(",", ".")) if value else None
+
+
+def to_int(value: str) -> Optional[int]:
+    return int(value) if value else None
+
+
+@dataclass(frozen=True)
+class Link:
+    """Внешний ключ, который заполняется по ФИО из самой строки CSV."""
+    column: str
+    model: type
+    name_columns: Tuple[str, str, str]
+
+
+@dataclass(frozen=True)
+class TableSpec:
+    """Описание CSV-файла: порядок колонок и ключ повторного импорта.
+
+    Справочники обновляются upsert'ом по естественному ключу key. У таблиц событий (жалобы, назначения)
+    естественного ключа нет: строка узнается по хешу колонок row_hash и вставляется, только если такой
+    строки еще не было; законные повторы с тем же пациентом и датой не сливаются.
+    """
+    model: type
+    files: Tuple[str, ...]
+    columns: Tuple[str, ...]
+    key: Tuple[str, ...] = ()
+    converters: Dict[str, Callable[[str], object]] = field(default_factory=dict, hash=False)
+    links: Tuple[Link, ...] = ()
+    row_hash: Tuple[str, ...] = ()
+
+    @property
+    def table(self):
+        return self.model.__table__
+
+    @property
+    def name(self) -> str:
+        return self.model.__tablename__
+
+    @property
+    def write_columns(self) -> Tuple[str, ...]:
+        hashed = ("row_hash",) if self.row_hash else ()
+        return self.columns + hashed + tuple(link.column for link in self.links)
+
+    @property
+    def depends_on(self) -> Tuple[str, ...]:
+        return tuple(link.model.__tablename__ for link in self.links)
+
+    @property
+    def key_index(self):
+        for index in self.table.indexes:
+            if index.unique and tuple(c.name for c in index.columns) == self.key:
+                return index
+        return None
+
+    @property
+    def conflict_target(self) -> list:
+        # выражения уникального индекса (coalesce(middle_name, '')), а не голые колонки ключа
+        index = self.key_index
+        return list(index.expressions) if index is not None else list(self.key)
+
+    def find_file(self, csv_dir: str) -> Optional[str]:
+        for file_name in self.files:
+            path = os.path.join(csv_dir, file_name)
+            if os.path.exists(path):
+                return path
+        return None
+
+
+PATIENT_NAME = ("patient_last_name", "patient_first_name", "patient_middle_name")
+DOCTOR_NAME = ("doctor_last_name", "doctor_first_name", "doctor_middle_name")
+
+TABLE_SPECS = (
+    TableSpec(
+        model=models.Diagnosis,
+        files=("diagnoses.csv",),
+        columns=("icd_code", "name", "category"),
+        key=("icd_code",),
+    ),
+    TableSpec(
+        model=models.Doctor,
+        files=("doctors.csv",),
+        columns=("last_name", "first_name", "middle_name", "specialty",
+                 "department", "email", "phone"),
+        key=("last_name", "first_name", "middle_name", "email"),
+    ),
+    TableSpec(
+        model=models.Patient,
+        files=("patients.csv", "patient.csv"),
+        columns=("last_name", "first_name", "middle_name", "gender", "city",
+                 "street", "building", "email", "birth_date", "phone"),
+        key=("last_name", "first_name", "middle_name", "email"),
+    ),
+    TableSpec(
+        model=models.Symptom,
+        files=("symptoms.csv",),
+        columns=("name", "description", "category_name"),
+        key=("name",),
+    ),
+    TableSpec(
+        model=models.PatientComplaint,
+        files=("patient_complaints.csv",),
+        columns=PATIENT_NAME + ("symptom_name", "complaint_date", "severity", "description"),
+        converters={"complaint_date": to_date},
+        row_hash=PATIENT_NAME + ("symptom_name", "complaint_date", "severity", "description"),
+        links=(Link("patient_id", models.Patient, PATIENT_NAME),),
+    ),
+    TableSpec(
+        model=models.Prescription,
+        files=("prescriptions.csv",),
+        columns=PATIENT_NAME + DOCTOR_NAME + (
+            "medication_name", "quantity", "dose_unit", "frequency", "duration_in_days",
+            "start_date", "end_date", "instructions", "status", "created_at"),
+        converters={"quantity": to_float, "duration_in_days": to_int, "start_date": to_date,
+                    "end_date": to_date, "created_at": to_datetime},
+        # status и end_date меняет сама система (app/lifecycle.py), в хеш они не входят
+        row_hash=PATIENT_NAME + DOCTOR_NAME + (
+            "medication_name", "quantity", "dose_unit", "frequency", "duration_in_days",
+            "start_date", "instructions", "created_at"),
+        links=(Link("patient_id", models.Patient, PATIENT_NAME),
+               Link("doctor_id", models.Doctor, DOCTOR_NAME)),
+    ),
+)
+SPECS_BY_NAME = {spec.name: spec for spec in TABLE_SPECS}
+
+
+def hash_value(value) -> str:
+    # значения после конвертеров и значения из базы дают одну и ту же строку
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def row_digest(values: Iterable) -> str:
+    return hashlib.blake2b("\x1f".join(map(hash_value, values)).encode(), digest_size=16).hexdigest()
+
+
+def detect_encoding(path: str) -> str:
+    with open(path, "rb") as f:
+        sample = f.read(SAMPLE_SIZE)
+    for encoding in ENCODINGS:
+        try:
+            # final=False: выборка может оборваться посреди многобайтового символа
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return ENCODINGS[-1]
+
+
+def detect_delimiter(header: str) -> str:
+    try:
+        return csv.Sniffer().sniff(header, delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        return ","
+
+
+def column_positions(spec: TableSpec, header: List[str]) -> List[int]:
+    """Колонки ищутся по имени, если заголовок их содержит, иначе по порядку."""
+    names = [h.strip().lower() for h in header]
+    if all(column in names for column in spec.columns):
+        return [names.index(column) for column in spec.columns]
+    return list(range(len(spec.columns)))
+
+
+def read_header(spec: TableSpec, path: str, encoding: str) -> Tuple[str, List[int], int]:
+    """Возвращает разделитель, позиции колонок и смещение первой строки данных."""
+    with open(path, "rb") as raw:
+        header_line = raw.readline()
+    text = header_line.decode(encoding)
+    delimiter = detect_delimiter(text)
+    header = next(csv.reader([text], delimiter=delimiter), [])
+    return delimiter, column_positions(spec, header), len(header_line)
+
+
+def iter_rows(spec: TableSpec, reader: Iterable[List[str]], positions: List[int],
+              errors: Optional[List[str]] = None) -> Iterator[tuple]:
+    """Строки отдаются кортежами в порядке spec.columns; невалидные пропускаются."""
+    width = max(positions) + 1
+    pick = itemgetter(*positions)
+    key_slots = [spec.columns.index(column) for column in spec.key or spec.row_hash]
+    hash_slots = [spec.columns.index(column) for column in spec.row_hash]
+    converters = [(spec.columns.index(column), convert) for column, convert in spec.converters.items()]
+    for raw in reader:
+        if len(raw) < width:
+            if not any(raw):
+                continue
+            raw = raw + [""] * (width - len(raw))
+        row = tuple(map(str.strip, pick(raw)))
+        if not any(row[slot] for slot in key_slots):
+            continue
+        if converters:
+            values = list(row)
+            try:
+                for slot, convert in converters:
+                    values[slot] = convert(values[slot])
+            except ValueError as e:
+                if errors is not None:
+                    errors.append(f"{spec.name}: {e}")
+                continue
+            row = tuple(values)
+        if hash_slots:
+            row += (row_digest(row[slot] for slot in hash_slots),)
+        yield row
+
+
+def iter_batches(rows: Iterable[tuple], batch_size: int) -> Iterator[List[tuple]]:
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def split_ranges(path: str, start: int, range_size: int = RANGE_SIZE) -> List[Tuple[int, int]]:
+    """Делит файл на байтовые диапазоны, выровненные по концу строки.
+
+    Поля с переводом строки внутри кавычек при таком делении не поддерживаются.
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        while start < size:
+            end = min(start + range_size, size)
+            if end < size:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_range(spec_name: str, path: str, encoding: str, delimiter: str,
+                positions: List[int], start: int, end: int) -> Tuple[List[tuple], List[str]]:
+    """Выполняется в процессе-воркере: разбирает и проверяет один диапазон файла."""
+    spec = SPECS_BY_NAME[spec_name]
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    errors: List[str] = []
+    reader = csv.reader(io.StringIO(data.decode(encoding), newline=""), delimiter=delimiter)
+    return list(iter_rows(spec, reader, positions, errors)), errors
+
+
+def upsert_statement(conn: Connection, spec: TableSpec):
+    if conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    table = spec.table
+    stmt = insert(table)
+    updates = {c: stmt.excluded[c] for c in spec.write_columns if c not in spec.key}
+    if not updates:
+        return stmt.on_conflict_do_nothing(index_elements=spec.conflict_target)
+    # неизменившиеся строки не перезаписываются, повторный импорт того же файла ничего не пишет
+    changed = or_(*(table.c[c].is_distinct_from(stmt.excluded[c]) for c in updates))
+    return stmt.on_conflict_do_update(index_elements=spec.conflict_target, set_=updates, where=changed)
+
+
+def bulk_writer(conn: Connection, spec: TableSpec) -> Callable[[List[tuple]], None]:
+    """Компилирует upsert (для таблиц событий - INSERT новых хешей) один раз и пишет пачки через executemany."""
+    if spec.row_hash:
+        return append_writer(conn, spec)
+    return compiled_writer(conn, upsert_statement(conn, spec), spec.write_columns)
+
+
+def append_writer(conn: Connection, spec: TableSpec) -> Callable[[List[tuple]], None]:
+    table = spec.table
+    slot = spec.write_columns.index("row_hash")
+    insert_rows = compiled_writer(conn, table.insert(), spec.write_columns)
+
+    def write(batch):
+        fresh = {row[slot]: row for row in batch}
+        hashes = list(fresh)
+        for start in range(0, len(hashes), LOOKUP_CHUNK):
+            stmt = select(table.c.row_hash).where(table.c.row_hash.in_(hashes[start:start + LOOKUP_CHUNK]))
+            for known in conn.execute(stmt).scalars():
+                fresh.pop(known, None)
+        if fresh:
+            insert_rows(list(fresh.values()))
+    return write
+
+
+def compiled_writer(conn: Connection, stmt, columns: Tuple[str, ...]) -> Callable[[List[tuple]], None]:
+    compiled = stmt.compile(dialect=conn.dialect, column_keys=list(columns))
+    if compiled.positiontup is None:
+        def write(batch):
+            conn.execute(stmt, [dict(zip(columns, row)) for row in batch])
+        return write
+
+    sql = str(compiled)
+    order = [columns.index(name) for name in compiled.positiontup]
+    if order == list(range(len(columns))):
+        def write(batch):
+            conn.exec_driver_sql(sql, batch)
+    else:
+        pick = itemgetter(*order)
+
+        def write(batch):
+            conn.exec_driver_sql(sql, [pick(row) for row in batch])
+    return write
+
+
+def resolve_names(conn: Connection, model, names: Iterable[tuple]) -> Dict[tuple, int]:
+    """Находит id по (фамилия, имя, отчество) пачкой запросов вместо запроса на строку."""
+    columns = (model.last_name, model.first_name, func.coalesce(model.middle_name, ""))
+    wanted: Dict[tuple, List[tuple]] = {}
+    for name in names:
+        wanted.setdefault((name[0], name[1], name[2] or ""), []).append(name)
+    keys = list(wanted)
+    found: Dict[tuple, int] = {}
+    for start in range(0, len(keys), LOOKUP_CHUNK):
+        stmt = (
+            select(func.min(model.id), *columns)
+            .where(tuple_(*columns).in_(keys[start:start + LOOKUP_CHUNK]))
+            .group_by(*columns)
+        )
+        for row in conn.execute(stmt):
+            for name in wanted[tuple(row[1:])]:
+                found[name] = row[0]
+    return found
+
+
+def resolve_links(conn: Connection, spec: TableSpec, batch: List[tuple]) -> List[tuple]:
+    if not spec.links:
+        return batch
+    resolved = []
+    for link in spec.links:
+        pick = itemgetter(*(spec.columns.index(column) for column in link.name_columns))
+        ids = resolve_names(conn, link.model, map(pick, batch))
+        resolved.append([ids.get(pick(row)) for row in batch])
+    return [row + tuple(column[i] for column in resolved) for i, row in enumerate(batch)]
+
+
+class DuplicateKeyError(ValueError):
+    """В таблице есть дубли естественного ключа, уникальный индекс создать нельзя."""
+
+
+def ensure_natural_key(conn: Connection, spec: TableSpec, merge: bool = False):
+    """Создает уникальный индекс по естественному ключу.
+
+    Накопившиеся дубликаты сливаются в первую запись только по явному merge=True
+    (python -m app.importer --merge-duplicates), иначе - DuplicateKeyError без изменения данных.
+    """
+    index = spec.key_index
+    if index is None or index.name in index_names(conn, spec.name):
+        return
+
+    table = spec.table
+    # дубли ищутся по выражениям индекса: NULL и пустое отчество - один ключ
+    key_columns = list(index.expressions)
+    keep: Dict[tuple, int] = {}
+    duplicates: Dict[int, int] = {}
+    for row in conn.execute(select(table.c.id, *key_columns).order_by(table.c.id)):
+        key = tuple(row[1:])
+        if key in keep:
+            duplicates[row[0]] = keep[key]
+        else:
+            keep[key] = row[0]
+
+    if duplicates and not merge:
+        raise DuplicateKeyError(
+            f"{len(duplicates)} rows of {spec.name} duplicate the key ({', '.join(spec.key)}); "
+            f"merge them with python -m app.importer --merge-duplicates --tables {spec.name}")
+    if duplicates:
+        params = [{"dup_id": dup, "keep_id": kept} for dup, kept in duplicates.items()]
+        for child in Base.metadata.sorted_tables:
+            for fk in child.foreign_keys:
+                if fk.column.table is table:
+                    conn.execute(
+                        update(child)
+                        .where(fk.parent == bindparam("dup_id"))
+                        .values({fk.parent.name: bindparam("keep_id")}),
+                        params,
+                    )
+        ids = list(duplicates)
+        for start in range(0, len(ids), 500):
+            conn.execute(delete(table).where(table.c.id.in_(ids[start:start + 500])))
+        print(f"[DATA] Removed {len(ids)} duplicate rows from {spec.name}")
+
+    index.create(bind=conn)
+
+
+def fill_row_hashes(conn: Connection, spec: TableSpec) -> int:
+    """row_hash для строк, импортированных до появления колонки: иначе повторный импорт их продублирует."""
+    table = spec.table
+    if not spec.row_hash:
+        return 0
+    rows = conn.execute(
+        select(table.c.id, *(table.c[column] for column in spec.row_hash)).where(table.c.row_hash.is_(None))
+    ).all()
+    if rows:
+        conn.execute(
+            update(table).where(table.c.id == bindparam("row_id")).values(row_hash=bindparam("digest")),
+            [{"row_id": row[0], "digest": row_digest(row[1:])} for row in rows],
+        )
+    return len(rows)
+
+
+def file_digest(path: str, prefix_size: int = 0) -> Tuple[str, Optional[str]]:
+    """Хеш всего файла и, за тот же проход, хеш его первых prefix_size байт."""
+    hasher = hashlib.sha256()
+    prefix_hash = None
+    remaining = prefix_size
+    with open(path, "rb") as f:
+        while remaining > 0:
+            chunk = f.read(min(HASH_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            remaining -= len(chunk)
+        if prefix_size and remaining == 0:
+            prefix_hash = hasher.hexdigest()
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest(), prefix_hash
+
+
+def ends_with_newline(path: str, size: int) -> bool:
+    with open(path, "rb") as f:
+        f.seek(size - 1)
+        return f.read(1) == b"\n"
+
+
+def plan_import(conn: Connection, spec: TableSpec, path: str) -> dict:
+    """Решает, что делать с файлом: пропустить, дочитать добавленный хвост или импортировать целиком."""
+    stat = os.stat(path)
+    file_name = os.path.basename(path)
+    manifest = conn.execute(
+        select(models.ImportManifest).where(models.ImportManifest.file_name == file_name)
+    ).first()
+    plan = {"file_name": file_name, "size": stat.st_size, "mtime": stat.st_mtime,
+            "offset": 0, "encoding": None, "rows": 0}
+
+    if manifest is None or manifest.table_name != spec.name:
+        plan.update(action="import", reason="not imported before", content_hash=file_digest(path)[0])
+        return plan
+
+    plan.update(rows=manifest.row_count or 0, encoding=manifest.encoding)
+    if manifest.size == stat.st_size and manifest.mtime == stat.st_mtime:
+        plan.update(action="skip", reason="size and mtime unchanged", content_hash=manifest.content_hash)
+        return plan
+
+    prefix = manifest.size if 0 < manifest.size < stat.st_size else 0
+    content_hash, prefix_hash = file_digest(path, prefix)
+    plan["content_hash"] = content_hash
+    if content_hash == manifest.content_hash:
+        plan.update(action="skip", reason="content unchanged (only mtime differs)")
+    elif prefix_hash == manifest.content_hash and ends_with_newline(path, manifest.size):
+        plan.update(action="append", offset=manifest.size,
+                    reason=f"file grew by {stat.st_size - manifest.size} bytes")
+    else:
+        plan.update(action="import", reason="content changed", rows=0, encoding=None)
+    return plan
+
+
+def save_manifest(conn: Connection, spec: TableSpec, plan: dict):
+    table = models.ImportManifest.__table__
+    values = {
+        "table_name": spec.name,
+        "size": plan["size"],
+        "mtime": plan["mtime"],
+        "content_hash": plan["content_hash"],
+        "encoding": plan["encoding"],
+        "row_count": plan["rows"],
+    }
+    updated = conn.execute(
+        update(table).where(table.c.file_name == plan["file_name"]).values(**values)
+    )
+    if updated.rowcount == 0:
+        conn.execute(table.insert().values(file_name=plan["file_name"], **values))
+
+
+def skip_unchanged(conn: Connection, spec: TableSpec, plan: dict) -> dict:
+    print(f"[DATA] Skipping {spec.name} ({plan['file_name']}): {plan['reason']}")
+    if plan["reason"] != "size and mtime unchanged":
+        save_manifest(conn, spec, plan)
+    return {"rows": 0, "skipped": plan["reason"]}
+
+
+def report(spec: TableSpec, count: int, encoding: str, started: float, errors: List[str]) -> dict:
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed > 0 else float(count)
+    print(f"✓ Imported {count} {spec.name} using {encoding} encoding "
+          f"in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+    if errors:
+        print(f"✗ Skipped {len(errors)} invalid {spec.name} rows, first: {errors[0]}")
+    return {"rows": count, "invalid": len(errors), "seconds": round(elapsed, 3),
+            "rows_per_sec": round(rate), "encoding": encoding}
+
+
+def import_table(conn: Connection, spec: TableSpec, path: str,
+                 batch_size: int = DEFAULT_BATCH_SIZE, offset: int = 0,
+                 encoding: Optional[str] = None) -> dict:
+    started = time.perf_counter()
+    encoding = encoding or detect_encoding(path)
+    delimiter, positions, data_offset = read_header(spec, path, encoding)
+    ensure_natural_key(conn, spec)
+    write = bulk_writer(conn, spec)
+
+    count = 0
+    errors: List[str] = []
+    with open(path, "rb") as raw:
+        raw.seek(offset or data_offset)
+        f = io.TextIOWrapper(raw, encoding=encoding, newline="")
+        reader = csv.reader(f, delimiter=delimiter)
+        for batch in iter_batches(iter_rows(spec, reader, positions, errors), batch_size):
+            write(resolve_links(conn, spec, batch))
+            count += len(batch)
+
+    return report(spec, count, encoding, started, errors)
+
+
+def sync_table(conn: Connection, spec: TableSpec, path: str,
+               batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+    plan = plan_import(conn, spec, path)
+    if plan["action"] == "skip":
+        return skip_unchanged(conn, spec, plan)
+
+    if plan["action"] == "append":
+        print(f"[INFO] Importing appended rows of {spec.name} from {path}: {plan['reason']}")
+    else:
+        print(f"[INFO] Importing {spec.name} from {path}: {plan['reason']}")
+    stats = import_table(conn, spec, path, batch_size, plan["offset"], plan["encoding"])
+    save_manifest(conn, spec, {**plan, "encoding": stats["encoding"], "rows": plan["rows"] + stats["rows"]})
+    return stats
+
+
+def dependency_order(specs: Iterable[TableSpec]) -> List[TableSpec]:
+    """Упорядочивает таблицы так, чтобы родительские записывались раньше зависимых."""
+    pending = list(specs)
+    names = {spec.name for spec in pending}
+    done = set()
+    ordered = []
+    while pending:
+        ready = [s for s in pending if all(d in done or d not in names for d in s.depends_on)]
+        if not ready:
+            raise ValueError("Circular dependency between tables: " + ", ".join(s.name for s in pending))
+        ordered.extend(ready)
+        done.update(s.name for s in ready)
+        pending = [s for s in pending if s not in ready]
+    return ordered
+
+
+def import_parallel(conn: Connection, specs: Iterable[TableSpec], csv_dir: str = CSV_DIR,
+                    workers: Optional[int] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, dict]:
+    """Разбор CSV в пуле процессов, запись в одном соединении.
+
+    Диапазоны всех файлов отправляются в пул сразу, поэтому независимые таблицы
+    разбираются одновременно, а запись идет в порядке зависимостей: жалобы и
+    назначения пишутся только после пациентов и врачей.
+    """
+    jobs = []
+    stats: Dict[str, dict] = {}
+    for spec in dependency_order(specs):
+        path = spec.find_file(csv_dir)
+        if path is None:
+            continue
+        plan = plan_import(conn, spec, path)
+        if plan["action"] == "skip":
+            stats[spec.name] = skip_unchanged(conn, spec, plan)
+            continue
+        print(f"[INFO] Importing {spec.name} from {path}: {plan['reason']}")
+        encoding = plan["encoding"] or detect_encoding(path)
+        delimiter, positions, data_offset = read_header(spec, path, encoding)
+        ranges = split_ranges(path, plan["offset"] or data_offset)
+        jobs.append((spec, path, plan, encoding, delimiter, positions, ranges))
+
+    if not jobs:
+        return stats
+
+    workers = workers or os.cpu_count() or 1
+    tasks = iter([
+        (spec.name, path, encoding, delimiter, positions, start, end)
+        for spec, path, _, encoding, delimiter, positions, ranges in jobs
+        for start, end in ranges
+    ])
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # не больше двух диапазонов на воркер в полете, чтобы память не росла вместе с файлом
+        in_flight = deque(pool.submit(parse_range, *task) for task in islice(tasks, 2 * workers))
+        for spec, path, plan, encoding, _, _, ranges in jobs:
+            started = time.perf_counter()
+            ensure_natural_key(conn, spec)
+            write = bulk_writer(conn, spec)
+            count = 0
+            errors: List[str] = []
+            for _ in ranges:
+                rows, range_errors = in_flight.popleft().result()
+                for task in islice(tasks, 1):
+                    in_flight.append(pool.submit(parse_range, *task))
+                errors.extend(range_errors)
+                for batch in iter_batches(rows, batch_size):
+                    write(resolve_links(conn, spec, batch))
+                    count += len(batch)
+            stats[spec.name] = report(spec, count, encoding, started, errors)
+            save_manifest(conn, spec, {**plan, "encoding": encoding, "rows": plan["rows"] + count})
+    return stats
+
+
+def import_all(conn: Connection, csv_dir: str = CSV_DIR, batch_size: int = DEFAULT_BATCH_SIZE,
+               workers: int = DEFAULT_WORKERS, tables: Optional[Iterable[str]] = None) -> Dict[str, dict]:
+    specs = [spec for spec in TABLE_SPECS if tables is None or spec.name in tables]
+    if workers > 1:
+        stats = import_parallel(conn, specs, csv_dir, workers, batch_size)
+    else:
+        stats = {}
+        for spec in dependency_order(specs):
+            path = spec.find_file(csv_dir)
+            if path is not None:
+                stats[spec.name] = sync_table(conn, spec, path, batch_size)
+    # upsert пишет пачки напрямую в драйвер, ключи нечеткого поиска для новых пациентов считаются здесь
+    keyed = refresh_match_keys(conn)
+    if keyed:
+        print(f"[DATA] match_key filled for {keyed} patients")
+    filled = fill_end_dates(conn)
+    if filled:
+        print(f"[DATA] end_date filled for {filled} prescriptions")
+    return stats
+
+
+def legacy_import(db, csv_dir: str):
+    """Прежний путь import_csv_data: объект ORM и db.add() на каждую строку."""
+    for spec in TABLE_SPECS[:3]:
+        path = spec.find_file(csv_dir)
+        if path is None:
+            continue
+        with open(path, "r", encoding=detect_encoding(path)) as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                db.add(spec.model(**dict(zip(spec.columns, row))))
+        db.commit()
+
+
+def write_sample_csv(csv_dir: str, rows: int):
+    specs = SPECS_BY_NAME
+    generators = {
+        "diagnoses": (min(rows, 70000), lambda i: [f"{chr(65 + i % 26)}{i // 26:05d}", f"Диагноз {i}", "Терапия"]),
+        "doctors": (max(rows // 100, 10), lambda i: [f"Врач{i}", "Анна", "Петровна", "Терапевт", "Терапия",
+                                                     f"doc{i}@mail.ru", f"7{i:010d}"]),
+        "patients": (rows, lambda i: [f"Иванов{i}", "Иван", "Иванович", "м", "Москва", "Ленина", str(i % 100),
+                                      f"ivan{i}@mail.ru", "01.01.1990", f"7{i:010d}"]),
+    }
+    for name, (count, make_row) in generators.items():
+        with open(os.path.join(csv_dir, specs[name].files[0]), "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(specs[name].columns)
+            writer.writerows(make_row(i) for i in range(count))
+
+
+def run_benchmark(rows: int, workers: int, batch_size: int):
+    """Сравнивает прежний построчный импорт с последовательным и параллельным движком."""
+    from sqlalchemy.orm import Session
+
+    work_dir = tempfile.mkdtemp(prefix="import-bench-")
+    try:
+        csv_dir = os.path.join(work_dir, "csv")
+        os.makedirs(csv_dir)
+        write_sample_csv(csv_dir, rows)
+
+        def fresh_engine(name):
+            bench_engine = create_engine(f"sqlite:///{os.path.join(work_dir, name)}.db")
+            Base.metadata.create_all(bind=bench_engine)
+            return bench_engine
+
+        results = {}
+        started = time.perf_counter()
+        with Session(fresh_engine("legacy")) as db:
+            legacy_import(db, csv_dir)
+        results["legacy (ORM add per row)"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with fresh_engine("serial").begin() as conn:
+            import_all(conn, csv_dir, batch_size, workers=0)
+        results["bulk upsert, serial"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with fresh_engine("parallel").begin() as conn:
+            import_parallel(conn, TABLE_SPECS, csv_dir, workers, batch_size)
+        results[f"bulk upsert, {workers} workers"] = time.perf_counter() - started
+
+        print(f"\n[BENCHMARK] {rows} patients")
+        baseline = results["legacy (ORM add per row)"]
+        for name, seconds in results.items():
+            print(f"  {name:<32} {seconds:8.2f}s  x{baseline / seconds:.1f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.importer", description="Импорт CSV в базу больницы")
+    parser.add_argument("--csv-dir", default=CSV_DIR)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS or os.cpu_count(),
+                        help="число процессов разбора (0 или 1 - без пула)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--tables", help="таблицы через запятую, например patients,prescriptions")
+    parser.add_argument("--merge-duplicates", action="store_true",
+                        help="слить строки справочников с одинаковым естественным ключом перед импортом")
+    parser.add_argument("--benchmark", type=int, metavar="ROWS",
+                        help="сравнить с прежним импортом на синтетических данных")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        run_benchmark(args.benchmark, args.workers, args.batch_size)
+        return
+
+    from .database import engine
+
+    Base.metadata.create_all(bind=engine)
+    tables = args.tables.split(",") if args.tables else None
+    with engine.begin() as conn:
+        if args.merge_duplicates:
+            for spec in TABLE_SPECS:
+                if tables is None or spec.name in tables:
+                    ensure_natural_key(conn, spec, merge=True)
+        import_all(conn, args.csv_dir, args.batch_size, args.workers, tables)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+# app/interactions.py
+# Проверка взаимодействий и дублирования терапии при назначении препарата.
+# Таблица взаимодействий (drug_interactions.csv) и классы препаратов (drug_classes.csv) компилируются
+# в хеш-индекс пар по нормализованному названию; проверка нового препарата против k действующих
+# назначений пациента - один запрос по индексу и k обращений к dict.
+# Файлы перечитываются без перезапуска: раз в INTERACTIONS_RELOAD_INTERVAL секунд сверяются mtime и размер.
+#
+#   python -m app.interactions --bench [--medications 60]   замер проверки на пациенте с N назначениями
+import argparse
+import csv
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime
+from functools import lru_cache
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .importer import CSV_DIR, detect_delimiter, detect_encoding
+
+
+INTERACTIONS_FILE = os.getenv("INTERACTIONS_FILE", os.path.join(CSV_DIR, "drug_interactions.csv"))
+DRUG_CLASSES_FILE = os.getenv("DRUG_CLASSES_FILE", os.path.join(CSV_DIR, "drug_classes.csv"))
+INTERACTIONS_RELOAD_INTERVAL = float(os.getenv("INTERACTIONS_RELOAD_INTERVAL", "5"))
+# тяжесть, при которой назначение не создается без явного allow_interactions
+BLOCKING_SEVERITIES = frozenset(
+    severity.strip() for severity in os.getenv("INTERACTIONS_BLOCKING", "противопоказано").split(",")
+    if severity.strip()
+)
+DUPLICATE = "дублирование"
+
+
+@lru_cache(maxsize=8192)
+def normalize_drug(name: str) -> str:
+    return " ".join((name or "").casefold().replace("ё", "е").split())
+
+
+@dataclass(frozen=True)
+class Interaction:
+    severity: str
+    description: str
+
+
+@dataclass(frozen=True)
+class Finding:
+    prescription_id: Optional[int]
+    medication_name: str
+    severity: str
+    description: str
+
+    @property
+    def blocking(self) -> bool:
+        return self.severity in BLOCKING_SEVERITIES
+
+
+class InteractionConflict(Exception):
+    """Новое назначение противопоказано с действующими назначениями пациента."""
+
+    def __init__(self, findings: List[Finding]):
+        self.findings = findings
+        super().__init__(describe(findings))
+
+
+def describe(findings: Iterable[Finding]) -> str:
+    return "; ".join(f"{f.severity} с {f.medication_name}: {f.description}" for f in findings)
+
+
+def read_rows(path: str, columns: int) -> List[List[str]]:
+    encoding = detect_encoding(path)
+    with open(path, encoding=encoding, newline="") as f:
+        header = f.readline()
+        reader = csv.reader(f, delimiter=detect_delimiter(header))
+        return [[value.strip() for value in row[:columns]] for row in reader if len(row) >= columns]
+
+
+def compile_pairs(interactions: Sequence[Sequence[str]],
+                  classes: Sequence[Sequence[str]]) -> Dict[str, Dict[str, Interaction]]:
+    """Препарат -> {препарат -> взаимодействие}; строки по классам раскрываются в пары препаратов."""
+    members = defaultdict(list)
+    class_names = {}
+    for drug, drug_class in classes:
+        members[normalize_drug(drug_class)].append(normalize_drug(drug))
+        class_names[normalize_drug(drug_class)] = drug_class
+
+    def expand(term: str) -> List[str]:
+        key = normalize_drug(term)
+        return members.get(key) or [key]
+
+    pairs = defaultdict(dict)
+    for key, drugs in members.items():
+        duplicate = Interaction(DUPLICATE, f"Оба препарата - {class_names[key]}")
+        for a in drugs:
+            for b in drugs:
+                if a != b:
+                    pairs[a][b] = duplicate
+    # явная строка таблицы важнее дублирования внутри класса
+    for drug_a, drug_b, severity, description in interactions:
+        interaction = Interaction(severity.casefold(), description)
+        for a in expand(drug_a):
+            for b in expand(drug_b):
+                if a != b:
+                    pairs[a][b] = pairs[b][a] = interaction
+    return dict(pairs)
+
+
+class InteractionIndex:
+    """Снимок индекса пар подменяется одной ссылкой: проверки не ждут перезагрузку файлов."""
+
+    def __init__(self, interactions_path: str = INTERACTIONS_FILE, classes_path: str = DRUG_CLASSES_FILE,
+                 reload_interval: float = INTERACTIONS_RELOAD_INTERVAL):
+        self.interactions_path = interactions_path
+        self.classes_path = classes_path
+        self.reload_interval = reload_interval
+        self._pairs: Dict[str, Dict[str, Interaction]] = {}
+        self._signature = None
+        self._checked_at = 0.0
+        self._reload_lock = Lock()
+        self.loaded_at: Optional[datetime] = None
+
+    def signature(self) -> tuple:
+        stats = []
+        for path in (self.interactions_path, self.classes_path):
+            try:
+                stat = os.stat(path)
+                stats.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stats.append(None)
+        return tuple(stats)
+
+    def load(self) -> int:
+        """Перечитывает оба файла; отсутствующий файл дает пустую таблицу. Возвращает число пар."""
+        signature = self.signature()
+        interactions = read_rows(self.interactions_path, 4) if signature[0] else []
+        classes = read_rows(self.classes_path, 2) if signature[1] else []
+        pairs = compile_pairs(interactions, classes)
+        self._pairs = pairs
+        self._signature = signature
+        self._checked_at = time.monotonic()
+        self.loaded_at = datetime.now()
+        count = sum(len(related) for related in pairs.values()) // 2
+        print(f"[INTERACTIONS] Loaded {count} pairs for {len(pairs)} drugs from {self.interactions_path}")
+        return count
+
+    def reload_if_changed(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = now
+            if self.signature() != self._signature:
+                self.load()
+        except Exception as e:
+            # битый файл не должен ронять назначения: остается предыдущий снимок
+            print(f"[INTERACTIONS] Reload failed, keeping previous table: {e}")
+        finally:
+            self._reload_lock.release()
+
+    def check(self, medication_name: str, active: Iterable[Tuple[Optional[int], str]]) -> List[Finding]:
+        """Сверяет препарат с (id, название) действующих назначений: O(k) обращений к dict."""
+        self.reload_if_changed()
+        name = normalize_drug(medication_name)
+        related = self._pairs.get(name, {})
+        findings = []
+        for prescription_id, other_name in active:
+            other = normalize_drug(other_name)
+            if other == name:
+                findings.append(Finding(prescription_id, other_name, DUPLICATE, "Препарат уже назначен"))
+                continue
+            interaction = related.get(other)
+            if interaction is not None:
+                findings.append(Finding(prescription_id, other_name, interaction.severity, interaction.description))
+        return findings
+
+    def __len__(self):
+        return len(self._pairs)
+
+
+interaction_index = InteractionIndex()
+
+
+def active_medications_select(patient_ids: Iterable[int]):
+    prescriptions = models.Prescription.__table__
+    return select(prescriptions.c.patient_id, prescriptions.c.id, prescriptions.c.medication_name).where(
+        prescriptions.c.patient_id.in_(list(patient_ids)), prescriptions.c.status == models.PRESCRIPTION_ACTIVE)
+
+
+def active_medications(db: Session, patient_ids: Iterable[int]) -> Dict[int, List[Tuple[Optional[int], str]]]:
+    active = defaultdict(list)
+    # Core-запрос через соединение сессии: без ORM-обвязки результата
+    for row in db.connection().execute(active_medications_select(patient_ids)):
+        active[row.patient_id].append((row.id, row.medication_name))
+    return active
+
+
+def check_patient(db: Session, patient_id: int, medication_name: str) -> List[Finding]:
+    return interaction_index.check(medication_name, active_medications(db, [patient_id]).get(patient_id, ()))
+
+
+def check_rows(db: Session, rows: List[dict]) -> Dict[int, List[Finding]]:
+    """Проверка пачки новых назначений: один запрос на всех пациентов пачки.
+
+    Действующие назначения, идущие в пачке раньше, тоже участвуют в проверке следующих строк.
+    """
+    wanted = [row for row in rows if row.get("patient_id") is not None and row.get("status") == models.PRESCRIPTION_ACTIVE]
+    if not wanted:
+        return {}
+    active = active_medications(db, {row["patient_id"] for row in wanted})
+    findings = {}
+    for index, row in enumerate(rows):
+        if row.get("patient_id") is None or row.get("status") != models.PRESCRIPTION_ACTIVE:
+            continue
+        found = interaction_index.check(row["medication_name"], active[row["patient_id"]])
+        if found:
+            findings[index] = found
+        if not any(f.blocking for f in found):
+            active[row["patient_id"]].append((None, row["medication_name"]))
+    return findings
+
+
+def bench(medications: int, checks: int):
+    """Пациент с medications действующими назначениями в базе в памяти; замер запроса и проверки."""
+    from sqlalchemy import create_engine, insert
+
+    from .database import Base
+
+    interaction_index.load()
+    drugs = sorted(interaction_index._pairs) or ["препарат"]
+    names = [drugs[i % len(drugs)] + ("" if i < len(drugs) else f" {i}") for i in range(medications)]
+    bench_engine = create_engine("sqlite://")
+    Base.metadata.create_all(bench_engine)
+    with Session(bench_engine) as db:
+        db.execute(insert(models.Patient), [{"id": 1, "last_name": "Тест", "first_name": "Тест"}])
+        db.execute(insert(models.Prescription), [
+            {"patient_id": 1, "patient_last_name": "Тест", "patient_first_name": "Тест", "medication_name": name,
+             "start_date": date(2024, 1, 1 + i % 28), "status": models.PRESCRIPTION_ACTIVE}
+            for i, name in enumerate(names)
+        ])
+        db.commit()
+        active = active_medications(db, [1])[1]
+
+        started = time.perf_counter()
+        found = 0
+        for i in range(checks):
+            found += len(interaction_index.check(drugs[i % len(drugs)], active))
+        in_memory = (time.perf_counter() - started) / checks
+
+        queried = max(checks // 10, 1)
+        started = time.perf_counter()
+        for i in range(queried):
+            check_patient(db, 1, drugs[i % len(drugs)])
+        with_query = (time.perf_counter() - started) / queried
+    print(f"[INTERACTIONS] {medications} active prescriptions: index check {in_memory * 1e6:.1f} us, "
+          f"with query {with_query * 1e6:.1f} us ({found / checks:.1f} findings per check)")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.interactions", description="Взаимодействия препаратов")
+    parser.add_argument("--bench", action="store_true", help="замер проверки на синтетическом пациенте")
+    parser.add_argument("--medications", type=int, default=60, help="число действующих назначений пациента")
+    parser.add_argument("--checks", type=int, default=20000)
+    args = parser.parse_args(argv)
+    if args.checks < 1:
+        parser.error("--checks must be at least 1")
+    if args.bench:
+        bench(args.medications, args.checks)
+    else:
+        interaction_index.load()
+
+
+if __name__ == "__main__":
+    main()
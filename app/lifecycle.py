@@ -0,0 +1,151 @@
+# app/lifecycle.py
+# Жизненный цикл назначений: end_date = start_date + duration_in_days считается при создании,
+# а фоновая задача переводит действующие назначения с прошедшей end_date в "завершено"
+# пачками UPDATE по индексу (status, end_date). Счетчики статистики поправляют триггеры.
+#
+#   python -m app.lifecycle [--date 2026-01-01]   разовый прогон на дату (по умолчанию сегодня)
+import argparse
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.engine import Connection, Engine
+
+from . import models
+from .database import engine
+
+
+PRESCRIPTION_EXPIRY_INTERVAL = float(os.getenv("PRESCRIPTION_EXPIRY_INTERVAL", "900"))
+EXPIRY_BATCH_SIZE = int(os.getenv("PRESCRIPTION_EXPIRY_BATCH_SIZE", 5000))
+EXPIRY_HISTORY = int(os.getenv("PRESCRIPTION_EXPIRY_HISTORY", 100))
+
+
+@dataclass
+class ExpiryRun:
+    started_at: datetime
+    as_of: date
+    expired: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+# метрики прогонов в памяти процесса: последние EXPIRY_HISTORY запусков и суммы с момента старта
+runs = deque(maxlen=EXPIRY_HISTORY)
+totals = {"runs": 0, "failures": 0, "expired": 0}
+
+
+def end_date_for(start_date: Optional[date], duration_in_days: Optional[int]) -> Optional[date]:
+    if start_date is None or duration_in_days is None:
+        return None
+    return start_date + timedelta(days=duration_in_days)
+
+
+def with_end_date(values: dict) -> dict:
+    """end_date из start_date и duration_in_days, если клиент не передал ее явно."""
+    if values.get("end_date") is not None:
+        return values
+    return {**values, "end_date": end_date_for(values.get("start_date"), values.get("duration_in_days"))}
+
+
+def end_date_expr(conn: Connection):
+    prescriptions = models.Prescription.__table__
+    if conn.dialect.name == "sqlite":
+        return func.date(prescriptions.c.start_date, func.printf("+%d days", prescriptions.c.duration_in_days))
+    return prescriptions.c.start_date + prescriptions.c.duration_in_days
+
+
+def fill_end_dates(conn: Connection) -> int:
+    """Одним UPDATE заполняет end_date у строк без нее (импорт CSV и старые базы)."""
+    prescriptions = models.Prescription.__table__
+    result = conn.execute(
+        update(prescriptions)
+        .where(prescriptions.c.end_date.is_(None), prescriptions.c.start_date.is_not(None),
+               prescriptions.c.duration_in_days.is_not(None))
+        .values(end_date=end_date_expr(conn))
+    )
+    return result.rowcount
+
+
+def expire_select(as_of: date, batch_size: int):
+    prescriptions = models.Prescription.__table__
+    return (
+        select(prescriptions.c.id)
+        .where(prescriptions.c.status == models.PRESCRIPTION_ACTIVE, prescriptions.c.end_date < as_of)
+        .limit(batch_size)
+    )
+
+
+def expire_prescriptions(bind: Engine = engine, as_of: Optional[date] = None,
+                         batch_size: int = EXPIRY_BATCH_SIZE) -> ExpiryRun:
+    """Завершает назначения, у которых end_date раньше as_of.
+
+    Каждая пачка - отдельная транзакция, чтобы не держать блокировку записи SQLite на весь прогон.
+    """
+    run = ExpiryRun(started_at=datetime.now(), as_of=as_of or date.today())
+    started = time.perf_counter()
+    prescriptions = models.Prescription.__table__
+    stmt = (
+        update(prescriptions)
+        .where(prescriptions.c.id.in_(expire_select(run.as_of, batch_size).scalar_subquery()))
+        .values(status=models.PRESCRIPTION_COMPLETED)
+    )
+    try:
+        while True:
+            with bind.begin() as conn:
+                expired = conn.execute(stmt).rowcount
+            run.expired += expired
+            run.batches += 1
+            if expired < batch_size:
+                break
+    except Exception as e:
+        run.error = str(e)
+        raise
+    finally:
+        run.seconds = round(time.perf_counter() - started, 6)
+        runs.append(run)
+        totals["runs"] += 1
+        totals["expired"] += run.expired
+        totals["failures"] += run.error is not None
+    print(f"[LIFECYCLE] Expired {run.expired} prescriptions ending before {run.as_of} "
+          f"in {run.batches} batches, {run.seconds:.3f}s")
+    return run
+
+
+def metrics() -> dict:
+    return {
+        "interval": PRESCRIPTION_EXPIRY_INTERVAL,
+        **totals,
+        "runs_recent": [asdict(run) for run in reversed(runs)],
+    }
+
+
+async def expiry_loop(interval: float = PRESCRIPTION_EXPIRY_INTERVAL):
+    # первый прогон сразу при старте: назначения могли истечь, пока сервис не работал
+    while True:
+        try:
+            await asyncio.to_thread(expire_prescriptions)
+        except Exception as e:
+            print(f"[LIFECYCLE] Expiry run failed: {e}")
+        await asyncio.sleep(interval)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.lifecycle", description="Завершение истекших назначений")
+    parser.add_argument("--date", type=date.fromisoformat, help="дата, на которую завершать (по умолчанию сегодня)")
+    parser.add_argument("--batch-size", type=int, default=EXPIRY_BATCH_SIZE)
+    args = parser.parse_args(argv)
+    with engine.begin() as conn:
+        filled = fill_end_dates(conn)
+    if filled:
+        print(f"[LIFECYCLE] end_date filled for {filled} prescriptions")
+    expire_prescriptions(engine, args.date, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 # app/main.py
 from fastapi import FastAPI
+import asyncio
 from contextlib import asynccontextmanager
 from datetime import datetime
 import os
 import sys
+import time
 from pathlib import Path
 import traceback  # Добавляем импорт traceback
 
@@ -32,7 +34,11 @@ sys.path.insert(0, str(project_root))
 
 
 try:
-    from app.database import engine, Base, SessionLocal, get_db
+    from app.database import engine, Base, SessionLocal, get_db, DB_MAINTENANCE_INTERVAL, maintenance_loop
+    from app.icd_index import icd_index
+    from app.interactions import interaction_index
+    from app.lifecycle import PRESCRIPTION_EXPIRY_INTERVAL, expiry_loop
+    from app.migrations import upgrade
     from app.utils import import_csv_data
 
     print("[INFO] Core modules imported successfully")
@@ -45,6 +51,11 @@ try:
         from app.routes.diagnoses import router as diagnoses_router
         from app.routes.prescriptions import router as prescriptions_router
         from app.routes.complaints import router as complaints_router
+        from app.routes.symptoms import router as symptoms_router
+        from app.routes.search import router as search_router
+        from app.routes.stats import router as stats_router
+        from app.routes.export import router as export_router
+        from app.routes.doses import router as doses_router
 
         print("[INFO] All routers imported successfully")
     except ImportError as e:
@@ -60,6 +71,11 @@ try:
         diagnoses_router = APIRouter()
         prescriptions_router = APIRouter()
         complaints_router = APIRouter()
+        symptoms_router = APIRouter()
+        search_router = APIRouter()
+        stats_router = APIRouter()
+        export_router = APIRouter()
+        doses_router = APIRouter()
 
 
         @auth_router.get("/test")
@@ -79,29 +95,55 @@ except ImportError as e:
 async def lifespan(app: FastAPI):
 
     print("[STARTUP] Starting up Hospital Management API...")
+    started = time.perf_counter()
 
     try:
 
         print("[DATABASE] Creating database tables...")
-        Base.metadata.create_all(bind=engine)
-        print("[DATABASE] Database tables created successfully!")
+        upgrade(engine)
+        print(f"[DATABASE] Database tables created successfully! ({time.perf_counter() - started:.3f}s)")
 
 
         print("[DATA] Importing CSV data...")
+        import_started = time.perf_counter()
         db = SessionLocal()
         try:
             import_csv_data(db)
         finally:
             db.close()
+        print(f"[DATA] CSV import step took {time.perf_counter() - import_started:.3f}s")
+
+        index_started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            codes = icd_index.rebuild(db)
+        finally:
+            db.close()
+        print(f"[DATA] ICD index: {codes} codes in {time.perf_counter() - index_started:.3f}s")
+
+        interaction_index.load()
 
     except Exception as e:
         print(f"[ERROR] Error during startup: {e}")
         traceback.print_exc()
 
+    maintenance = None
+    if DB_MAINTENANCE_INTERVAL > 0:
+        maintenance = asyncio.create_task(maintenance_loop(DB_MAINTENANCE_INTERVAL))
+    expiry = None
+    if PRESCRIPTION_EXPIRY_INTERVAL > 0:
+        expiry = asyncio.create_task(expiry_loop(PRESCRIPTION_EXPIRY_INTERVAL))
+
+    print(f"[STARTUP] Ready in {time.perf_counter() - started:.3f}s")
+
     yield
 
 
     print("[SHUTDOWN] Shutting down...")
+    if maintenance is not None:
+        maintenance.cancel()
+    if expiry is not None:
+        expiry.cancel()
 
 
 
@@ -119,6 +161,11 @@ app.include_router(doctors_router, prefix="/api/doctors", tags=["doctors"])
 app.include_router(diagnoses_router, prefix="/api/diagnoses", tags=["diagnoses"])
 app.include_router(prescriptions_router, prefix="/api/prescriptions", tags=["prescriptions"])
 app.include_router(complaints_router, prefix="/api/complaints", tags=["complaints"])
+app.include_router(symptoms_router, prefix="/api/symptoms", tags=["symptoms"])
+app.include_router(search_router, prefix="/api", tags=["search"])
+app.include_router(stats_router, prefix="/api", tags=["stats"])
+app.include_router(export_router, prefix="/api", tags=["export"])
+app.include_router(doses_router, prefix="/api", tags=["doses"])
 
 
 @app.get("/")
@@ -0,0 +1,349 @@
+# app/matching.py
+# Нечеткое сопоставление пациентов по ФИО. Кандидаты выбираются блоками по фонетическому
+# ключу (patients.match_key, индекс) и, если известна, по дате рождения; внутри блока
+# ФИО сравниваются расстоянием Левенштейна. Попарного сравнения по всей таблице нет.
+#
+#   python -m app.matching --backfill [--dry-run]   привязать жалобы и назначения с patient_id = NULL
+import argparse
+import os
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, bindparam, or_, select, update
+from sqlalchemy.engine import Connection, Engine
+
+from . import models
+from .database import engine
+
+
+MATCH_THRESHOLD = float(os.getenv("MATCH_THRESHOLD", 0.9))
+# лучший кандидат должен опережать второго хотя бы на столько, иначе совпадение неоднозначно
+MATCH_MARGIN = float(os.getenv("MATCH_MARGIN", 0.05))
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", 5000))
+
+KEY_LENGTH = int(os.getenv("MATCH_KEY_LENGTH", 6))
+# фамилия, непохожая больше чем на треть, дальше не сравнивается
+LAST_NAME_FLOOR = 0.67
+KEYS_PER_QUERY = 500
+
+# звонкие и глухие пары и близкие по звучанию согласные дают один код; гласные, й, ь, ъ опускаются
+PHONETIC_CODES = {
+    **dict.fromkeys("бп", "P"), **dict.fromkeys("вф", "F"), **dict.fromkeys("гкх", "K"),
+    **dict.fromkeys("дт", "T"), **dict.fromkeys("жшщ", "S"), **dict.fromkeys("зсц", "Z"),
+    "ч": "C", "л": "L", "м": "M", "н": "N", "р": "R",
+}
+VOWELS = set("аеиоуыэюяйьъaeiouy")
+
+NAME_WEIGHTS = {"last_name": 0.5, "first_name": 0.3, "middle_name": 0.2}
+BIRTH_DATE_WEIGHT = 0.3
+PHONE_WEIGHT = 0.2
+
+CANDIDATE_COLUMNS = (
+    models.Patient.id, models.Patient.last_name, models.Patient.first_name,
+    models.Patient.middle_name, models.Patient.birth_date, models.Patient.phone,
+)
+
+
+@lru_cache(maxsize=65536)
+def normalize_name(value: Optional[str]) -> str:
+    return (value or "").strip().lower().replace("ё", "е")
+
+
+def phonetic_code(value: Optional[str]) -> str:
+    """Фонетический код слова: первая буква (любая гласная -> A) и коды согласных без повторов."""
+    letters = [c for c in normalize_name(value) if c.isalpha()]
+    if not letters:
+        return ""
+    codes = ["A" if letters[0] in VOWELS else PHONETIC_CODES.get(letters[0], letters[0].upper())]
+    for letter in letters[1:]:
+        if letter in VOWELS:
+            continue
+        code = PHONETIC_CODES.get(letter, letter.upper())
+        if code != codes[-1]:
+            codes.append(code)
+    return "".join(codes)[:KEY_LENGTH]
+
+
+def patient_match_key(last_name: Optional[str], first_name: Optional[str]) -> str:
+    """Ключ блока: код фамилии и первая буква кода имени (Иванова Елена -> AFNF:A)."""
+    return f"{phonetic_code(last_name)}:{phonetic_code(first_name)[:1]}"
+
+
+def phone_digits(value: Optional[str]) -> str:
+    # последние 10 цифр: +7 900 ..., 8 900 ... и 900 ... считаются одним номером
+    return re.sub(r"\D", "", value or "")[-10:]
+
+
+def levenshtein(a: str, b: str) -> int:
+    """Расстояние Левенштейна, бит-параллельный алгоритм Майерса (Hyyro):
+    один проход по a с целочисленными битовыми операциями вместо матрицы len(a) x len(b)."""
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return len(a)
+    peq = {}
+    for i, char in enumerate(b):
+        peq[char] = peq.get(char, 0) | (1 << i)
+    # int в Python - бесконечное дополнительное до двух число: старшие биты не влияют на младшие
+    pv, mv, distance, last = -1, 0, len(b), 1 << (len(b) - 1)
+    for char in a:
+        eq = peq.get(char, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & last:
+            distance += 1
+        elif mh & last:
+            distance -= 1
+        ph = (ph << 1) | 1
+        mh <<= 1
+        pv = mh | ~(xv | ph)
+        mv = ph & xv
+    return distance
+
+
+@lru_cache(maxsize=65536)
+def similarity(a: str, b: str, floor: float = 0.0) -> float:
+    """1 - расстояние / длина большей строки; все, что ниже floor, возвращается как 0."""
+    longest = max(len(a), len(b))
+    if longest == 0:
+        return 1.0
+    if abs(len(a) - len(b)) > longest * (1 - floor):
+        return 0.0
+    value = 1 - levenshtein(a, b) / longest
+    return value if value >= floor else 0.0
+
+
+@dataclass(frozen=True)
+class MatchQuery:
+    last_name: str
+    first_name: str
+    middle_name: Optional[str] = None
+    birth_date: Optional[str] = None
+    phone: Optional[str] = None
+
+    @property
+    def match_key(self) -> str:
+        return patient_match_key(self.last_name, self.first_name)
+
+
+@dataclass(frozen=True)
+class MatchDecision:
+    patient_id: Optional[int]
+    status: str  # linked | ambiguous | unmatched
+    score: float = 0.0
+
+
+def score(candidate, query: MatchQuery) -> float:
+    """Взвешенное сходство 0..1; поля, не заданные с одной из сторон, не учитываются."""
+    total = weight_sum = 0.0
+    last = similarity(normalize_name(candidate.last_name), normalize_name(query.last_name), LAST_NAME_FLOOR)
+    if last == 0.0:
+        return 0.0
+    parts = [(NAME_WEIGHTS["last_name"], last),
+             (NAME_WEIGHTS["first_name"],
+              similarity(normalize_name(candidate.first_name), normalize_name(query.first_name)))]
+    if candidate.middle_name and query.middle_name:
+        parts.append((NAME_WEIGHTS["middle_name"],
+                      similarity(normalize_name(candidate.middle_name), normalize_name(query.middle_name))))
+    if candidate.birth_date and query.birth_date:
+        parts.append((BIRTH_DATE_WEIGHT, float(candidate.birth_date == query.birth_date)))
+    if candidate.phone and query.phone and phone_digits(candidate.phone) and phone_digits(query.phone):
+        parts.append((PHONE_WEIGHT, float(phone_digits(candidate.phone) == phone_digits(query.phone))))
+    for weight, value in parts:
+        total += weight * value
+        weight_sum += weight
+    return total / weight_sum
+
+
+def rank(candidates: Iterable, query: MatchQuery, limit: Optional[int] = None) -> List[Tuple[object, float]]:
+    scored = [(candidate, score(candidate, query)) for candidate in candidates]
+    scored = sorted((pair for pair in scored if pair[1] > 0), key=lambda pair: (-pair[1], pair[0].id))
+    return scored[:limit] if limit is not None else scored
+
+
+def decide(ranked: Sequence[Tuple[object, float]], threshold: float = MATCH_THRESHOLD,
+           margin: float = MATCH_MARGIN) -> MatchDecision:
+    if not ranked or ranked[0][1] < threshold:
+        return MatchDecision(None, "unmatched", ranked[0][1] if ranked else 0.0)
+    best, best_score = ranked[0]
+    if len(ranked) > 1 and ranked[1][1] > best_score - margin:
+        return MatchDecision(None, "ambiguous", best_score)
+    return MatchDecision(best.id, "linked", best_score)
+
+
+def candidates_select(keys: Iterable[str], birth_date: Optional[str] = None, columns: Sequence = CANDIDATE_COLUMNS):
+    """Пациенты из блоков match_key IN keys (и с той же датой рождения, если она задана)."""
+    criteria = [models.Patient.match_key.in_(list(keys))]
+    if birth_date:
+        criteria.append(models.Patient.birth_date == birth_date)
+    return select(*columns).where(or_(*criteria))
+
+
+def refresh_match_keys(conn: Connection, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Заполняет match_key там, где он пуст (строки из импорта CSV и из старых баз)."""
+    patients = models.Patient.__table__
+    stmt = update(patients).where(patients.c.id == bindparam("b_id")).values(match_key=bindparam("b_key"))
+    updated = 0
+    while True:
+        rows = conn.execute(
+            select(patients.c.id, patients.c.last_name, patients.c.first_name)
+            .where(patients.c.match_key.is_(None)).limit(batch_size)
+        ).all()
+        if not rows:
+            return updated
+        conn.execute(stmt, [{"b_id": row.id, "b_key": patient_match_key(row.last_name, row.first_name)}
+                            for row in rows])
+        updated += len(rows)
+
+
+def match_in_blocks(patients: Iterable, names: Iterable[tuple], threshold: float = MATCH_THRESHOLD,
+                    margin: float = MATCH_MARGIN) -> Dict[tuple, MatchDecision]:
+    """Решения для набора (фамилия, имя, отчество); patients - строки с match_key из нужных блоков."""
+    # блок -> фамилия -> пациенты: сходство фамилии считается один раз на фамилию, а не на пациента
+    blocks = defaultdict(lambda: defaultdict(list))
+    for row in patients:
+        blocks[row.match_key][normalize_name(row.last_name)].append(row)
+
+    decisions = {}
+    for name in names:
+        last_name = normalize_name(name[0])
+        by_last_name = blocks.get(patient_match_key(name[0], name[1]), {})
+        candidates = [row for candidate_last, rows in by_last_name.items()
+                      if similarity(candidate_last, last_name, LAST_NAME_FLOOR) for row in rows]
+        decisions[name] = decide(rank(candidates, MatchQuery(*name)), threshold, margin)
+    return decisions
+
+
+# записи без пациента, разложенные по ключам блоков; временная таблица живет в одном соединении
+work_metadata = MetaData()
+match_work = Table(
+    "match_work", work_metadata,
+    Column("match_key", String, index=True),
+    Column("source", Integer),
+    Column("row_id", Integer),
+    Column("last_name", String),
+    Column("first_name", String),
+    Column("middle_name", String),
+    prefixes=["TEMPORARY"],
+)
+BACKFILL_SOURCES = (models.PatientComplaint, models.Prescription)
+
+
+def collect_orphans(conn: Connection, batch_size: int) -> Dict[str, dict]:
+    """Первый проход: записи с patient_id = NULL пачками по id -> match_work с ключом блока."""
+    stats = {}
+    for source, model in enumerate(BACKFILL_SOURCES):
+        table = model.__table__
+        counts = stats[table.name] = {"scanned": 0, "linked": 0, "ambiguous": 0, "unmatched": 0}
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                select(table.c.id, table.c.patient_last_name, table.c.patient_first_name,
+                       table.c.patient_middle_name)
+                .where(table.c.patient_id.is_(None), table.c.id > last_id)
+                .order_by(table.c.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            conn.execute(match_work.insert(), [
+                {"match_key": patient_match_key(row[1], row[2]), "source": source, "row_id": row.id,
+                 "last_name": row[1] or "", "first_name": row[2] or "", "middle_name": row[3] or ""}
+                for row in rows
+            ])
+            counts["scanned"] += len(rows)
+    return stats
+
+
+def backfill(bind: Engine = engine, batch_size: int = BACKFILL_BATCH_SIZE, threshold: float = MATCH_THRESHOLD,
+             margin: float = MATCH_MARGIN, dry_run: bool = False) -> Dict[str, dict]:
+    """Привязывает жалобы и назначения без patient_id к пациентам с уверенным совпадением.
+
+    Сирот раскладывает по ключам блоков, затем идет по диапазонам ключей: каждый блок пациентов
+    читается один раз (диапазон по индексу match_key), и каждая запись сравнивается только с ним.
+    Каждый диапазон - отдельная транзакция; прерванную задачу можно просто запустить снова.
+    """
+    started = time.perf_counter()
+    with bind.connect() as conn:
+        keyed = refresh_match_keys(conn)
+        if keyed:
+            print(f"[MATCH] match_key filled for {keyed} patients")
+        match_work.drop(conn, checkfirst=True)
+        match_work.create(conn)
+        stats = collect_orphans(conn, batch_size)
+        conn.commit()
+        table_names = list(stats)
+        print(f"[MATCH] {sum(c['scanned'] for c in stats.values())} orphan rows collected "
+              f"in {time.perf_counter() - started:.3f}s")
+
+        updates = [
+            update(model.__table__).where(model.__table__.c.id == bindparam("b_id"))
+            .values(patient_id=bindparam("b_patient_id"))
+            for model in BACKFILL_SOURCES
+        ]
+        low = ""
+        while True:
+            keys = conn.execute(
+                select(match_work.c.match_key).where(match_work.c.match_key > low)
+                .group_by(match_work.c.match_key).order_by(match_work.c.match_key).limit(KEYS_PER_QUERY)
+            ).scalars().all()
+            if not keys:
+                break
+            high = keys[-1]
+            orphans = conn.execute(
+                select(match_work).where(match_work.c.match_key > low, match_work.c.match_key <= high)
+            ).all()
+            patients = conn.execute(
+                select(*CANDIDATE_COLUMNS, models.Patient.match_key)
+                .where(models.Patient.match_key > low, models.Patient.match_key <= high)
+            ).all()
+            decisions = match_in_blocks(
+                patients, {(row.last_name, row.first_name, row.middle_name) for row in orphans}, threshold, margin
+            )
+
+            links = defaultdict(list)
+            for row in orphans:
+                decision = decisions[(row.last_name, row.first_name, row.middle_name)]
+                stats[table_names[row.source]][decision.status] += 1
+                if decision.patient_id is not None:
+                    links[row.source].append({"b_id": row.row_id, "b_patient_id": decision.patient_id})
+            if not dry_run:
+                for source, rows in links.items():
+                    conn.execute(updates[source], rows)
+            conn.commit()
+            low = high
+
+        match_work.drop(conn)
+        conn.commit()
+    for name, counts in stats.items():
+        print(f"[MATCH] {name}: {counts}")
+    print(f"[MATCH] Backfill {'(dry run) ' if dry_run else ''}took {time.perf_counter() - started:.3f}s")
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.matching",
+                                     description="Нечеткая привязка жалоб и назначений к пациентам")
+    parser.add_argument("--backfill", action="store_true", help="привязать записи с patient_id = NULL")
+    parser.add_argument("--dry-run", action="store_true", help="только посчитать, ничего не записывать")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    parser.add_argument("--threshold", type=float, default=MATCH_THRESHOLD)
+    parser.add_argument("--margin", type=float, default=MATCH_MARGIN)
+    args = parser.parse_args(argv)
+
+    if not args.backfill:
+        parser.print_help()
+        return
+    backfill(engine, args.batch_size, args.threshold, args.margin, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
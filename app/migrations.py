@@ -0,0 +1,231 @@
+# app/migrations.py
+import argparse
+import sys
+from dataclasses import dataclass
+from datetime import date
+from typing import List
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateColumn
+
+from . import crud, interactions, lifecycle, matching, models, search, stats, versions
+from .database import Base, engine, index_names
+
+# уникальные ключи прежних версий: сливали законные повторы жалоб и назначений,
+# а ключи пациентов и врачей по голому middle_name пропускали дубли с NULL-отчеством
+OBSOLETE_INDEXES = {
+    "patient_complaints": ("uq_patient_complaints_natural_key",),
+    "prescriptions": ("uq_prescriptions_natural_key",),
+    "patients": ("uq_patients_natural_key",),
+    "doctors": ("uq_doctors_natural_key",),
+}
+
+
+def add_missing_columns(conn: Connection, table) -> List[str]:
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    applied = []
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        ddl = CreateColumn(column).compile(dialect=conn.dialect)
+        conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+        applied.append(f"column {table.name}.{column.name}")
+    return applied
+
+
+def drop_obsolete_indexes(conn: Connection, table) -> List[str]:
+    existing = index_names(conn, table.name)
+    applied = []
+    for name in OBSOLETE_INDEXES.get(table.name, ()):
+        if name in existing:
+            conn.exec_driver_sql(f"DROP INDEX {name}")
+            applied.append(f"dropped index {name}")
+    return applied
+
+
+def add_missing_indexes(conn: Connection, table) -> List[str]:
+    from .importer import SPECS_BY_NAME, DuplicateKeyError, ensure_natural_key
+
+    existing = index_names(conn, table.name)
+    applied = []
+    for index in sorted(table.indexes, key=lambda ix: ix.name):
+        if index.name in existing:
+            continue
+        spec = SPECS_BY_NAME.get(table.name)
+        if index.unique and spec is not None and spec.key_index is index:
+            # уникальный ключ импорта нельзя создать поверх накопленных дублей; строки миграция не удаляет
+            try:
+                ensure_natural_key(conn, spec)
+            except DuplicateKeyError as e:
+                print(f"[DATABASE] Index {index.name} skipped: {e}")
+                continue
+        else:
+            index.create(bind=conn)
+        applied.append(f"index {index.name}")
+    return applied
+
+
+def upgrade(bind: Engine = engine) -> List[str]:
+    """Приводит существующую базу к моделям без пересоздания таблиц.
+
+    create_all создает только отсутствующие таблицы; колонки и индексы,
+    добавленные в модели позже, досоздаются здесь через ALTER TABLE / CREATE INDEX.
+    """
+    from .importer import SPECS_BY_NAME, fill_row_hashes
+
+    applied = []
+    with bind.begin() as conn:
+        existing_tables = set(inspect(conn).get_table_names())
+        Base.metadata.create_all(bind=conn)
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                applied.append(f"table {table.name}")
+                continue
+            columns = add_missing_columns(conn, table)
+            applied += columns
+            applied += drop_obsolete_indexes(conn, table)
+            applied += add_missing_indexes(conn, table)
+            if f"column {table.name}.row_hash" in columns:
+                hashed = fill_row_hashes(conn, SPECS_BY_NAME[table.name])
+                if hashed:
+                    applied.append(f"row_hash for {hashed} {table.name}")
+        applied += search.ensure_search_tables(conn)
+        applied += stats.ensure_stat_triggers(conn)
+        applied += versions.ensure_version_triggers(conn)
+        keyed = matching.refresh_match_keys(conn)
+        if keyed:
+            applied.append(f"match_key for {keyed} patients")
+        filled = lifecycle.fill_end_dates(conn)
+        if filled:
+            applied.append(f"end_date for {filled} prescriptions")
+    for action in applied:
+        print(f"[DATABASE] Migration applied: {action}")
+    return applied
+
+
+@dataclass(frozen=True)
+class PlanCheck:
+    """Запрос, который должен идти по индексу; seek - план обязан начинаться с позиции курсора (> или <)."""
+    name: str
+    stmt: object
+    seek: bool = False
+
+
+def plan_checks() -> List[PlanCheck]:
+    """Запросы crud, которые должны идти по индексу.
+
+    Keyset-страницы проверяются первой страницей и страницами по курсору (after - значения поля
+    сортировки в курсоре, None - курсор внутри сегмента NULL), каждый сегмент отдельно.
+    """
+    def pages(name, model, criteria=(), sort=None, after=()):
+        cursors = [("", None)] + [
+            (f", after {value}", crud.encode_cursor(sort or "id", value, 1000)) for value in after
+        ]
+        checks = []
+        for label, cursor in cursors:
+            segments = crud.keyset_select(model, 100, cursor, sort, criteria)[0]
+            for number, stmt in enumerate(segments, 1):
+                part = f" [segment {number}/{len(segments)}]" if len(segments) > 1 else ""
+                # продолжать с позиции курсора должен только первый сегмент, следующий читается с начала
+                checks.append(PlanCheck(name + label + part, stmt, seek=cursor is not None and number == 1))
+        return checks
+
+    def name_lookup(model):
+        return select(model.id).where(*crud.name_filter(model, "Иванов", "Иван", None))
+
+    day = date(2024, 1, 1)
+    return [
+        *pages("doctors by specialty", models.Doctor, crud.doctors_by_specialty("Кардиолог"), after=(1000,)),
+        *pages("diagnoses by category", models.Diagnosis, crud.diagnoses_by_category("Кардиология")),
+        *pages("symptoms by category", models.Symptom, crud.symptoms_by_category("Неврологические")),
+        *pages("complaints by patient", models.PatientComplaint, crud.complaints_by_patient(1), after=(1000,)),
+        *pages("complaints by patient, by date", models.PatientComplaint, crud.complaints_by_patient(1),
+               "-complaint_date", after=(day, None)),
+        *pages("prescriptions by patient", models.Prescription, crud.prescriptions_by_patient(1)),
+        *pages("prescriptions by patient, by start", models.Prescription, crud.prescriptions_by_patient(1),
+               "start_date", after=(day, None)),
+        *pages("prescriptions by doctor", models.Prescription, crud.prescriptions_by_doctor(1), after=(1000,)),
+        *pages("prescriptions by status", models.Prescription, crud.prescriptions_by_status("активно"), after=(1000,)),
+        *pages("prescriptions by status, by start", models.Prescription, crud.prescriptions_by_status("активно"),
+               "start_date", after=(day, None)),
+        *pages("prescriptions by status, by start desc", models.Prescription, crud.prescriptions_by_status("активно"),
+               "-start_date", after=(day, None)),
+        *pages("patients sorted by last name", models.Patient, sort="last_name", after=("Иванов", None)),
+        *pages("patients sorted by last name desc", models.Patient, sort="-last_name", after=("Иванов", None)),
+        *pages("diagnoses sorted by ICD code", models.Diagnosis, sort="icd_code", after=("I48",)),
+        PlanCheck("diagnosis by ICD code", select(models.Diagnosis).where(models.Diagnosis.icd_code == "I48")),
+        PlanCheck("user by username", select(models.User).where(models.User.username == "admin")),
+        PlanCheck("patient id by full name", name_lookup(models.Patient)),
+        PlanCheck("doctor id by full name", name_lookup(models.Doctor)),
+        PlanCheck("patient timeline complaints", select(models.PatientComplaint).where(
+            models.PatientComplaint.patient_id.in_([1]), models.PatientComplaint.complaint_date >= day)),
+        PlanCheck("patient timeline prescriptions", select(models.Prescription).join(models.Prescription.doctor, isouter=True).where(
+            models.Prescription.patient_id.in_([1]), models.Prescription.start_date >= day)),
+        PlanCheck("prescriptions to expire", lifecycle.expire_select(day, 5000)),
+        *pages("prescriptions active on date", models.Prescription, crud.prescriptions_active_on(day), "end_date",
+               after=(day,)),
+        PlanCheck("patient active medications", interactions.active_medications_select([1])),
+        PlanCheck("top medications of a doctor", stats.top_select("medications_by_doctor", "1")),
+        PlanCheck("symptoms seen with a symptom", stats.top_select(stats.COOCCURRENCE, "Кашель")),
+        PlanCheck("weekly trend of a symptom", stats.trend_select("Кашель", day, date(2024, 6, 24))),
+        PlanCheck("patient match candidates", matching.candidates_select(["AFNF:A"], "1980-01-01")),
+    ]
+
+
+def explain(conn: Connection, stmt) -> List[str]:
+    """EXPLAIN QUERY PLAN того SQL и тех параметров, которые SQLAlchemy действительно отправит в драйвер.
+
+    Подстановка литералов (literal_binds) может дать другой план, чем запрос с параметрами.
+    """
+    def rewrite(connection, cursor, statement, parameters, context, executemany):
+        return f"EXPLAIN QUERY PLAN {statement}", parameters
+
+    event.listen(conn, "before_cursor_execute", rewrite, retval=True)
+    try:
+        return [row[3] for row in conn.execute(stmt)]
+    finally:
+        event.remove(conn, "before_cursor_execute", rewrite)
+
+
+def check_query_plans(bind: Engine = engine) -> List[str]:
+    """EXPLAIN QUERY PLAN для plan_checks(); возвращает запросы с полным сканированием таблицы."""
+    failures = []
+    with bind.connect() as conn:
+        if conn.dialect.name != "sqlite":
+            print("[DATABASE] Query plan check is implemented for SQLite only")
+            return failures
+        for check in plan_checks():
+            plan = explain(conn, check.stmt)
+            bad = [step for step in plan
+                   if (step.startswith("SCAN ") and "USING" not in step) or "TEMP B-TREE FOR ORDER BY" in step]
+            if bad:
+                status = "FULL SCAN"
+            elif check.seek and not any(">?" in step or "<?" in step for step in plan):
+                # индекс без диапазона: страница по курсору пролистывает все предыдущие строки
+                status = "NO SEEK"
+            else:
+                status = "ok"
+            print(f"[PLAN] {status:<9} {check.name}: {'; '.join(plan)}")
+            if status != "ok":
+                failures.append(check.name)
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.migrations",
+                                     description="Досоздание колонок и индексов в существующей базе")
+    parser.add_argument("--check-plans", action="store_true",
+                        help="проверить, что запросы crud не сканируют таблицы целиком")
+    args = parser.parse_args(argv)
+
+    upgrade(engine)
+    if args.check_plans:
+        failures = check_query_plans(engine)
+        if failures:
+            print(f"[PLAN] {len(failures)} queries fall back to a full scan or skip rows: {', '.join(failures)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 # app/models.py
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Text, Boolean, Index, literal_column
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -14,6 +14,8 @@ class User(Base):
     full_name = Column(String)
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
+    # увеличивается при смене пароля или блокировке - все ранее выданные токены перестают действовать
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
@@ -29,8 +31,10 @@ class Patient(Base):
     street = Column(String)
     building = Column(String)
     email = Column(String)
-    birth_date = Column(String)
+    birth_date = Column(String, index=True)
     phone = Column(String)
+    # фонетический ключ блока для нечеткого сопоставления (matching.patient_match_key)
+    match_key = Column(String, nullable=True, index=True)
 
     complaints = relationship("PatientComplaint", back_populates="patient")
     prescriptions = relationship("Prescription", back_populates="patient")
@@ -43,7 +47,7 @@ class Doctor(Base):
     last_name = Column(String)
     first_name = Column(String)
     middle_name = Column(String, nullable=True)
-    specialty = Column(String)
+    specialty = Column(String, index=True)
     department = Column(String)
     email = Column(String)
     phone = Column(String)
@@ -51,13 +55,30 @@ class Doctor(Base):
     prescriptions = relationship("Prescription", back_populates="doctor")
 
 
+# Отчество может быть NULL или пустой строкой, поэтому ФИО индексируется через coalesce.
+# В уникальном ключе '' записан литералом: цель ON CONFLICT импорта должна совпасть с выражением индекса
+Index("uq_patients_full_name_email", Patient.last_name, Patient.first_name,
+      func.coalesce(Patient.middle_name, literal_column("''")), Patient.email, unique=True)
+Index("uq_doctors_full_name_email", Doctor.last_name, Doctor.first_name,
+      func.coalesce(Doctor.middle_name, literal_column("''")), Doctor.email, unique=True)
+Index("ix_patients_full_name", Patient.last_name, Patient.first_name, func.coalesce(Patient.middle_name, ""))
+Index("ix_doctors_full_name", Doctor.last_name, Doctor.first_name, func.coalesce(Doctor.middle_name, ""))
+# keyset-сортировка по фамилии: (last_name, rowid) совпадает с ORDER BY last_name, id
+Index("ix_patients_last_name", Patient.last_name)
+Index("ix_doctors_last_name", Doctor.last_name)
+
+
 class Diagnosis(Base):
     __tablename__ = "diagnoses"
 
     id = Column(Integer, primary_key=True, index=True)
-    icd_code = Column(String, index=True)
+    icd_code = Column(String)
     name = Column(String)
-    category = Column(String)
+    category = Column(String, index=True)
+
+    __table_args__ = (
+        Index("uq_diagnoses_icd_code", "icd_code", unique=True),
+    )
 
 
 class Symptom(Base):
@@ -66,7 +87,11 @@ class Symptom(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
     description = Column(Text)
-    category_name = Column(String)
+    category_name = Column(String, index=True)
+
+    __table_args__ = (
+        Index("uq_symptoms_name", "name", unique=True),
+    )
 
 
 class PatientComplaint(Base):
@@ -77,13 +102,24 @@ class PatientComplaint(Base):
     patient_first_name = Column(String)
     patient_middle_name = Column(String, nullable=True)
     symptom_name = Column(String)
-    complaint_date = Column(Date)
+    complaint_date = Column(Date, index=True)
     severity = Column(String)
     description = Column(Text)
+    # хеш строки CSV, из которой импортирована жалоба (app/importer.py); у записей из API - NULL
+    row_hash = Column(String, nullable=True, index=True)
 
-    patient_id = Column(Integer, ForeignKey("patients.id"))
+    patient_id = Column(Integer, ForeignKey("patients.id"), index=True)
     patient = relationship("Patient", back_populates="complaints")
 
+    __table_args__ = (
+        Index("ix_patient_complaints_patient_date", "patient_id", "complaint_date"),
+    )
+
+
+# значения Prescription.status: действующее назначение и назначение, курс которого закончился
+PRESCRIPTION_ACTIVE = "активно"
+PRESCRIPTION_COMPLETED = "завершено"
+
 
 class Prescription(Base):
     __tablename__ = "prescriptions"
@@ -100,14 +136,60 @@ class Prescription(Base):
     dose_unit = Column(String)
     frequency = Column(String)
     duration_in_days = Column(Integer)
-    start_date = Column(Date)
-    end_date = Column(Date, nullable=True)
+    start_date = Column(Date, index=True)
+    end_date = Column(Date, nullable=True, index=True)
     instructions = Column(Text)
-    status = Column(String)
+    status = Column(String, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    row_hash = Column(String, nullable=True, index=True)
 
-    patient_id = Column(Integer, ForeignKey("patients.id"))
-    doctor_id = Column(Integer, ForeignKey("doctors.id"))
+    patient_id = Column(Integer, ForeignKey("patients.id"), index=True)
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), index=True)
 
     patient = relationship("Patient", back_populates="prescriptions")
-    doctor = relationship("Doctor", back_populates="prescriptions")
\ No newline at end of file
+    doctor = relationship("Doctor", back_populates="prescriptions")
+
+    __table_args__ = (
+        Index("ix_prescriptions_patient_start", "patient_id", "start_date"),
+        Index("ix_prescriptions_status_start", "status", "start_date"),
+        Index("ix_prescriptions_status_end", "status", "end_date"),
+        Index("ix_prescriptions_patient_status", "patient_id", "status", "medication_name"),
+    )
+
+class ImportManifest(Base):
+    __tablename__ = "import_manifest"
+
+    id = Column(Integer, primary_key=True, index=True)
+    file_name = Column(String, unique=True, index=True)
+    table_name = Column(String)
+    size = Column(Integer)
+    mtime = Column(Float)
+    content_hash = Column(String)
+    encoding = Column(String)
+    row_count = Column(Integer)
+    imported_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class StatCounter(Base):
+    """Предрасчитанный счетчик: dimension (например, prescriptions_by_status), группа и значение.
+
+    Ведется триггерами SQLite (app/stats.py), пересчитывается целиком через python -m app.stats --rebuild.
+    """
+    __tablename__ = "stat_counters"
+
+    dimension = Column(String, primary_key=True)
+    group_key = Column(String, primary_key=True, default="")
+    item_key = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_stat_counters_top", "dimension", "group_key", "count"),
+    )
+
+
+class TableVersion(Base):
+    """Версия справочной таблицы для ETag: растет в триггерах SQLite на любое изменение строк (app/versions.py)."""
+    __tablename__ = "table_versions"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
@@ -13,10 +13,19 @@ sys.path.insert(0, parent_dir)
 
 
 from app import crud, schemas, auth
-from app.database import get_db
+from app.database import get_async_db, get_db
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
+
+def password_hasher_busy():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many concurrent logins, retry later",
+        headers={"Retry-After": "1"},
+    )
+
+
 @router.post("/register", response_model=schemas.User)
 def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db_user = crud.get_user_by_username(db, username=user.username)
@@ -25,22 +34,56 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db_user = crud.get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db=db, user=user)
+    try:
+        return crud.create_user(db=db, user=user)
+    except auth.PasswordHasherBusy:
+        raise password_hasher_busy()
 
 @router.post("/token", response_model=schemas.Token)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db=Depends(get_async_db)
 ):
-    user = auth.authenticate_user(db, form_data.username, form_data.password)
+    try:
+        user = await auth.authenticate_user_async(db, form_data.username, form_data.password)
+    except auth.PasswordHasherBusy:
+        raise password_hasher_busy()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    return issue_token(user)
+
+def issue_token(user) -> dict:
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "ver": user.token_version}, expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@router.post("/password", response_model=schemas.Token)
+def change_password(
+    change: schemas.PasswordChange,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    """Смена пароля отзывает все токены пользователя; в ответе - новый токен для этой сессии."""
+    try:
+        if not auth.authenticate_user(db, current_user.username, change.current_password):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Incorrect current password")
+        db_user = crud.change_user_password(db, current_user.id, change.new_password)
+    except auth.PasswordHasherBusy:
+        raise password_hasher_busy()
+    auth.user_cache.invalidate(db_user.username)
+    return issue_token(db_user)
+
+@router.post("/logout-all")
+def revoke_tokens(
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    crud.revoke_user_tokens(db, current_user.id)
+    auth.user_cache.invalidate(current_user.username)
+    return {"message": "All tokens of the user have been revoked"}
@@ -0,0 +1,42 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from .. import crud, schemas
+
+
+def validation_detail(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+
+
+def run_batch(
+    items: List[Dict[str, Any]],
+    schema,
+    create: Callable[[list], Tuple[List[Optional[int]], Dict[int, str]]],
+) -> schemas.BatchResult:
+    """Проверяет каждую запись отдельно и сохраняет все валидные одной транзакцией.
+
+    ids[i] - id созданной записи или None, если запись i попала в errors.
+    """
+    if len(items) > crud.BATCH_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch is limited to {crud.BATCH_MAX_SIZE} records")
+
+    valid, positions, errors = [], [], []
+    for index, item in enumerate(items):
+        try:
+            valid.append(schema.model_validate(item))
+            positions.append(index)
+        except ValidationError as e:
+            errors.append(schemas.BatchItemError(index=index, detail=validation_detail(e)))
+
+    ids: List[Optional[int]] = [None] * len(items)
+    if valid:
+        created_ids, insert_errors = create(valid)
+        for position, created_id in zip(positions, created_ids):
+            ids[position] = created_id
+        for index, detail in insert_errors.items():
+            errors.append(schemas.BatchItemError(index=positions[index], detail=detail))
+
+    errors.sort(key=lambda error: error.index)
+    return schemas.BatchResult(created=sum(i is not None for i in ids), ids=ids, errors=errors)
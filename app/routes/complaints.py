@@ -1,39 +1,58 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Any, Dict, List, Optional
 
-from .. import crud, schemas, auth
-from ..database import get_db
+from .. import async_crud, crud, models, schemas, auth
+from ..database import get_async_db, get_db
+from .batch import run_batch
+from .pagination import filtered_list, list_page
 
 
 router = APIRouter(prefix="/complaints", tags=["complaints"])
 
+@router.post("/batch", response_model=schemas.BatchResult)
+def create_complaints_batch(
+    items: List[Dict[str, Any]] = Body(...),
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    return run_batch(items, schemas.PatientComplaintCreate, lambda valid: crud.create_patient_complaints(db, valid))
+
 @router.get("/", response_model=List[schemas.PatientComplaint])
-def read_complaints(
+async def read_complaints(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    db=Depends(get_async_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    complaints = crud.get_patient_complaints(db, skip=skip, limit=limit)
-    return complaints
+    return await list_page(response, db, models.PatientComplaint, skip, limit, cursor, sort)
 
 @router.get("/{complaint_id}", response_model=schemas.PatientComplaint)
-def read_complaint(
+async def read_complaint(
     complaint_id: int,
-    db: Session = Depends(get_db),
+    db=Depends(get_async_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    db_complaint = crud.get_patient_complaint(db, complaint_id=complaint_id)
+    db_complaint = await async_crud.get_patient_complaint(db, complaint_id=complaint_id)
     if db_complaint is None:
         raise HTTPException(status_code=404, detail="Complaint not found")
     return db_complaint
 
 @router.get("/patient/{patient_id}", response_model=List[schemas.PatientComplaint])
-def read_complaints_by_patient(
+async def read_complaints_by_patient(
     patient_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    db=Depends(get_async_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    complaints = crud.get_complaints_by_patient(db, patient_id=patient_id)
-    return complaints
\ No newline at end of file
+    return await filtered_list(
+        response, db, models.PatientComplaint, schemas.PatientComplaint, crud.complaints_by_patient(patient_id),
+        limit, cursor, sort, response_format,
+    )
\ No newline at end of file
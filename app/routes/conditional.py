@@ -0,0 +1,38 @@
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request, Response
+
+from .. import auth, schemas, versions
+from ..database import IS_SQLITE, get_async_db
+
+
+def etag_in(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def versioned(*tables: str, cache_control: str):
+    """Зависимость для GET справочников: ETag из версий таблиц и 304 до выполнения запроса.
+
+    Проверка идет после аутентификации (пользователь обычно берется из кэша) и стоит одного
+    чтения table_versions по первичному ключу. Версии ведут триггеры SQLite; на других базах
+    ETag не выдается.
+    """
+    async def dependency(
+        request: Request,
+        response: Response,
+        db=Depends(get_async_db),
+        current_user: schemas.User = Depends(auth.get_current_active_user),
+    ):
+        if not IS_SQLITE:
+            return
+        resource = request.url.path + ("?" + request.url.query if request.url.query else "")
+        etag = versions.etag(await versions.current_versions(db, tables), tables, resource)
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        if etag_in(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+    return Depends(dependency)
@@ -1,49 +1,119 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+import asyncio
+import os
 
-from .. import crud, schemas, auth
-from ..database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import List, Optional
+
+from .. import async_crud, crud, models, schemas, auth
+from ..database import get_async_db
+from ..icd_index import CHAPTERS, IcdIndex, chapter_number, icd_index, row_signature, signature_select
+from .conditional import versioned
+from .pagination import filtered_list, list_page
 
 router = APIRouter(prefix="/diagnoses", tags=["diagnoses"])
 
-@router.get("/", response_model=List[schemas.Diagnosis])
-def read_diagnoses(
+CACHE_CONTROL = os.getenv("DIAGNOSES_CACHE_CONTROL", "private, max-age=60")
+reference_cache = versioned("diagnoses", cache_control=CACHE_CONTROL)
+
+
+async def loaded_icd_index(db=Depends(get_async_db)) -> IcdIndex:
+    # индекс строится при старте; перестраивается, если старт не удался или диагнозы изменил другой процесс
+    signature = row_signature((await db.execute(signature_select())).first())
+    if not icd_index.is_current(signature):
+        await asyncio.to_thread(icd_index.ensure_current, signature)
+    return icd_index
+
+
+@router.get("/", response_model=List[schemas.Diagnosis], dependencies=[reference_cache])
+async def read_diagnoses(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    db=Depends(get_async_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    return await list_page(response, db, models.Diagnosis, skip, limit, cursor, sort)
+
+@router.get("/chapters", dependencies=[reference_cache])
+async def read_icd_chapters(
+    index: IcdIndex = Depends(loaded_icd_index),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    return [
+        {"number": number, "chapter": roman, "start": start, "end": end, "count": index.count(start, end)}
+        for number, (roman, start, end) in CHAPTERS.items()
+    ]
+
+@router.get("/chapter/{chapter}", response_model=List[schemas.Diagnosis], dependencies=[reference_cache])
+async def read_diagnoses_by_chapter(
+    chapter: str,
+    limit: int = Query(100, ge=1, le=1000),
+    index: IcdIndex = Depends(loaded_icd_index),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    number = chapter_number(chapter)
+    if number is None:
+        raise HTTPException(status_code=404, detail="ICD-10 chapter not found")
+    return index.chapter(number, limit)
+
+@router.get("/prefix/{prefix}", response_model=List[schemas.Diagnosis], dependencies=[reference_cache])
+async def read_diagnoses_by_prefix(
+    prefix: str,
+    limit: int = Query(100, ge=1, le=1000),
+    index: IcdIndex = Depends(loaded_icd_index),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    diagnoses = crud.get_diagnoses(db, skip=skip, limit=limit)
-    return diagnoses
+    return index.prefix(prefix, limit)
 
-@router.get("/{diagnosis_id}", response_model=schemas.Diagnosis)
-def read_diagnosis(
+@router.get("/range/{start}/{end}", response_model=List[schemas.Diagnosis], dependencies=[reference_cache])
+async def read_diagnoses_by_range(
+    start: str,
+    end: str,
+    limit: int = Query(100, ge=1, le=1000),
+    index: IcdIndex = Depends(loaded_icd_index),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    return index.range(start, end, limit)
+
+@router.get("/{diagnosis_id}", response_model=schemas.Diagnosis, dependencies=[reference_cache])
+async def read_diagnosis(
     diagnosis_id: int,
-    db: Session = Depends(get_db),
+    db=Depends(get_async_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    db_diagnosis = crud.get_diagnosis(db, diagnosis_id=diagnosis_id)
+    db_diagnosis = await async_crud.get_diagnosis(db, diagnosis_id=diagnosis_id)
     if db_diagnosis is None:
         raise HTTPException(status_code=404, detail="Diagnosis not found")
     return db_diagnosis
 
-@router.get("/icd/{icd_code}", response_model=schemas.Diagnosis)
-def read_diagnosis_by_icd(
+@router.get("/icd/{icd_code}", response_model=schemas.Diagnosis, dependencies=[reference_cache])
+async def read_diagnosis_by_icd(
     icd_code: str,
-    db: Session = Depends(get_db),
+    db=Depends(get_async_db),
+    index: IcdIndex = Depends(loaded_icd_index),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    db_diagnosis = crud.get_diagnosis_by_icd(db, icd_code=icd_code)
+    db_diagnosis = index.get(icd_code)
+    if db_diagnosis is None:
+        db_diagnosis = await async_crud.get_diagnosis_by_icd(db, icd_code=icd_code)
     if db_diagnosis is None:
         raise HTTPException(status_code=404, detail="Diagnosis not found")
     return db_diagnosis
 
-@router.get("/category/{category}", response_model=List[schemas.Diagnosis])
-def read_diagnoses_by_category(
+@router.get("/category/{category}", response_model=List[schemas.Diagnosis], dependencies=[reference_cache])
+async def read_diagnoses_by_category(
     category: str,
-    db: Session = Depends(get_db),
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    db=Depends(get_async_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    diagnoses = crud.get_diagnoses_by_category(db, category=category)
-    return diagnoses
\ No newline at end of file
+    return await filtered_list(
+        response, db, models.Diagnosis, schemas.Diagnosis, crud.diagnoses_by_category(category),
+        limit, cursor, sort, response_format,
+    )
\ No newline at end of file
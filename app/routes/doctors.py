@@ -1,38 +1,53 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+import os
 
-from .. import crud, schemas, auth
-from ..database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import List, Optional
+
+from .. import async_crud, crud, models, schemas, auth
+from ..database import get_async_db
+from .conditional import versioned
+from .pagination import filtered_list, list_page
 
 router = APIRouter(prefix="/doctors", tags=["doctors"])
 
-@router.get("/", response_model=List[schemas.Doctor])
-def read_doctors(
+CACHE_CONTROL = os.getenv("DOCTORS_CACHE_CONTROL", "private, max-age=60")
+reference_cache = versioned("doctors", cache_control=CACHE_CONTROL)
+
+@router.get("/", response_model=List[schemas.Doctor], dependencies=[reference_cache])
+async def read_doctors(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    db=Depends(get_async_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    doctors = crud.get_doctors(db, skip=skip, limit=limit)
-    return doctors
+    return await list_page(response, db, models.Doctor, skip, limit, cursor, sort)
 
-@router.get("/{doctor_id}", response_model=schemas.Doctor)
-def read_doctor(
+@router.get("/{doctor_id}", response_model=schemas.Doctor, dependencies=[reference_cache])
+async def read_doctor(
     doctor_id: int,
-    db: Session = Depends(get_db),
+    db=Depends(get_async_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    db_doctor = crud.get_doctor(db, doctor_id=doctor_id)
+    db_doctor = await async_crud.get_doctor(db, doctor_id=doctor_id)
     if db_doctor is None:
         raise HTTPException(status_code=404, detail="Doctor not found")
     return db_doctor
 
-@router.get("/specialty/{specialty}", response_model=List[schemas.Doctor])
-def read_doctors_by_specialty(
+@router.get("/specialty/{specialty}", response_model=List[schemas.Doctor], dependencies=[reference_cache])
+async def read_doctors_by_specialty(
     specialty: str,
-    db: Session = Depends(get_db),
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    db=Depends(get_async_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    doctors = crud.get_doctors_by_specialty(db, specialty=specialty)
-    return doctors
\ No newline at end of file
+    return await filtered_list(
+        response, db, models.Doctor, schemas.Doctor, crud.doctors_by_specialty(specialty),
+        limit, cursor, sort, response_format,
+    )
\ No newline at end of file
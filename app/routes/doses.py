@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional
+
+from .. import schemas, auth, doses
+
+router = APIRouter(prefix="/doses", tags=["doses"])
+
+
+def current_frame() -> "doses.DoseFrame":
+    try:
+        return doses.dose_cache.get()
+    except doses.DosesUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+
+@router.get("/patients/{patient_id}", response_model=List[schemas.DoseExposure])
+def read_patient_exposure(
+    patient_id: int,
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    return doses.patient_exposure(current_frame(), patient_id)
+
+@router.get("/medications", response_model=List[schemas.DoseExposure])
+def read_medication_exposure(
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    return doses.medication_exposure(current_frame(), limit)
+
+@router.get("/outliers", response_model=List[schemas.DoseOutlier])
+def read_dose_outliers(
+    medication: Optional[str] = None,
+    threshold: float = Query(doses.OUTLIER_THRESHOLD, gt=0),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    return doses.outliers(current_frame(), medication, threshold, limit)
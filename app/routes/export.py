@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from typing import Optional
+
+from .. import schemas, auth, export
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+
+@router.get("/{table}")
+def export_table(
+    table: str,
+    format: str = Query("csv", description="csv, parquet или arrow"),
+    compression: str = Query("none", description="none, gzip или zstd"),
+    since_id: Optional[int] = Query(None, ge=0),
+    since: Optional[datetime] = None,
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    try:
+        job = export.prepare_export(table, format, compression, since_id, since)
+    except export.ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except export.ExportUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return StreamingResponse(
+        export.stream_export(job),
+        media_type=job.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{job.file_name}"'},
+    )
@@ -0,0 +1,101 @@
+import os
+from typing import Optional, Sequence
+
+from fastapi import HTTPException, Response
+from fastapi.responses import StreamingResponse
+
+from .. import async_crud, crud
+from ..database import SessionLocal
+
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 500))
+DEFAULT_PAGE_SIZE = 100
+
+
+async def list_page(
+    response: Response,
+    db,
+    model,
+    skip: int,
+    limit: int,
+    cursor: Optional[str],
+    sort: Optional[str],
+    criteria: Sequence = (),
+):
+    """Общая логика списков: keyset-страница с курсором в заголовке X-Next-Cursor.
+
+    Ненулевой skip без курсора и сортировки обслуживается старым offset-запросом.
+    """
+    if skip:
+        if cursor or sort:
+            raise HTTPException(status_code=400, detail="skip cannot be combined with cursor or sort")
+        return await async_crud.get_offset_page(db, model, skip, limit)
+    try:
+        items, next_cursor = await async_crud.get_page(db, model, limit, cursor, sort, criteria)
+    except crud.CursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return items
+
+
+def row_chunks(model, schema, criteria: Sequence = ()):
+    """Все подходящие строки пачками по STREAM_BATCH_SIZE уже сериализованных JSON-объектов.
+
+    У генератора своя сессия: зависимость get_db может закрыться раньше,
+    чем StreamingResponse дочитает результат.
+    """
+    db = SessionLocal()
+    try:
+        chunk = []
+        for row in crud.iter_rows(db, model, criteria, STREAM_BATCH_SIZE):
+            chunk.append(schema.model_validate(row).model_dump_json())
+            if len(chunk) >= STREAM_BATCH_SIZE:
+                yield chunk
+                chunk = []
+                db.expunge_all()
+        if chunk:
+            yield chunk
+    finally:
+        db.close()
+
+
+def ndjson_stream(model, schema, criteria: Sequence = ()) -> StreamingResponse:
+    """Отдает все подходящие строки как NDJSON, сериализуя их по одной."""
+    lines = ("\n".join(chunk) + "\n" for chunk in row_chunks(model, schema, criteria))
+    return StreamingResponse(lines, media_type=NDJSON_MEDIA_TYPE)
+
+
+def json_array_stream(model, schema, criteria: Sequence = ()) -> StreamingResponse:
+    """Весь результат одним JSON-массивом, как до появления страниц, но без сборки списка в памяти."""
+    def body():
+        yield "["
+        separator = ""
+        for chunk in row_chunks(model, schema, criteria):
+            yield separator + ",".join(chunk)
+            separator = ","
+        yield "]"
+
+    return StreamingResponse(body(), media_type="application/json")
+
+
+async def filtered_list(
+    response: Response,
+    db,
+    model,
+    schema,
+    criteria: Sequence,
+    limit: Optional[int],
+    cursor: Optional[str],
+    sort: Optional[str],
+    response_format: str,
+):
+    """Списки с фильтром: format=ndjson - поток всех строк; без limit, cursor и sort - весь результат
+    JSON-массивом (прежнее поведение этих эндпоинтов); иначе keyset-страница по limit (по умолчанию 100)."""
+    if response_format == "ndjson":
+        return ndjson_stream(model, schema, criteria)
+    if limit is None and cursor is None and sort is None:
+        return json_array_stream(model, schema, criteria)
+    return await list_page(response, db, model, 0, limit or DEFAULT_PAGE_SIZE, cursor, sort, criteria=criteria)
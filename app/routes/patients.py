@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Response
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import date
+from typing import Any, Dict, List, Optional
 
-from .. import crud, schemas, auth
-from ..database import get_db
+from .. import async_crud, crud, matching, models, schemas, auth
+from ..database import get_async_db, get_db
+from .batch import run_batch
+from .pagination import NEXT_CURSOR_HEADER, list_page
 
 router = APIRouter(prefix="/patients", tags=["patients"])
 
@@ -13,39 +17,129 @@ def create_patient(
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    return crud.create_patient(db=db, patient=patient)
+    try:
+        return crud.create_patient(db=db, patient=patient)
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Patient already exists")
+
+@router.post("/batch", response_model=schemas.BatchResult)
+def create_patients_batch(
+    items: List[Dict[str, Any]] = Body(...),
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    return run_batch(items, schemas.PatientCreate, lambda valid: crud.create_patients(db, valid))
 
 @router.get("/", response_model=List[schemas.Patient])
-def read_patients(
+async def read_patients(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    db=Depends(get_async_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    patients = crud.get_patients(db, skip=skip, limit=limit)
-    return patients
+    return await list_page(response, db, models.Patient, skip, limit, cursor, sort)
+
+@router.get("/match", response_model=schemas.PatientMatchResult)
+async def match_patient(
+    last_name: str = Query(..., min_length=1),
+    first_name: str = Query(..., min_length=1),
+    middle_name: Optional[str] = None,
+    birth_date: Optional[str] = None,
+    phone: Optional[str] = None,
+    limit: int = Query(5, ge=1, le=50),
+    db=Depends(get_async_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    query = matching.MatchQuery(last_name, first_name, middle_name, birth_date, phone)
+    candidates = (await db.scalars(
+        matching.candidates_select([query.match_key], birth_date, columns=(models.Patient,))
+    )).all()
+    ranked = matching.rank(candidates, query)
+    decision = matching.decide(ranked)
+    return {
+        "patient_id": decision.patient_id,
+        "status": decision.status,
+        "candidates": [{"patient": patient, "score": round(value, 4)} for patient, value in ranked[:limit]],
+    }
 
 @router.get("/{patient_id}", response_model=schemas.Patient)
-def read_patient(
+async def read_patient(
     patient_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    db=Depends(get_async_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    db_patient = crud.get_patient(db, patient_id=patient_id)
+    db_patient = await async_crud.get_patient(db, patient_id=patient_id)
     if db_patient is None:
         raise HTTPException(status_code=404, detail="Patient not found")
+    response.headers["ETag"] = crud.row_etag(db_patient)
     return db_patient
 
+@router.get("/{patient_id}/timeline", response_model=schemas.PatientTimeline)
+async def read_patient_timeline(
+    patient_id: int,
+    response: Response,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db=Depends(get_async_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be later than date_to")
+    try:
+        db_patient = await async_crud.get_patient_timeline(db, patient_id, date_from, date_to, cursor)
+        if db_patient is None:
+            raise HTTPException(status_code=404, detail="Patient not found")
+        events, next_cursor = crud.timeline_page(db_patient, limit, cursor)
+    except crud.CursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return {"patient": db_patient, "events": events}
+
 @router.put("/{patient_id}", response_model=schemas.Patient)
 def update_patient(
     patient_id: int,
     patient: schemas.PatientCreate,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    try:
+        db_patient = crud.update_patient(db, patient_id, patient)
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Patient already exists")
+    if db_patient is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    response.headers["ETag"] = crud.row_etag(db_patient)
+    return db_patient
+
+@router.patch("/{patient_id}", response_model=schemas.Patient)
+def patch_patient(
+    patient_id: int,
+    patient: schemas.PatientUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    db_patient = crud.update_patient(db, patient_id, patient)
+    try:
+        db_patient, _ = crud.patch_patient(db, patient_id, patient.model_dump(exclude_unset=True), if_match)
+    except crud.PreconditionFailed:
+        raise HTTPException(status_code=412, detail="Patient was modified, re-read it and retry")
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Patient already exists")
     if db_patient is None:
         raise HTTPException(status_code=404, detail="Patient not found")
+    response.headers["ETag"] = crud.row_etag(db_patient)
     return db_patient
 
 @router.delete("/{patient_id}")
@@ -1,59 +1,143 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import date
+from typing import Any, Dict, List, Optional
 
-from .. import crud, schemas, auth
-from ..database import get_db
+from .. import async_crud, crud, interactions, lifecycle, models, schemas, auth
+from ..database import get_async_db, get_db
+from .batch import run_batch
+from .pagination import filtered_list, list_page
 
 router = APIRouter(prefix="/prescriptions", tags=["prescriptions"])
 
+@router.post("/", response_model=schemas.Prescription)
+def create_prescription(
+    prescription: schemas.PrescriptionCreate,
+    allow_interactions: bool = False,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    try:
+        return crud.create_prescription(db, prescription, check_interactions=not allow_interactions)
+    except interactions.InteractionConflict as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.post("/batch", response_model=schemas.BatchResult)
+def create_prescriptions_batch(
+    items: List[Dict[str, Any]] = Body(...),
+    allow_interactions: bool = False,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    return run_batch(items, schemas.PrescriptionCreate,
+                     lambda valid: crud.create_prescriptions(db, valid, check_interactions=not allow_interactions))
+
+@router.post("/check", response_model=schemas.InteractionCheckResult)
+def check_prescription_interactions(
+    check: schemas.InteractionCheck,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    findings = interactions.check_patient(db, check.patient_id, check.medication_name)
+    return {
+        "patient_id": check.patient_id,
+        "medication_name": check.medication_name,
+        "blocking": any(finding.blocking for finding in findings),
+        "findings": findings,
+    }
+
+@router.get("/active", response_model=List[schemas.Prescription])
+async def read_prescriptions_active_on(
+    response: Response,
+    on: Optional[date] = None,
+    status: str = models.PRESCRIPTION_ACTIVE,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: str = "end_date",
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    db=Depends(get_async_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    return await filtered_list(
+        response, db, models.Prescription, schemas.Prescription, crud.prescriptions_active_on(on or date.today(), status),
+        limit, cursor, sort, response_format,
+    )
+
+@router.get("/lifecycle", response_model=schemas.ExpiryMetrics)
+def read_lifecycle_metrics(current_user: schemas.User = Depends(auth.get_current_active_user)):
+    return lifecycle.metrics()
+
 @router.get("/", response_model=List[schemas.Prescription])
-def read_prescriptions(
+async def read_prescriptions(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    db=Depends(get_async_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    prescriptions = crud.get_prescriptions(db, skip=skip, limit=limit)
-    return prescriptions
+    return await list_page(response, db, models.Prescription, skip, limit, cursor, sort)
 
 @router.get("/{prescription_id}", response_model=schemas.Prescription)
-def read_prescription(
+async def read_prescription(
     prescription_id: int,
-    db: Session = Depends(get_db),
+    db=Depends(get_async_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    db_prescription = crud.get_prescription(db, prescription_id=prescription_id)
+    db_prescription = await async_crud.get_prescription(db, prescription_id=prescription_id)
     if db_prescription is None:
         raise HTTPException(status_code=404, detail="Prescription not found")
     return db_prescription
 
 @router.get("/patient/{patient_id}", response_model=List[schemas.Prescription])
-def read_prescriptions_by_patient(
+async def read_prescriptions_by_patient(
     patient_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    db=Depends(get_async_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    prescriptions = crud.get_prescriptions_by_patient(db, patient_id=patient_id)
-    return prescriptions
+    return await filtered_list(
+        response, db, models.Prescription, schemas.Prescription, crud.prescriptions_by_patient(patient_id),
+        limit, cursor, sort, response_format,
+    )
 
 @router.get("/doctor/{doctor_id}", response_model=List[schemas.Prescription])
-def read_prescriptions_by_doctor(
+async def read_prescriptions_by_doctor(
     doctor_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    db=Depends(get_async_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    prescriptions = crud.get_prescriptions_by_doctor(db, doctor_id=doctor_id)
-    return prescriptions
+    return await filtered_list(
+        response, db, models.Prescription, schemas.Prescription, crud.prescriptions_by_doctor(doctor_id),
+        limit, cursor, sort, response_format,
+    )
 
 @router.get("/status/{status}", response_model=List[schemas.Prescription])
-def read_prescriptions_by_status(
+async def read_prescriptions_by_status(
     status: str,
-    db: Session = Depends(get_db),
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    db=Depends(get_async_db),
     current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    prescriptions = crud.get_prescriptions_by_status(db, status=status)
-    return prescriptions
+    return await filtered_list(
+        response, db, models.Prescription, schemas.Prescription, crud.prescriptions_by_status(status),
+        limit, cursor, sort, response_format,
+    )
 
 @router.patch("/{prescription_id}/status")
 def update_prescription_status(
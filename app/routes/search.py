@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional
+
+from .. import schemas, auth, search
+from ..database import engine, get_async_db
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+@router.get("/", response_model=schemas.SearchResults)
+async def search_records(
+    q: str = Query(..., min_length=1, max_length=200),
+    types: Optional[List[str]] = Query(None, alias="type"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    db=Depends(get_async_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    if engine.dialect.name != "sqlite":
+        raise HTTPException(status_code=501, detail="Full-text search requires SQLite FTS5")
+    types = types or list(search.SEARCH_SPECS)
+    unknown = set(types) - set(search.SEARCH_SPECS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown search type: {', '.join(sorted(unknown))}")
+    items, has_more = await search.search(db, q, types, limit, offset)
+    return {"items": items, "next_offset": offset + limit if has_more else None}
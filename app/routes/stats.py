@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from datetime import date
+from typing import List, Optional
+
+from .. import schemas, auth, stats
+from ..database import engine, get_async_db
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+
+def require_sqlite():
+    if engine.dialect.name != "sqlite":
+        raise HTTPException(status_code=501, detail="Statistics counters require SQLite triggers")
+
+
+@router.get("/", response_model=List[schemas.StatDimension])
+async def list_dimensions(current_user: schemas.User = Depends(auth.get_current_active_user)):
+    return [
+        {"name": name, "description": spec.description, "grouped": spec.grouped}
+        for name, spec in stats.STAT_SPECS.items()
+    ]
+
+@router.get("/doctors/{doctor_id}/medications", response_model=schemas.StatsResult)
+async def read_doctor_top_medications(
+    doctor_id: int,
+    limit: int = Query(10, ge=1, le=1000),
+    db=Depends(get_async_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    require_sqlite()
+    return await stats.top(db, "medications_by_doctor", str(doctor_id), limit)
+
+@router.get("/symptoms/{symptom_name}/related", response_model=schemas.RelatedSymptoms)
+async def read_related_symptoms(
+    symptom_name: str,
+    limit: int = Query(10, ge=1, le=1000),
+    db=Depends(get_async_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    require_sqlite()
+    return await stats.related_symptoms(db, symptom_name, limit)
+
+@router.get("/symptoms/{symptom_name}/trend", response_model=schemas.SymptomTrend)
+async def read_symptom_trend(
+    symptom_name: str,
+    weeks: int = Query(26, ge=1, le=520),
+    until: Optional[date] = None,
+    db=Depends(get_async_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    require_sqlite()
+    return await stats.symptom_trend(db, symptom_name, weeks, until)
+
+@router.get("/{dimension}", response_model=schemas.StatsResult)
+async def read_dimension(
+    dimension: str,
+    group: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=1000),
+    db=Depends(get_async_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    require_sqlite()
+    spec = stats.STAT_SPECS.get(dimension)
+    if spec is None:
+        raise HTTPException(status_code=404, detail="Unknown statistics dimension")
+    if spec.grouped and group is None:
+        raise HTTPException(status_code=400, detail=f"'{dimension}' requires the group parameter")
+    return await stats.top(db, dimension, group or "", limit)
@@ -0,0 +1,53 @@
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import List, Optional
+
+from .. import async_crud, crud, models, schemas, auth
+from ..database import get_async_db
+from .conditional import versioned
+from .pagination import filtered_list, list_page
+
+router = APIRouter(prefix="/symptoms", tags=["symptoms"])
+
+CACHE_CONTROL = os.getenv("SYMPTOMS_CACHE_CONTROL", "private, max-age=60")
+reference_cache = versioned("symptoms", cache_control=CACHE_CONTROL)
+
+@router.get("/", response_model=List[schemas.Symptom], dependencies=[reference_cache])
+async def read_symptoms(
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    db=Depends(get_async_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    return await list_page(response, db, models.Symptom, skip, limit, cursor, sort)
+
+@router.get("/{symptom_id}", response_model=schemas.Symptom, dependencies=[reference_cache])
+async def read_symptom(
+    symptom_id: int,
+    db=Depends(get_async_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    db_symptom = await async_crud.get_symptom(db, symptom_id=symptom_id)
+    if db_symptom is None:
+        raise HTTPException(status_code=404, detail="Symptom not found")
+    return db_symptom
+
+@router.get("/category/{category}", response_model=List[schemas.Symptom], dependencies=[reference_cache])
+async def read_symptoms_by_category(
+    category: str,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    db=Depends(get_async_db),
+    current_user: schemas.User = Depends(auth.get_current_active_user)
+):
+    return await filtered_list(
+        response, db, models.Symptom, schemas.Symptom, crud.symptoms_by_category(category),
+        limit, cursor, sort, response_format,
+    )
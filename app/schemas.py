@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator
 from typing import Optional, List
 from datetime import date, datetime
 
@@ -31,6 +31,11 @@ class TokenData(BaseModel):
     username: Optional[str] = None
 
 
+class PasswordChange(BaseModel):
+    current_password: str
+    new_password: str
+
+
 
 class PatientBase(BaseModel):
     last_name: str
@@ -49,6 +54,28 @@ class PatientCreate(PatientBase):
     pass
 
 
+class PatientUpdate(BaseModel):
+    # PATCH: передаются только изменяемые поля
+    last_name: Optional[str] = None
+    first_name: Optional[str] = None
+    middle_name: Optional[str] = None
+    gender: Optional[str] = None
+    city: Optional[str] = None
+    street: Optional[str] = None
+    building: Optional[str] = None
+    email: Optional[str] = None
+    birth_date: Optional[str] = None
+    phone: Optional[str] = None
+
+    # поле можно не передавать, но явный null допустим только для middle_name: остальные колонки NOT NULL
+    @field_validator("last_name", "first_name", "gender", "city", "street", "building", "email", "birth_date", "phone")
+    @classmethod
+    def reject_null(cls, value):
+        if value is None:
+            raise ValueError("may be omitted but not null")
+        return value
+
+
 class Patient(PatientBase):
     id: int
 
@@ -56,6 +83,18 @@ class Patient(PatientBase):
         from_attributes = True
 
 
+class PatientMatch(BaseModel):
+    patient: Patient
+    score: float
+
+
+class PatientMatchResult(BaseModel):
+    # patient_id заполнен, только если лучший кандидат прошел порог и однозначен
+    patient_id: Optional[int] = None
+    status: str
+    candidates: List[PatientMatch]
+
+
 class DoctorBase(BaseModel):
     last_name: str
     first_name: str
@@ -163,4 +202,145 @@ class Prescription(PrescriptionBase):
     id: int
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class InteractionCheck(BaseModel):
+    patient_id: int
+    medication_name: str
+
+
+class InteractionFinding(BaseModel):
+    prescription_id: Optional[int] = None
+    medication_name: str
+    severity: str
+    description: str
+    blocking: bool
+
+    class Config:
+        from_attributes = True
+
+
+class InteractionCheckResult(BaseModel):
+    patient_id: int
+    medication_name: str
+    blocking: bool
+    findings: List[InteractionFinding]
+
+
+class DoseExposure(BaseModel):
+    medication_name: str
+    unit: str
+    prescriptions: int
+    # сумма суточная доза * дни курса по назначениям с распознанной частотой
+    total_exposure: float
+    mean_daily_dose: Optional[float] = None
+    unknown_frequency: int
+
+
+class DoseOutlier(BaseModel):
+    prescription_id: int
+    patient_id: Optional[int] = None
+    medication_name: str
+    unit: str
+    daily_dose: float
+    median_daily_dose: float
+    score: float
+
+
+class ExpiryRun(BaseModel):
+    started_at: datetime
+    as_of: date
+    expired: int
+    batches: int
+    seconds: float
+    error: Optional[str] = None
+
+
+class ExpiryMetrics(BaseModel):
+    interval: float
+    runs: int
+    failures: int
+    expired: int
+    runs_recent: List[ExpiryRun]
+
+
+class TimelinePrescription(Prescription):
+    doctor: Optional[Doctor] = None
+
+
+class TimelineEvent(BaseModel):
+    type: str
+    id: int
+    event_date: Optional[date] = None
+    complaint: Optional[PatientComplaint] = None
+    prescription: Optional[TimelinePrescription] = None
+
+
+class PatientTimeline(BaseModel):
+    patient: Patient
+    events: List[TimelineEvent]
+
+
+class BatchItemError(BaseModel):
+    index: int
+    detail: str
+
+
+class BatchResult(BaseModel):
+    created: int
+    ids: List[Optional[int]]
+    errors: List[BatchItemError]
+
+
+class SearchHit(BaseModel):
+    type: str
+    id: int
+    title: str
+    score: float
+
+
+class SearchResults(BaseModel):
+    items: List[SearchHit]
+    next_offset: Optional[int] = None
+
+
+class StatItem(BaseModel):
+    key: str
+    count: int
+
+
+class StatsResult(BaseModel):
+    dimension: str
+    group: Optional[str] = None
+    total: int
+    items: List[StatItem]
+
+
+class StatDimension(BaseModel):
+    name: str
+    description: str
+    grouped: bool
+
+
+class RelatedSymptom(BaseModel):
+    symptom_name: str
+    count: int
+    share: float
+
+
+class RelatedSymptoms(BaseModel):
+    symptom_name: str
+    complaints: int
+    items: List[RelatedSymptom]
+
+
+class WeekCount(BaseModel):
+    week: date
+    count: int
+
+
+class SymptomTrend(BaseModel):
+    symptom_name: str
+    total: int
+    weeks: List[WeekCount]
@@ -0,0 +1,138 @@
+# app/search.py
+# Полнотекстовый поиск на SQLite FTS5. Индексы - external content таблицы поверх
+# представлений, которые нормализуют ё -> е; синхронизацию с исходными таблицами
+# ведут триггеры, поэтому индекс видит и импорт, и любые записи через crud.
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+TOKENIZER = "unicode61 remove_diacritics 2"
+# префиксный индекс FTS5 для префиксов длиной 2-6 символов: запросы вида "иванов*" читают
+# один готовый список документов вместо слияния списков всех слов с этим префиксом
+PREFIX_LENGTHS = "2 3 4 5 6"
+
+
+@dataclass(frozen=True)
+class SearchSpec:
+    table: str
+    columns: Tuple[str, ...]
+    weights: Tuple[float, ...]
+
+    @property
+    def fts(self) -> str:
+        return f"{self.table}_fts"
+
+    @property
+    def source(self) -> str:
+        return f"{self.table}_search_src"
+
+
+SEARCH_SPECS: Dict[str, SearchSpec] = {
+    "patients": SearchSpec("patients", ("last_name", "first_name", "middle_name", "city", "phone"), (10, 5, 3, 1, 1)),
+    "diagnoses": SearchSpec("diagnoses", ("name",), (1,)),
+    "symptoms": SearchSpec("symptoms", ("name", "description"), (5, 1)),
+}
+
+
+def fold_sql(expr: str) -> str:
+    return f"replace(replace({expr}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def fold(value: str) -> str:
+    return value.replace("ё", "е").replace("Ё", "Е")
+
+
+def search_ddl(spec: SearchSpec) -> List[str]:
+    columns = ", ".join(spec.columns)
+    folded = ", ".join(f"{fold_sql(column)} AS {column}" for column in spec.columns)
+    new_values = ", ".join(fold_sql(f"new.{column}") for column in spec.columns)
+    old_values = ", ".join(fold_sql(f"old.{column}") for column in spec.columns)
+    insert_new = f"INSERT INTO {spec.fts}(rowid, {columns}) VALUES (new.id, {new_values});"
+    delete_old = f"INSERT INTO {spec.fts}({spec.fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    return [
+        f"CREATE VIEW IF NOT EXISTS {spec.source} AS SELECT id, {folded} FROM {spec.table}",
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {spec.fts} USING fts5({columns}, content='{spec.source}', "
+        f"content_rowid='id', tokenize='{TOKENIZER}', prefix='{PREFIX_LENGTHS}')",
+        f"CREATE TRIGGER IF NOT EXISTS {spec.table}_fts_ai AFTER INSERT ON {spec.table} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {spec.table}_fts_ad AFTER DELETE ON {spec.table} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {spec.table}_fts_au AFTER UPDATE OF {columns} ON {spec.table} "
+        f"BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+def ensure_search_tables(conn: Connection) -> List[str]:
+    """Создает FTS-таблицы и триггеры; новый индекс сразу заполняется из исходной таблицы."""
+    if conn.dialect.name != "sqlite":
+        return []
+    applied = []
+    for spec in SEARCH_SPECS.values():
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (spec.fts,)
+        ).first()
+        for statement in search_ddl(spec):
+            conn.exec_driver_sql(statement)
+        if not exists:
+            conn.exec_driver_sql(f"INSERT INTO {spec.fts}({spec.fts}) VALUES ('rebuild')")
+            applied.append(f"search index {spec.fts}")
+    return applied
+
+
+def match_query(query: str) -> Optional[str]:
+    """Пользовательский ввод -> выражение MATCH: все слова обязательны, последнее - как префикс,
+    потому что его обычно еще допечатывают ("петров ив" -> "петров" "ив"*)."""
+    tokens = re.findall(r"\w+", fold(query))
+    if not tokens:
+        return None
+    return " ".join([f'"{token}"' for token in tokens[:-1]] + [f'"{tokens[-1]}"*'])
+
+
+def search_sql(specs: Sequence[SearchSpec]) -> str:
+    parts = []
+    for spec in specs:
+        weights = ", ".join(str(weight) for weight in spec.weights)
+        # ORDER BY rank LIMIT внутри FTS5: bm25 с весами считается по всем совпадениям,
+        # а сортировка держит только первые window строк
+        parts.append(
+            f"SELECT * FROM (SELECT '{spec.table}' AS type, rowid AS id, rank AS score FROM {spec.fts} "
+            f"WHERE {spec.fts} MATCH :query AND rank MATCH 'bm25({weights})' ORDER BY rank LIMIT :window)"
+        )
+    return " UNION ALL ".join(parts) + " ORDER BY score, type, id LIMIT :limit OFFSET :offset"
+
+
+TITLE_SQL = {
+    "patients": "SELECT id, trim(last_name || ' ' || first_name || ' ' || coalesce(middle_name, '')) FROM patients",
+    "diagnoses": "SELECT id, icd_code || ' ' || name FROM diagnoses",
+    "symptoms": "SELECT id, name FROM symptoms",
+}
+
+
+async def search(db, query: str, types: Sequence[str], limit: int, offset: int) -> Tuple[list, bool]:
+    """Ранжированные (bm25) совпадения; возвращает (страница, есть ли следующая)."""
+    expression = match_query(query)
+    if expression is None:
+        return [], False
+    specs = [SEARCH_SPECS[name] for name in types]
+    rows = (await db.execute(text(search_sql(specs)), {
+        "query": expression, "window": offset + limit + 1, "limit": limit + 1, "offset": offset,
+    })).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    titles = {}
+    for name in {row.type for row in rows}:
+        ids = [row.id for row in rows if row.type == name]
+        placeholders = ", ".join(f":id{i}" for i in range(len(ids)))
+        result = await db.execute(
+            text(f"{TITLE_SQL[name]} WHERE id IN ({placeholders})"),
+            {f"id{i}": value for i, value in enumerate(ids)},
+        )
+        titles.update({(name, row[0]): row[1] for row in result})
+    hits = [
+        {"type": row.type, "id": row.id, "title": titles.get((row.type, row.id), ""), "score": -row.score}
+        for row in rows
+    ]
+    return hits, has_more
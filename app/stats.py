@@ -0,0 +1,282 @@
+# app/stats.py
+# Предрасчитанная статистика по назначениям и жалобам. Счетчики в stat_counters ведут триггеры
+# SQLite на вставку, удаление и изменение строк, поэтому их видят и импорт, и crud, и массовые
+# UPDATE; чтение - выборка нескольких строк по индексу без сканирования исходных таблиц.
+# Для модели симптомов ведутся недельные счетчики жалоб и матрица совместной встречаемости
+# симптомов (разреженная: строка счетчика на каждую встретившуюся пару).
+#
+#   python -m app.stats --rebuild   пересчитать все счетчики заново из таблиц
+import argparse
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import Connection
+
+from . import models
+from .database import engine
+
+
+@dataclass(frozen=True)
+class StatSpec:
+    """Счетчик строк table по item (в пределах group) среди строк, где выполнено where.
+
+    Выражения - SQL с {row} вместо имени строки: new/old в триггере, имя таблицы при пересчете.
+    """
+    table: str
+    item: str
+    columns: Tuple[str, ...]
+    group: str = "''"
+    where: str = "1"
+    description: str = ""
+
+    @property
+    def grouped(self) -> bool:
+        return self.group != "''"
+
+
+ACTIVE = f"{{row}}.status = '{models.PRESCRIPTION_ACTIVE}'"
+DOCTOR_DEPARTMENT = "(SELECT department FROM doctors WHERE doctors.id = {row}.doctor_id)"
+
+STAT_SPECS: Dict[str, StatSpec] = {
+    "prescriptions_by_status": StatSpec(
+        "prescriptions", "{row}.status", ("status",), description="Назначения по статусу"),
+    "prescriptions_by_doctor": StatSpec(
+        "prescriptions", "CAST({row}.doctor_id AS TEXT)", ("doctor_id",), description="Назначения по врачу (id)"),
+    "prescriptions_by_medication": StatSpec(
+        "prescriptions", "{row}.medication_name", ("medication_name",), description="Назначения по препарату"),
+    "medications_by_doctor": StatSpec(
+        "prescriptions", "{row}.medication_name", ("doctor_id", "medication_name"),
+        group="CAST({row}.doctor_id AS TEXT)", description="Препараты врача (группа - id врача)"),
+    "active_prescriptions_by_department": StatSpec(
+        "prescriptions", DOCTOR_DEPARTMENT, ("doctor_id", "status"), where=ACTIVE,
+        description="Действующие назначения по отделению врача"),
+    "complaints_by_symptom": StatSpec(
+        "patient_complaints", "{row}.symptom_name", ("symptom_name",), description="Жалобы по симптому"),
+    "complaints_by_severity": StatSpec(
+        "patient_complaints", "{row}.severity", ("severity",), description="Жалобы по тяжести"),
+    "complaints_by_month": StatSpec(
+        "patient_complaints", "strftime('%Y-%m', {row}.complaint_date)", ("complaint_date",),
+        description="Жалобы по месяцам (YYYY-MM)"),
+    "complaints_by_week": StatSpec(
+        "patient_complaints", "date({row}.complaint_date, 'weekday 0', '-6 days')", ("symptom_name", "complaint_date"),
+        group="{row}.symptom_name", description="Жалобы на симптом по неделям (значение - понедельник недели)"),
+}
+
+# жалобы одного пациента за один день - один визит; симптомы визита попарно считаются в обе стороны:
+# группа - симптом, значение - симптом, отмеченный вместе с ним
+COOCCURRENCE = "symptom_cooccurrence"
+SAME_VISIT = ("other.patient_id = {row}.patient_id AND other.complaint_date = {row}.complaint_date "
+              "AND other.id != {row}.id AND other.symptom_name != {row}.symptom_name")
+
+
+def increment_sql(name: str, spec: StatSpec, row: str) -> str:
+    # WHERE в INSERT ... SELECT обязателен: без него SQLite не отличает ON CONFLICT от JOIN
+    return (
+        f"INSERT INTO stat_counters (dimension, group_key, item_key, count) "
+        f"SELECT '{name}', coalesce({spec.group}, ''), coalesce({spec.item}, ''), 1 WHERE {spec.where} "
+        f"ON CONFLICT (dimension, group_key, item_key) DO UPDATE SET count = count + 1;"
+    ).format(row=row)
+
+
+def decrement_sql(name: str, spec: StatSpec, row: str) -> str:
+    return (
+        f"UPDATE stat_counters SET count = count - 1 WHERE dimension = '{name}' "
+        f"AND group_key = coalesce({spec.group}, '') AND item_key = coalesce({spec.item}, '') AND {spec.where};"
+    ).format(row=row)
+
+
+def department_move_sql() -> List[str]:
+    """Смена отделения врача переносит его действующие назначения в счетчике по отделениям."""
+    active = ("(SELECT count(*) FROM prescriptions WHERE doctor_id = {row}.id AND status = "
+              f"'{models.PRESCRIPTION_ACTIVE}')")
+    return [
+        "UPDATE stat_counters SET count = count - " + active.format(row="old") +
+        " WHERE dimension = 'active_prescriptions_by_department' AND group_key = '' "
+        "AND item_key = coalesce(old.department, '');",
+        "INSERT INTO stat_counters (dimension, group_key, item_key, count) "
+        "SELECT 'active_prescriptions_by_department', '', coalesce(new.department, ''), " + active.format(row="new") +
+        " WHERE 1 ON CONFLICT (dimension, group_key, item_key) DO UPDATE SET count = count + excluded.count;",
+    ]
+
+
+def cooccurrence_increment_sql(row: str) -> List[str]:
+    """Новая жалоба добавляет пары с остальными симптомами визита: поиск по ix_patient_complaints_patient_date."""
+    visit = SAME_VISIT.format(row=row)
+    return [
+        f"INSERT INTO stat_counters (dimension, group_key, item_key, count) "
+        f"SELECT '{COOCCURRENCE}', {group}, {item}, 1 FROM patient_complaints other WHERE {visit} "
+        f"ON CONFLICT (dimension, group_key, item_key) DO UPDATE SET count = count + 1;"
+        for group, item in ((f"{row}.symptom_name", "other.symptom_name"), ("other.symptom_name", f"{row}.symptom_name"))
+    ]
+
+
+def cooccurrence_decrement_sql(row: str) -> List[str]:
+    visit = SAME_VISIT.format(row=row)
+    return [
+        f"UPDATE stat_counters SET count = count - (SELECT count(*) FROM patient_complaints other "
+        f"WHERE {visit} AND other.symptom_name = stat_counters.{other}) "
+        f"WHERE dimension = '{COOCCURRENCE}' AND {own} = {row}.symptom_name "
+        f"AND {other} IN (SELECT other.symptom_name FROM patient_complaints other WHERE {visit});"
+        for own, other in (("group_key", "item_key"), ("item_key", "group_key"))
+    ]
+
+
+def trigger_ddl() -> List[str]:
+    statements = []
+    for table in sorted({spec.table for spec in STAT_SPECS.values()}):
+        specs = [(name, spec) for name, spec in STAT_SPECS.items() if spec.table == table]
+        columns = sorted({column for _, spec in specs for column in spec.columns})
+        insert_new = [increment_sql(name, spec, "new") for name, spec in specs]
+        delete_old = [decrement_sql(name, spec, "old") for name, spec in specs]
+        if table == "patient_complaints":
+            columns = sorted({*columns, "complaint_date", "patient_id", "symptom_name"})
+            insert_new += cooccurrence_increment_sql("new")
+            delete_old += cooccurrence_decrement_sql("old")
+        insert_new, delete_old = " ".join(insert_new), " ".join(delete_old)
+        statements += [
+            f"CREATE TRIGGER {table}_stats_ai AFTER INSERT ON {table} BEGIN {insert_new} END",
+            f"CREATE TRIGGER {table}_stats_ad AFTER DELETE ON {table} BEGIN {delete_old} END",
+            f"CREATE TRIGGER {table}_stats_au AFTER UPDATE OF {', '.join(columns)} ON {table} "
+            f"BEGIN {delete_old} {insert_new} END",
+        ]
+    statements.append(
+        f"CREATE TRIGGER doctors_stats_au AFTER UPDATE OF department ON doctors "
+        f"BEGIN {' '.join(department_move_sql())} END"
+    )
+    return statements
+
+
+def rebuild(conn: Connection) -> int:
+    """Пересчитывает все счетчики одним GROUP BY на измерение; возвращает число строк счетчиков."""
+    conn.exec_driver_sql("DELETE FROM stat_counters")
+    for name, spec in STAT_SPECS.items():
+        conn.exec_driver_sql(
+            f"INSERT INTO stat_counters (dimension, group_key, item_key, count) "
+            f"SELECT '{name}', coalesce({spec.group}, ''), coalesce({spec.item}, ''), count(*) "
+            f"FROM {spec.table} WHERE {spec.where} GROUP BY 2, 3".format(row=spec.table)
+        )
+    conn.exec_driver_sql(
+        f"INSERT INTO stat_counters (dimension, group_key, item_key, count) "
+        f"SELECT '{COOCCURRENCE}', visit.symptom_name, other.symptom_name, count(*) "
+        f"FROM patient_complaints visit JOIN patient_complaints other ON {SAME_VISIT.format(row='visit')} GROUP BY 2, 3"
+    )
+    return conn.exec_driver_sql("SELECT count(*) FROM stat_counters").scalar()
+
+
+def ensure_stat_triggers(conn: Connection) -> List[str]:
+    """Создает триггеры счетчиков и пересоздает те, чей текст изменился (добавлены счетчики).
+
+    После любого изменения триггеров счетчики заполняются заново из текущих данных.
+    """
+    if conn.dialect.name != "sqlite":
+        return []
+    existing = dict(conn.exec_driver_sql("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").all())
+    changed = []
+    for statement in trigger_ddl():
+        name = statement.split()[2]
+        if existing.get(name) == statement:
+            continue
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        conn.exec_driver_sql(statement)
+        changed.append(name)
+    if not changed:
+        return []
+    return [f"stat triggers {', '.join(changed)}", f"stat counters ({rebuild(conn)} rows)"]
+
+
+def top_select(dimension: str, group: str = "", limit: int = 20):
+    counter = models.StatCounter
+    return (
+        select(counter.item_key, counter.count)
+        .where(counter.dimension == dimension, counter.group_key == group, counter.count > 0)
+        .order_by(counter.count.desc(), counter.item_key)
+        .limit(limit)
+    )
+
+
+def total_select(dimension: str, group: str = ""):
+    counter = models.StatCounter
+    return select(func.coalesce(func.sum(counter.count), 0)).where(
+        counter.dimension == dimension, counter.group_key == group)
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def counter_select(dimension: str, group: str, item: str):
+    counter = models.StatCounter
+    return select(counter.count).where(
+        counter.dimension == dimension, counter.group_key == group, counter.item_key == item)
+
+
+def trend_select(symptom: str, since: date, until: date):
+    """Недели симптома по порядку: диапазон по первичному ключу (dimension, group_key, item_key)."""
+    counter = models.StatCounter
+    return (
+        select(counter.item_key, counter.count)
+        .where(counter.dimension == "complaints_by_week", counter.group_key == symptom,
+               counter.item_key.between(since.isoformat(), until.isoformat()))
+        .order_by(counter.item_key)
+    )
+
+
+async def top(db, dimension: str, group: str = "", limit: int = 20) -> dict:
+    rows = (await db.execute(top_select(dimension, group, limit))).all()
+    total = await db.scalar(total_select(dimension, group))
+    return {
+        "dimension": dimension,
+        "group": group or None,
+        "total": total,
+        "items": [{"key": row.item_key, "count": row.count} for row in rows],
+    }
+
+
+async def related_symptoms(db, symptom: str, limit: int = 20) -> dict:
+    """Симптомы, отмеченные в тех же визитах; share - доля жалоб на symptom, где они были вместе."""
+    rows = (await db.execute(top_select(COOCCURRENCE, symptom, limit))).all()
+    complaints = await db.scalar(counter_select("complaints_by_symptom", "", symptom)) or 0
+    return {
+        "symptom_name": symptom,
+        "complaints": complaints,
+        "items": [
+            {"symptom_name": row.item_key, "count": row.count,
+             "share": round(row.count / complaints, 4) if complaints else 0.0}
+            for row in rows
+        ],
+    }
+
+
+async def symptom_trend(db, symptom: str, weeks: int = 26, until: Optional[date] = None) -> dict:
+    """Последние weeks недель до until (по умолчанию - до последней недели с жалобами), пустые недели - нули."""
+    if until is None:
+        counter = models.StatCounter
+        latest = await db.scalar(select(func.max(counter.item_key)).where(
+            counter.dimension == "complaints_by_week", counter.group_key == symptom))
+        until = date.fromisoformat(latest) if latest else date.today()
+    end = week_start(until)
+    start = end - timedelta(weeks=weeks - 1)
+    counts = dict((await db.execute(trend_select(symptom, start, end))).all())
+    series = [start + timedelta(weeks=i) for i in range(weeks)]
+    return {
+        "symptom_name": symptom,
+        "total": sum(counts.values()),
+        "weeks": [{"week": week, "count": counts.get(week.isoformat(), 0)} for week in series],
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.stats", description="Предрасчитанная статистика")
+    parser.add_argument("--rebuild", action="store_true", help="пересчитать все счетчики из таблиц")
+    args = parser.parse_args(argv)
+    if not args.rebuild:
+        parser.print_help()
+        return
+    with engine.begin() as conn:
+        print(f"[STATS] Rebuilt {rebuild(conn)} counters")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,16 @@
-# app/utils.py
-import csv
-from datetime import datetime
-from sqlalchemy.orm import Session
 import os
-import sys
+from sqlalchemy.orm import Session
 
 
 def import_csv_data(db: Session):
 
     try:
 
-        from app.models import (
-            Diagnosis, Doctor, Patient,
-            PatientComplaint, Prescription, Symptom, User
-        )
+        from app.importer import CSV_DIR, import_all
 
-        print("✓ Models imported successfully for CSV import")
+        print("✓ Importer loaded successfully for CSV import")
 
-        csv_dir = os.path.join(os.path.dirname(__file__), "data")
+        csv_dir = CSV_DIR
         print(f"[DEBUG] CSV directory: {csv_dir}")
 
 
@@ -25,108 +18,17 @@ def import_csv_data(db: Session):
             print(f"[WARNING] CSV directory does not exist: {csv_dir}")
             os.makedirs(csv_dir, exist_ok=True)
             print(f"[INFO] Created CSV directory: {csv_dir}")
-            return
-
-
-        diagnoses_csv = os.path.join(csv_dir, "diagnoses.csv")
-        if os.path.exists(diagnoses_csv):
-            print(f"[INFO] Importing diagnoses from {diagnoses_csv}")
-            try:
-
-                for encoding in ['utf-8', 'utf-8-sig', 'cp1251', 'windows-1251', 'latin-1']:
-                    try:
-                        with open(diagnoses_csv, 'r', encoding=encoding) as f:
-                            reader = csv.DictReader(f)
-                            count = 0
-                            for row in reader:
-                                diagnosis = Diagnosis(
-                                    icd_code=row.get('icd_code', ''),
-                                    name=row.get('name', ''),
-                                    category=row.get('category', '')
-                                )
-                                db.add(diagnosis)
-                                count += 1
-                            db.commit()
-                            print(f"✓ Imported {count} diagnoses using {encoding} encoding")
-                            break
-                    except UnicodeDecodeError:
-                        continue
-                    except Exception as e:
-                        print(f"✗ Error with {encoding} encoding: {e}")
-                        db.rollback()
-            except Exception as e:
-                print(f"✗ Error importing diagnoses: {e}")
-                db.rollback()
-
-
-        doctors_csv = os.path.join(csv_dir, "doctors.csv")
-        if os.path.exists(doctors_csv):
-            print(f"[INFO] Importing doctors from {doctors_csv}")
-            try:
-                for encoding in ['utf-8', 'utf-8-sig', 'cp1251', 'windows-1251', 'latin-1']:
-                    try:
-                        with open(doctors_csv, 'r', encoding=encoding) as f:
-                            reader = csv.DictReader(f)
-                            count = 0
-                            for row in reader:
-                                doctor = Doctor(
-                                    last_name=row.get('last_name', ''),
-                                    first_name=row.get('first_name', ''),
-                                    middle_name=row.get('middle_name', ''),
-                                    specialty=row.get('specialty', ''),
-                                    department=row.get('department', ''),
-                                    email=row.get('email', ''),
-                                    phone=row.get('phone', '')
-                                )
-                                db.add(doctor)
-                                count += 1
-                            db.commit()
-                            print(f"✓ Imported {count} doctors using {encoding} encoding")
-                            break
-                    except UnicodeDecodeError:
-                        continue
-            except Exception as e:
-                print(f"✗ Error importing doctors: {e}")
-                db.rollback()
+            return {}
 
 
-        patients_csv = os.path.join(csv_dir, "patients.csv")
-        if os.path.exists(patients_csv):
-            print(f"[INFO] Importing patients from {patients_csv}")
-            try:
-                for encoding in ['utf-8', 'utf-8-sig', 'cp1251', 'windows-1251', 'latin-1']:
-                    try:
-                        with open(patients_csv, 'r', encoding=encoding) as f:
-                            reader = csv.DictReader(f)
-                            count = 0
-                            for row in reader:
-                                patient = Patient(
-                                    last_name=row.get('last_name', ''),
-                                    first_name=row.get('first_name', ''),
-                                    middle_name=row.get('middle_name', ''),
-                                    gender=row.get('gender', ''),
-                                    city=row.get('city', ''),
-                                    street=row.get('street', ''),
-                                    building=row.get('building', ''),
-                                    email=row.get('email', ''),
-                                    birth_date=row.get('birth_date', ''),
-                                    phone=row.get('phone', '')
-                                )
-                                db.add(patient)
-                                count += 1
-                            db.commit()
-                            print(f"✓ Imported {count} patients using {encoding} encoding")
-                            break
-                    except UnicodeDecodeError:
-                        continue
-            except Exception as e:
-                print(f"✗ Error importing patients: {e}")
-                db.rollback()
+        stats = import_all(db.connection(), csv_dir)
+        db.commit()
 
         print("✓ CSV import completed")
+        return stats
 
     except ImportError as e:
         print(f"✗ Import error: {e}")
     except Exception as e:
         print(f"✗ Error during CSV import: {e}")
-        db.rollback()
\ No newline at end of file
+        db.rollback()
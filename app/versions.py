@@ -0,0 +1,83 @@
+# app/versions.py
+# Версии справочных таблиц для ETag ответов и кэшей в памяти процесса. Версию в table_versions
+# увеличивают триггеры SQLite на вставку, удаление и изменение строк, поэтому новую версию видят
+# все воркеры uvicorn и запись из CLI (python -m app.importer, python -m app.lifecycle).
+# Начальная версия случайная: ETag пересозданной базы не совпадет с выданными раньше.
+import hashlib
+import os
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.engine import Connection
+
+from . import models
+
+# таблица -> колонки, изменение которых меняет версию (пусто - любые); вставка и удаление меняют всегда
+VERSIONED_TABLES: Dict[str, Tuple[str, ...]] = {
+    "doctors": (),
+    "diagnoses": (),
+    "symptoms": (),
+    # кэш пользователей auth.user_cache
+    "users": (),
+    # колонки снимка доз (doses.dose_select): смена статуса истекшим назначениям версию не трогает
+    "prescriptions": ("patient_id", "medication_name", "quantity", "dose_unit", "frequency", "duration_in_days"),
+}
+
+
+def bump_sql(table: str) -> str:
+    return (
+        f"INSERT INTO table_versions (table_name, version) VALUES ('{table}', 1) "
+        f"ON CONFLICT (table_name) DO UPDATE SET version = version + 1;"
+    )
+
+
+def trigger_ddl() -> List[str]:
+    statements = []
+    for table, columns in VERSIONED_TABLES.items():
+        update = f"UPDATE OF {', '.join(columns)}" if columns else "UPDATE"
+        statements += [
+            f"CREATE TRIGGER {table}_version_{suffix} AFTER {action} ON {table} BEGIN {bump_sql(table)} END"
+            for suffix, action in (("ai", "INSERT"), ("ad", "DELETE"), ("au", update))
+        ]
+    return statements
+
+
+def ensure_version_triggers(conn: Connection) -> List[str]:
+    """Заводит строки версий со случайным началом и создает (пересоздает измененные) триггеры."""
+    if conn.dialect.name != "sqlite":
+        return []
+    applied = []
+    seeded = set(conn.scalars(select(models.TableVersion.table_name)))
+    for table in VERSIONED_TABLES:
+        if table not in seeded:
+            conn.execute(models.TableVersion.__table__.insert().values(
+                table_name=table, version=int.from_bytes(os.urandom(4), "big")))
+            applied.append(f"table version {table}")
+    existing = dict(conn.exec_driver_sql("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").all())
+    for statement in trigger_ddl():
+        name = statement.split()[2]
+        if existing.get(name) == statement:
+            continue
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        conn.exec_driver_sql(statement)
+        applied.append(f"version trigger {name}")
+    return applied
+
+
+def versions_select(tables: Iterable[str]):
+    version = models.TableVersion
+    return select(version.table_name, version.version).where(version.table_name.in_(list(tables)))
+
+
+def version_select(table: str):
+    return select(models.TableVersion.version).where(models.TableVersion.table_name == table)
+
+
+async def current_versions(db, tables: Iterable[str]) -> Dict[str, int]:
+    return dict((await db.execute(versions_select(tables))).all())
+
+
+def etag(versions: Dict[str, int], tables: Iterable[str], resource: str) -> str:
+    state = ",".join(f"{table}:{versions.get(table, 0)}" for table in tables)
+    digest = hashlib.sha256(f"{state}|{resource}".encode()).hexdigest()
+    return f'"{digest[:32]}"'
@@ -0,0 +1,41 @@
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# адрес базы читается при импорте app.database, поэтому временный файл задаем до импорта приложения
+TEST_DIR = Path(tempfile.mkdtemp(prefix="hospital-tests-"))
+os.environ["DATABASE_URL"] = f"sqlite:///{TEST_DIR / 'hospital.db'}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import auth, schemas  # noqa: E402
+from app.database import engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.migrations import upgrade  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    upgrade(engine)
+    yield engine
+    engine.dispose()
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def client():
+    # без lifespan: CSV-импорт и фоновые задачи тестам не нужны; проверку токена заменяем фиксированным пользователем
+    app.dependency_overrides[auth.get_current_active_user] = lambda: schemas.User(
+        id=1, username="tester", email="tester@example.com", is_active=True)
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,32 @@
+import pytest
+from sqlalchemy import text
+
+from app import doses
+from app.database import engine
+
+pytest.importorskip("numpy")
+
+
+def insert_prescription(conn, medication, quantity):
+    conn.execute(text(
+        "INSERT INTO prescriptions (patient_last_name, patient_first_name, doctor_last_name, doctor_first_name, "
+        "medication_name, quantity, dose_unit, frequency, duration_in_days, start_date, instructions, status) "
+        "VALUES ('Дозов', 'Иван', 'Петров', 'Петр', :medication, :quantity, 'мг', '1 раз в день', 5, '2024-03-01', "
+        "'', 'active')"), {"medication": medication, "quantity": quantity})
+
+
+def total_daily(medication):
+    frame = doses.dose_cache.get()
+    code = frame.medication_names.index(medication)
+    return float(frame.daily[frame.medications == code].sum())
+
+
+def test_cache_reloads_after_update_of_dose_columns():
+    with engine.begin() as conn:
+        insert_prescription(conn, "кэшемицин", 100)
+    assert total_daily("кэшемицин") == 100
+
+    # UPDATE не меняет ни count(*), ни max(id)
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE prescriptions SET quantity = 250 WHERE medication_name = 'кэшемицин'"))
+    assert total_daily("кэшемицин") == 250
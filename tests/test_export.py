@@ -0,0 +1,40 @@
+import csv
+import io
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app import export
+from app.database import engine
+
+# один и тот же момент и соседние с ним в разных видах, в которых created_at встречается в базе
+CREATED_AT = [
+    "2026-02-15 23:59:59",
+    "2026-02-15 23:59:59.999000",
+    "2026-02-16 00:00:00",
+    "2026-02-16 00:00:00.000000",
+    "2026-02-16T00:00:00",
+    "2026-02-16 08:30:00.250000",
+]
+
+
+def exported_rows(since, since_id):
+    job = export.prepare_export("prescriptions", since_id=since_id, since=since)
+    with engine.connect() as conn:
+        data = b"".join(job.chunks(conn)).decode("utf-8-sig")
+    return list(csv.DictReader(io.StringIO(data)))
+
+
+def test_since_compares_timestamps_not_strings(client):
+    with engine.begin() as conn:
+        last_id = conn.execute(text("SELECT coalesce(max(id), 0) FROM prescriptions")).scalar()
+        for value in CREATED_AT:
+            conn.execute(text(
+                "INSERT INTO prescriptions (patient_last_name, patient_first_name, doctor_last_name, doctor_first_name, "
+                "medication_name, quantity, dose_unit, frequency, duration_in_days, start_date, instructions, status, "
+                "created_at) VALUES ('Выгрузкин', 'Иван', 'Петров', 'Петр', 'аспирин', 1, 'таб', '1', 1, "
+                "'2026-02-16', '', 'active', :created_at)"), {"created_at": value})
+
+    assert len(exported_rows(datetime(2026, 2, 16), last_id)) == 4
+    assert len(exported_rows(datetime.fromisoformat("2026-02-16T00:00:00.500"), last_id)) == 1
+    assert len(exported_rows(datetime.fromisoformat("2026-02-16T03:00:00+03:00"), last_id)) == 4
@@ -0,0 +1,34 @@
+import json
+
+
+def make_complaints(client, count):
+    patient = dict(last_name="Фильтров", first_name="Петр", gender="М", city="Пермь", street="Ленина", building="7",
+                   email="patient@example.com", birth_date="1990-05-05", phone="+70000000004")
+    patient_id = client.post("/api/patients/patients/", json=patient).json()["id"]
+    complaints = [dict(patient_last_name="Фильтров", patient_first_name="Петр", symptom_name="слабость",
+                       complaint_date=f"2024-01-{day % 28 + 1:02d}", severity="легкая", description=str(day))
+                  for day in range(count)]
+    assert client.post("/api/complaints/complaints/batch", json=complaints).json()["created"] == count
+    return patient_id
+
+
+def test_filter_without_limit_returns_every_row(client):
+    patient_id = make_complaints(client, 250)
+    url = f"/api/complaints/complaints/patient/{patient_id}"
+
+    response = client.get(url)
+    assert response.headers["content-type"] == "application/json"
+    assert len(response.json()) == 250
+    assert "X-Next-Cursor" not in response.headers
+
+    response = client.get(url, params={"limit": 100})
+    assert len(response.json()) == 100
+    second = client.get(url, params={"limit": 200, "cursor": response.headers["X-Next-Cursor"]})
+    assert len(second.json()) == 150
+
+    response = client.get(url, params={"format": "ndjson"})
+    assert len([json.loads(line) for line in response.text.splitlines()]) == 250
+
+
+def test_filter_without_limit_on_empty_result(client):
+    assert client.get("/api/complaints/complaints/patient/999999").json() == []
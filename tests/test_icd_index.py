@@ -0,0 +1,15 @@
+from sqlalchemy import text
+
+from app.database import engine
+
+
+def test_index_sees_diagnoses_written_by_another_process(client):
+    assert client.get("/api/diagnoses/diagnoses/prefix/Z99").json() == []
+
+    # запись мимо приложения, как из CLI-импорта или другого воркера
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO diagnoses (icd_code, name, category) VALUES ('Z99.9', 'Тестовый диагноз', 'Тест')"))
+
+    response = client.get("/api/diagnoses/diagnoses/prefix/Z99")
+    assert [diagnosis["icd_code"] for diagnosis in response.json()] == ["Z99.9"]
+    assert client.get("/api/diagnoses/diagnoses/icd/Z99.9").json()["name"] == "Тестовый диагноз"
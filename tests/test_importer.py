@@ -0,0 +1,99 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from app import models
+from app.importer import SPECS_BY_NAME, import_all
+from app.migrations import upgrade
+
+PATIENT_COLUMNS = ",".join(SPECS_BY_NAME["patients"].columns)
+
+
+def patient_line(i, city="Москва"):
+    return f"Импортов{i},Иван,Иванович,м,{city},Ленина,1,import{i}@example.com,01.01.1990,7{i:010d}\n"
+
+
+@pytest.fixture
+def import_db(tmp_path):
+    # отдельная база: манифест хранит имена файлов, общий patients.csv мешал бы другим тестам
+    bind = create_engine(f"sqlite:///{tmp_path / 'import.db'}")
+    upgrade(bind)
+    yield bind
+    bind.dispose()
+
+
+def count(bind, model):
+    with bind.connect() as conn:
+        return conn.scalar(select(func.count()).select_from(model))
+
+
+def manifest_rows(bind, file_name):
+    with bind.connect() as conn:
+        return conn.scalar(select(models.ImportManifest.row_count).where(models.ImportManifest.file_name == file_name))
+
+
+def run_import(bind, csv_dir, tables, workers=1):
+    with bind.begin() as conn:
+        return import_all(conn, str(csv_dir), workers=workers, tables=tables)
+
+
+def test_manifest_skips_unchanged_and_imports_appended_tail(import_db, tmp_path):
+    path = tmp_path / "patients.csv"
+    path.write_text(PATIENT_COLUMNS + "\n" + patient_line(1) + patient_line(2), encoding="utf-8")
+    assert run_import(import_db, tmp_path, ["patients"])["patients"]["rows"] == 2
+
+    stats = run_import(import_db, tmp_path, ["patients"])["patients"]
+    assert stats == {"rows": 0, "skipped": "size and mtime unchanged"}
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    stats = run_import(import_db, tmp_path, ["patients"])["patients"]
+    assert stats == {"rows": 0, "skipped": "content unchanged (only mtime differs)"}
+
+    # дописанный хвост читается с прежнего размера файла: разобрана только новая строка
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(patient_line(3))
+    assert run_import(import_db, tmp_path, ["patients"])["patients"]["rows"] == 1
+    assert count(import_db, models.Patient) == 3
+    assert manifest_rows(import_db, "patients.csv") == 3
+
+
+def test_manifest_reimports_changed_file(import_db, tmp_path):
+    path = tmp_path / "patients.csv"
+    path.write_text(PATIENT_COLUMNS + "\n" + patient_line(1) + patient_line(2), encoding="utf-8")
+    run_import(import_db, tmp_path, ["patients"])
+
+    # изменена уже импортированная строка: файл читается целиком, upsert обновляет запись без дубля
+    path.write_text(PATIENT_COLUMNS + "\n" + patient_line(1, city="Тверь") + patient_line(2), encoding="utf-8")
+    assert run_import(import_db, tmp_path, ["patients"])["patients"]["rows"] == 2
+    assert count(import_db, models.Patient) == 2
+    with import_db.connect() as conn:
+        assert conn.scalar(select(models.Patient.city).where(models.Patient.last_name == "Импортов1")) == "Тверь"
+    assert manifest_rows(import_db, "patients.csv") == 2
+
+
+def complaint_line(i, description="сухой кашель"):
+    return f"Импортов{i},Иван,Иванович,кашель,10.01.2024,легкая,{description}\n"
+
+
+def test_parallel_import_links_and_dedupes_complaints(import_db, tmp_path):
+    (tmp_path / "patients.csv").write_text(
+        PATIENT_COLUMNS + "\n" + patient_line(1) + patient_line(2), encoding="utf-8")
+    complaints = tmp_path / "patient_complaints.csv"
+    header = ",".join(SPECS_BY_NAME["patient_complaints"].columns) + "\n"
+    # одинаковые пациент, симптом и дата с разным описанием - две законные жалобы
+    complaints.write_text(header + complaint_line(1) + complaint_line(1, "ночной кашель") + complaint_line(2),
+                          encoding="utf-8")
+    stats = run_import(import_db, tmp_path, ["patients", "patient_complaints"], workers=2)
+    assert stats["patient_complaints"]["rows"] == 3
+    with import_db.connect() as conn:
+        # пациенты записаны раньше жалоб, поэтому ссылки разрешены
+        unlinked = select(func.count()).where(models.PatientComplaint.patient_id.is_(None))
+        assert conn.scalar(unlinked) == 0
+
+    # файл переписан с новой строкой в начале: читается целиком, но известные row_hash не вставляются повторно
+    complaints.write_text(header + complaint_line(2, "осиплость") + complaint_line(1)
+                          + complaint_line(1, "ночной кашель") + complaint_line(2), encoding="utf-8")
+    run_import(import_db, tmp_path, ["patients", "patient_complaints"], workers=2)
+    assert count(import_db, models.PatientComplaint) == 4
@@ -0,0 +1,44 @@
+import pytest
+
+from app import interactions, models
+
+
+@pytest.fixture
+def contraindicated(tmp_path, monkeypatch):
+    table = tmp_path / "drug_interactions.csv"
+    table.write_text("drug_a,drug_b,severity,description\n"
+                     "варфарин,аспирин,противопоказано,риск кровотечения\n", encoding="utf-8")
+    index = interactions.InteractionIndex(str(table), str(tmp_path / "drug_classes.csv"))
+    index.load()
+    monkeypatch.setattr(interactions, "interaction_index", index)
+
+
+def prescription_payload(medication_name):
+    return dict(patient_last_name="Взаимодействов", patient_first_name="Иван", doctor_last_name="Петров",
+                doctor_first_name="Петр", medication_name=medication_name, quantity=5, dose_unit="мг",
+                frequency="1 раз в день", duration_in_days=10, start_date="2024-01-10",
+                instructions="", status=models.PRESCRIPTION_ACTIVE, created_at="2024-01-10T09:00:00")
+
+
+def test_contraindicated_prescription_is_rejected(client, contraindicated):
+    client.post("/api/patients/patients/", json=dict(
+        last_name="Взаимодействов", first_name="Иван", gender="М", city="Москва", street="Ленина",
+        building="1", email="interactions@example.com", birth_date="1980-01-01", phone="+70000000000"))
+    url = "/api/prescriptions/prescriptions/"
+    assert client.post(url, json=prescription_payload("Варфарин")).status_code == 200
+
+    response = client.post(url, json=prescription_payload("аспирин"))
+    assert response.status_code == 409
+    assert "риск кровотечения" in response.json()["detail"]
+
+    response = client.post(url + "batch", json=[prescription_payload("аспирин")])
+    assert response.json()["created"] == 0
+    assert "риск кровотечения" in response.json()["errors"][0]["detail"]
+
+    # явное разрешение врача
+    response = client.post(url, params={"allow_interactions": True}, json=prescription_payload("аспирин"))
+    assert response.status_code == 200
+
+
+def test_bench_with_few_checks():
+    interactions.bench(medications=3, checks=3)
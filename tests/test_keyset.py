@@ -0,0 +1,56 @@
+import pytest
+
+from app import crud, models
+from app.database import SessionLocal
+
+KEYSET_DEPARTMENT = "keyset"
+criteria = (models.Doctor.department == KEYSET_DEPARTMENT,)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def doctors():
+    # повторы специальности на границах страниц и сегмент NULL (строки из CSV без специальности)
+    specialties = ["хирург", None, "терапевт", "хирург", None, "терапевт", "хирург", "кардиолог"]
+    with SessionLocal() as db:
+        db.add_all(models.Doctor(last_name=f"Страничный{i}", first_name="Петр", specialty=specialty,
+                                 department=KEYSET_DEPARTMENT, email=f"keyset{i}@example.com", phone="1")
+                   for i, specialty in enumerate(specialties))
+        db.commit()
+
+
+def expected_ids(sort):
+    with SessionLocal() as db:
+        rows = db.query(models.Doctor.id, models.Doctor.specialty).filter(*criteria).all()
+    nulls = sorted(row.id for row in rows if row.specialty is None)
+    values = [row.id for row in sorted((row for row in rows if row.specialty is not None),
+                                       key=lambda row: (row.specialty, row.id))]
+    if sort.startswith("-"):
+        return values[::-1] + nulls[::-1]
+    return nulls + values
+
+
+def walk(sort, limit):
+    ids, cursor = [], None
+    with SessionLocal() as db:
+        while True:
+            rows, cursor = crud.get_page(db, models.Doctor, limit, cursor, sort, criteria)
+            ids += [row.id for row in rows]
+            if not cursor:
+                return ids
+
+
+@pytest.mark.parametrize("sort", ["specialty", "-specialty", "id", "-id"])
+@pytest.mark.parametrize("limit", [1, 2, 3])
+def test_cursor_pages_cover_every_row_once(sort, limit):
+    if sort.lstrip("-") == "id":
+        expected = sorted(expected_ids("specialty"), reverse=sort.startswith("-"))
+    else:
+        expected = expected_ids(sort)
+    assert walk(sort, limit) == expected
+
+
+def test_cursor_for_another_sort_is_rejected():
+    with SessionLocal() as db:
+        _, cursor = crud.get_page(db, models.Doctor, 1, None, "specialty", criteria)
+        with pytest.raises(crud.CursorError):
+            crud.get_page(db, models.Doctor, 1, cursor, "-specialty", criteria)
@@ -0,0 +1,69 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+
+from app import lifecycle, models
+from app.migrations import upgrade
+
+AS_OF = date(2024, 3, 1)
+
+
+@pytest.fixture
+def lifecycle_db(tmp_path):
+    # отдельная база: прогон завершает все истекшие назначения, в том числе созданные другими тестами
+    bind = create_engine(f"sqlite:///{tmp_path / 'lifecycle.db'}")
+    upgrade(bind)
+    yield bind
+    bind.dispose()
+
+
+def add_prescriptions(bind, *rows):
+    with bind.begin() as conn:
+        conn.execute(insert(models.Prescription), [
+            {"patient_last_name": "Истеков", "patient_first_name": "Иван", "medication_name": name,
+             "start_date": start, "duration_in_days": days, "status": status}
+            for name, start, days, status in rows
+        ])
+
+
+def statuses(bind):
+    with bind.connect() as conn:
+        prescriptions = models.Prescription.__table__
+        return dict(conn.execute(select(prescriptions.c.medication_name, prescriptions.c.status)).all())
+
+
+def test_fill_end_dates_for_imported_rows(lifecycle_db):
+    add_prescriptions(lifecycle_db,
+                      ("курс", date(2024, 1, 30), 30, models.PRESCRIPTION_ACTIVE),
+                      ("без срока", date(2024, 1, 30), None, models.PRESCRIPTION_ACTIVE))
+    with lifecycle_db.begin() as conn:
+        assert lifecycle.fill_end_dates(conn) == 1
+        prescriptions = models.Prescription.__table__
+        end_dates = dict(conn.execute(select(prescriptions.c.medication_name, prescriptions.c.end_date)).all())
+    assert end_dates == {"курс": date(2024, 2, 29), "без срока": None}
+
+
+def test_expire_in_batches(lifecycle_db):
+    add_prescriptions(lifecycle_db, *(
+        (f"истекло {i}", date(2024, 1, 1), 10, models.PRESCRIPTION_ACTIVE) for i in range(5)
+    ))
+    add_prescriptions(lifecycle_db,
+                      # end_date == as_of: последний день курса, еще действует
+                      ("последний день", date(2024, 2, 20), 10, models.PRESCRIPTION_ACTIVE),
+                      ("впереди", date(2024, 2, 25), 30, models.PRESCRIPTION_ACTIVE),
+                      ("отменено", date(2024, 1, 1), 10, "отменено"))
+    with lifecycle_db.begin() as conn:
+        lifecycle.fill_end_dates(conn)
+
+    run = lifecycle.expire_prescriptions(lifecycle_db, AS_OF, batch_size=2)
+    assert (run.expired, run.batches, run.error) == (5, 3, None)
+    current = statuses(lifecycle_db)
+    assert all(current[f"истекло {i}"] == models.PRESCRIPTION_COMPLETED for i in range(5))
+    assert current["последний день"] == models.PRESCRIPTION_ACTIVE
+    assert current["впереди"] == models.PRESCRIPTION_ACTIVE
+    assert current["отменено"] == "отменено"
+    assert lifecycle.metrics()["runs_recent"][0]["expired"] == 5
+
+    # повторный прогон ничего не находит
+    assert lifecycle.expire_prescriptions(lifecycle_db, AS_OF, batch_size=2).expired == 0
@@ -0,0 +1,39 @@
+from sqlalchemy import select
+
+from app import models
+from app.database import engine
+from app.importer import SPECS_BY_NAME, bulk_writer
+
+
+def patient_payload(last_name, **changes):
+    payload = dict(last_name=last_name, first_name="Иван", gender="М", city="Москва", street="Ленина",
+                   building="1", email="twin@example.com", birth_date="1980-01-01", phone="+70000000000")
+    return {**payload, **changes}
+
+
+def test_duplicate_patient_without_middle_name_is_conflict(client):
+    # NULL в middle_name раньше считался различным значением, и второй POST создавал дубль с ответом 200
+    assert client.post("/api/patients/patients/", json=patient_payload("Безотчествов")).status_code == 200
+    response = client.post("/api/patients/patients/", json=patient_payload("Безотчествов"))
+    assert response.status_code == 409
+
+    # пустое отчество и NULL - один и тот же ключ
+    response = client.post("/api/patients/patients/", json=patient_payload("Безотчествов", middle_name=""))
+    assert response.status_code == 409
+
+    response = client.post("/api/patients/patients/batch", json=[patient_payload("Безотчествов")])
+    assert response.json()["created"] == 0
+
+
+def test_import_updates_doctor_created_without_middle_name():
+    spec = SPECS_BY_NAME["doctors"]
+    with engine.begin() as conn:
+        conn.execute(models.Doctor.__table__.insert().values(
+            last_name="Импортов", first_name="Петр", middle_name=None, specialty="терапевт",
+            department="терапия", email="importov@example.com", phone="1"))
+        # CSV отдает пустое отчество строкой ''
+        bulk_writer(conn, spec)([("Импортов", "Петр", "", "кардиолог", "терапия", "importov@example.com", "1")])
+        rows = conn.execute(
+            select(models.Doctor.specialty).where(models.Doctor.last_name == "Импортов")).scalars().all()
+    # upsert обновил существующую запись, а не вставил вторую
+    assert rows == ["кардиолог"]
@@ -0,0 +1,30 @@
+import pytest
+
+
+def patient_payload(first_name, **changes):
+    payload = dict(last_name="Нуллов", first_name=first_name, gender="Ж", city="Казань", street="Баумана",
+                   building="5", email="patient@example.com", birth_date="1975-06-01", phone="+70000000001")
+    return {**payload, **changes}
+
+
+@pytest.mark.parametrize("field", ["last_name", "first_name", "gender", "city", "street", "building", "email",
+                                   "birth_date", "phone"])
+def test_patch_rejects_null_for_required_fields(client, field):
+    patient_id = client.post("/api/patients/patients/", json=patient_payload(field)).json()["id"]
+
+    response = client.patch(f"/api/patients/patients/{patient_id}", json={field: None})
+    assert response.status_code == 422
+
+    response = client.get(f"/api/patients/patients/{patient_id}")
+    assert response.status_code == 200
+    assert response.json()[field] is not None
+
+
+def test_patch_clears_middle_name(client):
+    patient_id = client.post("/api/patients/patients/",
+                             json=patient_payload("Анна", middle_name="Петровна")).json()["id"]
+
+    response = client.patch(f"/api/patients/patients/{patient_id}", json={"middle_name": None})
+    assert response.status_code == 200
+    assert response.json()["middle_name"] is None
+    assert client.get(f"/api/patients/patients/{patient_id}").json()["middle_name"] is None
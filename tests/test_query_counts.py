@@ -0,0 +1,117 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from app import crud, schemas
+from app.database import QueryCounter, SessionLocal, engine
+
+
+def patient_payload(last_name, first_name="Иван", **changes):
+    payload = dict(last_name=last_name, first_name=first_name, gender="М", city="Москва", street="Ленина",
+                   building="1", email="patient@example.com", birth_date="1980-01-01", phone="+70000000000")
+    return {**payload, **changes}
+
+
+def complaint_payload(last_name, first_name="Иван"):
+    return dict(patient_last_name=last_name, patient_first_name=first_name, symptom_name="кашель",
+                complaint_date="2024-01-10", severity="легкая", description="сухой кашель")
+
+
+def prescription_payload(last_name, first_name="Иван"):
+    return dict(patient_last_name=last_name, patient_first_name=first_name, doctor_last_name="Петров",
+                doctor_first_name="Петр", medication_name="амоксициллин", quantity=500, dose_unit="мг",
+                frequency="2 раза в день", duration_in_days=7, start_date="2024-01-10",
+                instructions="после еды", status="active", created_at="2024-01-10T09:00:00")
+
+
+def counted(client, method, url, **kwargs):
+    with QueryCounter() as counter:
+        response = client.request(method, url, **kwargs)
+    return response, counter.count
+
+
+def test_single_record_writes_are_one_statement(client):
+    response, count = counted(client, "POST", "/api/patients/patients/", json=patient_payload("Однозапросов"))
+    assert response.status_code == 200
+    assert count == 1
+    patient_id = response.json()["id"]
+
+    response, count = counted(client, "PUT", f"/api/patients/patients/{patient_id}",
+                              json=patient_payload("Однозапросов", city="Тверь"))
+    assert response.status_code == 200 and response.json()["city"] == "Тверь"
+    assert count == 1
+
+    # обнуление ссылок из жалоб и назначений, затем DELETE
+    response, count = counted(client, "DELETE", "/api/patients/patients/999999")
+    assert response.status_code == 404
+    assert count == 3
+
+    response, count = counted(client, "DELETE", f"/api/patients/patients/{patient_id}")
+    assert response.status_code == 200
+    assert count == 3
+
+
+def test_batches_insert_with_one_statement(client):
+    patients = [patient_payload("Пачкин", first_name=f"Пациент{i}") for i in range(50)]
+    response, count = counted(client, "POST", "/api/patients/patients/batch", json=patients)
+    assert response.json()["created"] == 50
+    # SAVEPOINT, один INSERT ... RETURNING, RELEASE
+    assert count == 3
+
+    complaints = [complaint_payload("Пачкин", first_name=f"Пациент{i}") for i in range(50)]
+    response, count = counted(client, "POST", "/api/complaints/complaints/batch", json=complaints)
+    assert response.json()["created"] == 50
+    # плюс один запрос на все имена пациентов
+    assert count == 4
+
+    # имена уже в кэше
+    response, count = counted(client, "POST", "/api/complaints/complaints/batch", json=complaints)
+    assert response.json()["created"] == 50
+    assert count == 3
+
+
+def test_detail_and_status_endpoints_are_one_statement(client):
+    patient_id = client.post("/api/patients/patients/", json=patient_payload("Деталев")).json()["id"]
+    complaint_id = client.post("/api/complaints/complaints/batch", json=[complaint_payload("Деталев")]).json()["ids"][0]
+    prescription_id = client.post("/api/prescriptions/prescriptions/batch",
+                                  json=[prescription_payload("Деталев")]).json()["ids"][0]
+
+    for url in (f"/api/patients/patients/{patient_id}", f"/api/complaints/complaints/{complaint_id}",
+                f"/api/prescriptions/prescriptions/{prescription_id}"):
+        response, count = counted(client, "GET", url)
+        assert response.status_code == 200
+        assert count == 1
+
+    response, count = counted(client, "PATCH", f"/api/prescriptions/prescriptions/{prescription_id}/status",
+                              params={"status": "completed"})
+    assert response.status_code == 200
+    assert count == 1
+
+    response, count = counted(client, "PATCH", "/api/prescriptions/prescriptions/999999/status",
+                              params={"status": "completed"})
+    assert response.status_code == 404
+    assert count == 1
+
+
+def test_delete_referenced_patient_with_foreign_keys(client):
+    patient_id = client.post("/api/patients/patients/", json=patient_payload("Ссылкин")).json()["id"]
+    complaint_id = client.post("/api/complaints/complaints/batch", json=[complaint_payload("Ссылкин")]).json()["ids"][0]
+
+    strict = create_engine(engine.url)
+    event.listen(strict, "connect", lambda connection, record: connection.execute("PRAGMA foreign_keys=ON"))
+    try:
+        with Session(strict) as db:
+            assert crud.delete_patient(db, patient_id)
+    finally:
+        strict.dispose()
+    assert client.get(f"/api/complaints/complaints/{complaint_id}").status_code == 200
+
+
+def test_user_writes_are_one_statement():
+    with SessionLocal() as db:
+        user = crud.create_user(db, schemas.UserCreate(username="blocked", email="blocked@example.com", password="pw"))
+        for write in (lambda: crud.revoke_user_tokens(db, user.id),
+                      lambda: crud.set_user_active(db, user.id, is_active=False)):
+            with QueryCounter() as counter:
+                updated = write()
+            assert counter.count == 1
+        assert updated.token_version == 2 and not updated.is_active
@@ -0,0 +1,24 @@
+from sqlalchemy import text
+
+from app.database import engine
+
+
+def insert_symptom(name):
+    # запись мимо приложения, как из CLI-импорта или другого воркера
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO symptoms (name, description, category_name) VALUES (:name, '', 'Тест')"), {"name": name})
+
+
+def test_etag_changes_after_write_from_another_process(client):
+    insert_symptom("Озноб")
+    first = client.get("/api/symptoms/symptoms/")
+    etag = first.headers["ETag"]
+
+    response = client.get("/api/symptoms/symptoms/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    insert_symptom("Ломота")
+    response = client.get("/api/symptoms/symptoms/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert "Ломота" in {symptom["name"] for symptom in response.json()}
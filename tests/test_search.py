@@ -0,0 +1,24 @@
+from app import crud, schemas
+from app.database import SessionLocal
+
+
+def patient(last_name, city):
+    return schemas.PatientCreate(last_name=last_name, first_name="Иван", gender="М", city=city, street="Садовая",
+                                 building="1", email="patient@example.com", birth_date="1980-01-01",
+                                 phone="+70000000000")
+
+
+def test_best_match_is_ranked_over_all_matches(client):
+    # 3000 совпадений только по городу (вес 1), затем одно по фамилии (вес 10) с наибольшим rowid
+    db = SessionLocal()
+    try:
+        crud.create_patients(db, [patient(f"Житель{i}", "Ранжирск") for i in range(3000)])
+        crud.create_patients(db, [patient("Ранжирский", "Омск")])
+    finally:
+        db.close()
+
+    response = client.get("/api/search/", params={"q": "ранжир", "type": "patients", "limit": 5})
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert items[0]["title"] == "Ранжирский Иван"
+    assert len(items) == 5
@@ -0,0 +1,70 @@
+from app import crud, schemas
+from app.database import QueryCounter, SessionLocal
+
+DOCTORS = [("Хирургов", "Олег", "хирург"), ("Терапевтова", "Анна", "терапевт")]
+
+
+def make_patient_chart(client):
+    db = SessionLocal()
+    try:
+        for last_name, first_name, specialty in DOCTORS:
+            crud.create_doctor(db, schemas.DoctorCreate(
+                last_name=last_name, first_name=first_name, specialty=specialty, department="Отделение 1",
+                email="doctor@example.com", phone="+70000000002"))
+    finally:
+        db.close()
+    patient_id = client.post("/api/patients/patients/", json=dict(
+        last_name="Лентов", first_name="Семен", gender="М", city="Самара", street="Мира", building="3",
+        email="patient@example.com", birth_date="1970-02-03", phone="+70000000003")).json()["id"]
+    complaints = [dict(patient_last_name="Лентов", patient_first_name="Семен", symptom_name="головная боль",
+                       complaint_date=f"2024-0{month}-05", severity="средняя", description="")
+                  for month in range(1, 7)]
+    prescriptions = [dict(patient_last_name="Лентов", patient_first_name="Семен",
+                          doctor_last_name=DOCTORS[month % 2][0], doctor_first_name=DOCTORS[month % 2][1],
+                          medication_name=f"препарат {month}", quantity=1, dose_unit="таб",
+                          frequency="1 раз в день", duration_in_days=10, start_date=f"2024-0{month}-10",
+                          instructions="", status="completed", created_at=f"2024-0{month}-10T10:00:00")
+                     for month in range(1, 7)]
+    client.post("/api/complaints/complaints/batch", json=complaints)
+    client.post("/api/prescriptions/prescriptions/batch", json=prescriptions)
+    return patient_id
+
+
+def counted_get(client, url, **params):
+    with QueryCounter() as counter:
+        response = client.get(url, params=params)
+    assert response.status_code == 200
+    return response, counter.count
+
+
+def test_timeline_loads_with_three_queries(client):
+    patient_id = make_patient_chart(client)
+    url = f"/api/patients/patients/{patient_id}/timeline"
+
+    # пациент, жалобы, назначения вместе с врачами - независимо от числа событий
+    response, count = counted_get(client, url)
+    assert count == 3
+    events = response.json()["events"]
+    assert len(events) == 12
+    dates = [event["event_date"] for event in events]
+    assert dates == sorted(dates, reverse=True)
+    doctors = {event["prescription"]["doctor"]["last_name"] for event in events if event["type"] == "prescription"}
+    assert doctors == {last_name for last_name, _, _ in DOCTORS}
+
+    response, count = counted_get(client, url, limit=5)
+    assert count == 3
+    cursor = response.headers["X-Next-Cursor"]
+    response, count = counted_get(client, url, limit=5, cursor=cursor)
+    assert count == 3
+    assert [event["event_date"] for event in response.json()["events"]] == dates[5:10]
+
+    response, count = counted_get(client, url, date_from="2024-03-01", date_to="2024-04-30")
+    assert count == 3
+    assert len(response.json()["events"]) == 4
+
+
+def test_timeline_of_missing_patient_is_one_query(client):
+    with QueryCounter() as counter:
+        response = client.get("/api/patients/patients/999999/timeline")
+    assert response.status_code == 404
+    assert counter.count == 1
@@ -0,0 +1,39 @@
+from fastapi.testclient import TestClient
+
+from app import auth, crud, schemas
+from app.database import QueryCounter, SessionLocal
+from app.main import app
+
+
+def bearer(username):
+    with SessionLocal() as db:
+        user = crud.get_user_by_username(db, username) or crud.create_user(
+            db, schemas.UserCreate(username=username, email=f"{username}@example.com", password="pw"))
+        token = auth.create_access_token({"sub": user.username, "ver": user.token_version})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_cli_block_and_revoke_reach_cached_user():
+    # без подмены get_current_active_user: токен проверяется по-настоящему и пользователь попадает в кэш
+    client = TestClient(app)
+    headers = bearer("cached")
+    url = "/api/patients/patients/999999"
+    assert client.get(url, headers=headers).status_code == 404
+    with QueryCounter() as counter:
+        assert client.get(url, headers=headers).status_code == 404
+    # версия users и сам запрос; пользователя из базы не читали
+    assert counter.count == 2
+
+    # CLI пишет в базу мимо кэша процесса, как и другой воркер
+    auth.main(["--block", "cached"])
+    assert client.get(url, headers=headers).status_code == 401
+
+    auth.main(["--unblock", "cached"])
+    headers = bearer("cached")
+    assert client.get(url, headers=headers).status_code == 404
+    auth.main(["--revoke", "cached"])
+    assert client.get(url, headers=headers).status_code == 401
+
+
+def test_cache_stats_endpoint_is_removed(client):
+    assert client.get("/api/auth/cache/stats").status_code == 404